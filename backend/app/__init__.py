@@ -1,16 +1,26 @@
 """
 Hotel Management System - Backend Application
 """
-from flask import Flask, send_from_directory
+from flask import Flask
 from flask_cors import CORS
+from app.utils.analytics import init_analytics
+from app.utils.assets import init_assets
+from app.utils.backup import init_backups
+from app.utils.changes import init_changes
+from app.utils.compression import init_compression
 from app.utils.database import init_db
+from app.utils.maintenance import init_maintenance
+from app.utils.metrics import init_metrics
+from app.utils.properties import init_properties
+from app.utils.scheduler import init_scheduler
+from app.utils.serialization import init_json
 import os
 
 def create_app(config_name='development'):
     """Application factory for creating Flask app instance"""
     # Get the absolute path to frontend directory
     frontend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../frontend'))
-    app = Flask(__name__, static_folder=frontend_path, static_url_path='')
+    app = Flask(__name__, static_folder=None)
     
     # Configuration
     if config_name == 'production':
@@ -18,14 +28,39 @@ def create_app(config_name='development'):
     else:
         app.config['DEBUG'] = True
     
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '0') != '0'
+    app.config['JSON_PROVIDER'] = os.environ.get('JSON_PROVIDER', 'auto')
+    app.config['COMPRESS_ENABLED'] = os.environ.get('COMPRESS_ENABLED', '1') != '0'
+    app.config['COMPRESS_MIN_SIZE'] = int(os.environ.get('COMPRESS_MIN_SIZE', 500))
+    app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+    app.config['MIGRATE_ON_STARTUP'] = os.environ.get('MIGRATE_ON_STARTUP', '1') != '0'
+    app.config['SCHEDULER_ENABLED'] = os.environ.get('SCHEDULER_ENABLED', '1') != '0'
+    
+    # Fast JSON encoding for API responses
+    init_json(app)
+    
     # Enable CORS
     CORS(app)
     
-    # Initialize database
+    # Initialize database(s), one per property when PROPERTIES is set
     init_db(app)
+    init_properties(app)
+    
+    # Request and SQL instrumentation
+    init_metrics(app)
+    init_backups(app)
+    init_maintenance(app)
+    init_analytics(app)
+    init_changes(app)
+    
+    # Snapshots, rollups, backups and maintenance on a schedule
+    init_scheduler(app)
+    
+    # gzip for JSON responses
+    init_compression(app)
     
     # Register blueprints
-    from app.routes import auth, sales, employees, rooms, reports, dashboard
+    from app.routes import auth, sales, employees, rooms, reports, dashboard, audit, changes
     
     app.register_blueprint(auth.bp)
     app.register_blueprint(sales.bp)
@@ -33,16 +68,10 @@ def create_app(config_name='development'):
     app.register_blueprint(rooms.bp)
     app.register_blueprint(reports.bp)
     app.register_blueprint(dashboard.bp)
+    app.register_blueprint(audit.bp)
+    app.register_blueprint(changes.bp)
     
-    # Serve frontend files
-    @app.route('/')
-    def serve_index():
-        return send_from_directory(frontend_path, 'index.html')
-    
-    @app.route('/<path:path>')
-    def serve_static(path):
-        if os.path.isfile(os.path.join(frontend_path, path)):
-            return send_from_directory(frontend_path, path)
-        return send_from_directory(frontend_path, 'index.html')
+    # Serve frontend files (fingerprinted and precompressed, from memory)
+    init_assets(app, frontend_path)
     
     return app
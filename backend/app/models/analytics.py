@@ -0,0 +1,87 @@
+"""Report queries against the analytics replica (app.utils.analytics)
+
+Each query reads the pre-joined fact tables of the current property's
+replica when reports are routed to it, and otherwise falls back to the
+same query on the primary database (Sales, Room), so callers get the
+same records either way.
+"""
+from app.models.room import Room
+from app.models.sales import (Sales, DailyTotalRecord, CategoryTotalRecord,
+                              PaymentMethodTotalRecord)
+from app.utils import analytics
+from app.utils.records import record, fetch_all
+
+EmployeeTotalRecord = record('EmployeeTotalRecord', [
+    ('user_id', int, 'employee_id'),
+    ('employee_name', str),
+    ('total_sales', float, 'SUM(amount)'),
+    ('transactions', int, 'COUNT(*)')
+])
+
+StayTotalRecord = record('StayTotalRecord', [
+    ('room_type', str),
+    ('stays', int, 'COUNT(*)'),
+    ('nights', int, 'TOTAL(nights)'),
+    ('guests', int, 'TOTAL(number_of_guests)'),
+    ('revenue', float, 'TOTAL(revenue)')
+])
+
+class Analytics:
+    """Report queries routed to the analytics replica"""
+
+    @staticmethod
+    def get_employee_totals(start_date, end_date):
+        """Get per-employee sales totals over an inclusive date range"""
+        if not analytics.routed():
+            return Sales.get_employee_totals(start_date, end_date)
+        return fetch_all(analytics.get_replica_db(), EmployeeTotalRecord, f'''
+            SELECT {EmployeeTotalRecord.COLUMNS} FROM sales_fact
+            WHERE sale_date BETWEEN ? AND ?
+            GROUP BY employee_id
+        ''', (start_date, end_date))
+
+    @staticmethod
+    def get_daily_totals(start_date, end_date):
+        """Get sales totals per day over an inclusive date range (days with sales only)"""
+        if not analytics.routed():
+            return Sales.get_daily_totals(start_date, end_date)
+        return fetch_all(analytics.get_replica_db(), DailyTotalRecord, f'''
+            SELECT {DailyTotalRecord.COLUMNS} FROM sales_fact
+            WHERE sale_date BETWEEN ? AND ?
+            GROUP BY sale_date
+            ORDER BY sale_date
+        ''', (start_date, end_date))
+
+    @staticmethod
+    def get_category_totals(sale_date):
+        """Get sales totals per category for a date"""
+        if not analytics.routed():
+            return Sales.get_category_totals(sale_date)
+        return fetch_all(analytics.get_replica_db(), CategoryTotalRecord, f'''
+            SELECT {CategoryTotalRecord.COLUMNS} FROM sales_fact
+            WHERE sale_date = ?
+            GROUP BY category
+        ''', (sale_date,))
+
+    @staticmethod
+    def get_payment_method_totals(sale_date):
+        """Get sales counts and totals per payment method for a date"""
+        if not analytics.routed():
+            return Sales.get_payment_method_totals(sale_date)
+        return fetch_all(analytics.get_replica_db(), PaymentMethodTotalRecord, f'''
+            SELECT {PaymentMethodTotalRecord.COLUMNS} FROM sales_fact
+            WHERE sale_date = ?
+            GROUP BY payment_method
+        ''', (sale_date,))
+
+    @staticmethod
+    def get_stay_totals(start_date, end_date):
+        """Get stays, nights, guests and room revenue per room type for stays starting in a date range"""
+        if not analytics.routed():
+            return Room.get_stay_totals(start_date, end_date)
+        return fetch_all(analytics.get_replica_db(), StayTotalRecord, f'''
+            SELECT {StayTotalRecord.COLUMNS} FROM stay_fact
+            WHERE check_in_date BETWEEN ? AND ? AND status != 'Cancelled'
+            GROUP BY room_type
+            ORDER BY room_type
+        ''', (start_date, end_date))
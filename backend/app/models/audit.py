@@ -0,0 +1,79 @@
+"""Audit log model for querying the change history"""
+import json
+import sqlite3
+from app.utils import audit
+from app.utils.database import current_property, get_group_db
+from app.utils.records import record, fetch_all
+
+AUDIT_PAGE_MAX_LIMIT = 200
+
+AuditRecord = record('AuditRecord', [
+    ('log_id', int, 'a.log_id'),
+    ('user_id', int, 'a.user_id'),
+    ('username', str, 'u.username'),
+    ('action', str, 'a.action'),
+    ('entity_type', str, 'a.entity_type'),
+    ('entity_id', int, 'a.entity_id'),
+    ('property', str, 'a.property'),
+    ('old_value', dict, 'a.old_value'),
+    ('new_value', dict, 'a.new_value'),
+    ('created_at', str, 'a.created_at')
+])
+
+class AuditLog:
+    """Audit log model for database operations"""
+
+    @staticmethod
+    def query(entity_type=None, entity_id=None, user_id=None, action=None,
+              start_date=None, end_date=None, before=None, limit=50):
+        """Newest-first page of audit entries and the cursor for the next page
+
+        ``before`` is the log_id cursor returned with the previous page;
+        pages are keyed on log_id so deep pages cost the same as the first.
+        With a property selected, only changes made in that property.
+        """
+        limit = min(int(limit), AUDIT_PAGE_MAX_LIMIT)
+        # Entries this process has recorded but not yet written; if the
+        # flush fails the writer thread retries and they show up later
+        try:
+            audit.flush()
+        except sqlite3.Error:
+            pass
+
+        conditions, params = [], []
+        for column, value in (('a.entity_type', entity_type), ('a.entity_id', entity_id),
+                              ('a.user_id', user_id), ('a.action', action),
+                              ('a.property', current_property())):
+            if value is not None:
+                conditions.append(f'{column} = ?')
+                params.append(value)
+        if start_date:
+            conditions.append('a.created_at >= ?')
+            params.append(start_date)
+        if end_date:
+            # Dates are inclusive; created_at carries a time of day
+            conditions.append("a.created_at < date(?, '+1 day')")
+            params.append(end_date)
+        if before is not None:
+            conditions.append('a.log_id < ?')
+            params.append(before)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ''
+
+        # One extra row tells whether there is a next page
+        entries = fetch_all(get_group_db(), AuditRecord, f'''
+            SELECT {AuditRecord.COLUMNS}
+            FROM audit_log a
+            LEFT JOIN users u ON a.user_id = u.user_id
+            {where}
+            ORDER BY a.log_id DESC
+            LIMIT ?
+        ''', params + [limit + 1])
+
+        next_cursor = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            next_cursor = entries[-1].log_id
+        for entry in entries:
+            entry.old_value = json.loads(entry.old_value) if entry.old_value else None
+            entry.new_value = json.loads(entry.new_value) if entry.new_value else None
+        return entries, next_cursor
@@ -1,6 +1,81 @@
 """Room model for room management and check-in/check-out operations"""
+import re
 import sqlite3
+from app.utils import archive, audit
 from app.utils.database import get_db
+from app.utils.records import record, fetch_all, fetch_one
+
+GUEST_SEARCH_MAX_LIMIT = 100
+
+RoomRecord = record('RoomRecord', [
+    ('room_id', int),
+    ('room_number', str),
+    ('room_type', str),
+    ('capacity', int),
+    ('price_per_night', float),
+    ('status', str)
+])
+
+AvailableRoomRecord = record('AvailableRoomRecord', [
+    ('room_id', int),
+    ('room_number', str),
+    ('room_type', str),
+    ('capacity', int),
+    ('price_per_night', float)
+])
+
+ActiveCheckInRecord = record('ActiveCheckInRecord', [
+    ('check_in_id', int, 'c.check_in_id'),
+    ('room_id', int, 'c.room_id'),
+    ('guest_name', str, 'c.guest_name'),
+    ('guest_email', str, 'c.guest_email'),
+    ('guest_phone', str, 'c.guest_phone'),
+    ('check_in_date', str, 'c.check_in_date'),
+    ('check_out_date', str, 'c.check_out_date'),
+    ('number_of_guests', int, 'c.number_of_guests'),
+    ('room_number', str, 'r.room_number'),
+    ('employee_name', str, 'u.full_name')
+])
+
+GuestRecord = record('GuestRecord', [
+    ('check_in_id', int, 'c.check_in_id'),
+    ('room_id', int, 'c.room_id'),
+    ('guest_name', str, 'c.guest_name'),
+    ('guest_email', str, 'c.guest_email'),
+    ('guest_phone', str, 'c.guest_phone'),
+    ('check_in_date', str, 'c.check_in_date'),
+    ('check_out_date', str, 'c.check_out_date'),
+    ('number_of_guests', int, 'c.number_of_guests'),
+    ('status', str, 'c.status'),
+    ('room_number', str, 'r.room_number'),
+    ('employee_name', str, 'u.full_name')
+])
+
+OccupancyRecord = record('OccupancyRecord', [
+    ('occupancy_id', int),
+    ('report_date', str),
+    ('total_rooms', int),
+    ('occupied_rooms', int),
+    ('available_rooms', int),
+    ('maintenance_rooms', int),
+    ('occupancy_rate', float)
+])
+
+# Nights are whole calendar days between check-in and check-out
+_NIGHTS = 'MAX(CAST(julianday(c.check_out_date) - julianday(c.check_in_date) AS INTEGER), 0)'
+
+StayTotalRecord = record('StayTotalRecord', [
+    ('room_type', str, 'r.room_type'),
+    ('stays', int, 'COUNT(*)'),
+    ('nights', int, f'TOTAL({_NIGHTS})'),
+    ('guests', int, 'TOTAL(c.number_of_guests)'),
+    ('revenue', float, f'TOTAL({_NIGHTS} * r.price_per_night)')
+])
+
+def _guest_match_query(text):
+    """Turn free text into an FTS5 query of quoted prefix terms"""
+    terms = re.findall(r'\w+', text or '')
+    return ' '.join(f'"{term}"*' for term in terms)
 
 class Room:
     """Room model for database operations"""
@@ -17,41 +92,47 @@ class Room:
                 VALUES (?, ?, ?, ?)
             ''', (room_number, room_type, capacity, price_per_night))
             db.commit()
+            audit.record('create', 'room', cursor.lastrowid, new_value={
+                'room_number': room_number, 'room_type': room_type,
+                'capacity': capacity, 'price_per_night': price_per_night
+            })
             return {'success': True, 'room_id': cursor.lastrowid}
         except sqlite3.IntegrityError:
             return {'success': False, 'error': 'Room number already exists'}
     
     @staticmethod
-    def get_all_rooms():
-        """Get all rooms"""
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM rooms ORDER BY room_number')
-        return cursor.fetchall()
+    def get_all_rooms(fields=None):
+        """Get all rooms, optionally only some RoomRecord fields"""
+        rec = RoomRecord.project(fields)
+        return fetch_all(get_db(), rec, f'SELECT {rec.COLUMNS} FROM rooms ORDER BY room_number')
     
     @staticmethod
     def get_room_by_id(room_id):
         """Get room by ID"""
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM rooms WHERE room_id = ?', (room_id,))
-        return cursor.fetchone()
+        return fetch_one(get_db(), RoomRecord,
+                         f'SELECT {RoomRecord.COLUMNS} FROM rooms WHERE room_id = ?', (room_id,))
     
     @staticmethod
-    def get_available_rooms():
-        """Get all available rooms"""
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM rooms WHERE status = "Available" ORDER BY room_number')
-        return cursor.fetchall()
+    def get_available_rooms(fields=None):
+        """Get all available rooms, optionally only some AvailableRoomRecord fields"""
+        rec = AvailableRoomRecord.project(fields)
+        return fetch_all(get_db(), rec, f'''
+            SELECT {rec.COLUMNS} FROM rooms
+            WHERE status = 'Available'
+            ORDER BY room_number
+        ''')
     
     @staticmethod
     def update_room_status(room_id, status):
         """Update room status"""
         db = get_db()
         cursor = db.cursor()
+        cursor.execute('SELECT status FROM rooms WHERE room_id = ?', (room_id,))
+        old = cursor.fetchone()
         cursor.execute('UPDATE rooms SET status = ? WHERE room_id = ?', (status, room_id))
         db.commit()
+        audit.record('update_status', 'room', room_id,
+                     {'status': old[0]} if old else None, {'status': status})
         return {'success': True}
     
     @staticmethod
@@ -69,12 +150,19 @@ class Room:
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
             ''', (room_id, guest_name, guest_email, guest_phone, check_in_date, 
                   check_out_date, number_of_guests, employee_id, notes))
-            
+            check_in_id = cursor.lastrowid
+
             # Update room status to Occupied
             Room.update_room_status(room_id, 'Occupied')
             db.commit()
-            
-            return {'success': True, 'check_in_id': cursor.lastrowid}
+
+            audit.record('check_in', 'check_in', check_in_id, new_value={
+                'room_id': room_id, 'guest_name': guest_name, 'guest_email': guest_email,
+                'guest_phone': guest_phone, 'check_in_date': check_in_date,
+                'check_out_date': check_out_date, 'number_of_guests': number_of_guests,
+                'check_in_employee_id': employee_id, 'notes': notes, 'status': 'Active'
+            })
+            return {'success': True, 'check_in_id': check_in_id}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
@@ -85,6 +173,8 @@ class Room:
         cursor = db.cursor()
         
         try:
+            cursor.execute('SELECT status FROM check_ins WHERE check_in_id = ?', (check_in_id,))
+            old = cursor.fetchone()
             cursor.execute('''
                 UPDATE check_ins 
                 SET status = "Completed" 
@@ -94,41 +184,92 @@ class Room:
             # Update room status to Available
             Room.update_room_status(room_id, 'Available')
             db.commit()
-            
+
+            audit.record('check_out', 'check_in', check_in_id,
+                         {'status': old[0]} if old else None,
+                         {'status': 'Completed', 'room_id': room_id})
             return {'success': True}
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
     @staticmethod
-    def get_active_check_ins():
-        """Get all active check-ins"""
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute('''
-            SELECT c.*, r.room_number, u.full_name as employee_name
+    def get_active_check_ins(fields=None):
+        """Get all active check-ins, optionally only some ActiveCheckInRecord fields"""
+        rec = ActiveCheckInRecord.project(fields)
+        return fetch_all(get_db(), rec, f'''
+            SELECT {rec.COLUMNS}
             FROM check_ins c
             JOIN rooms r ON c.room_id = r.room_id
             JOIN users u ON c.check_in_employee_id = u.user_id
-            WHERE c.status = "Active"
+            WHERE c.status = 'Active'
             ORDER BY c.check_in_date
         ''')
-        return cursor.fetchall()
     
     @staticmethod
-    def get_occupancy_report(report_date=None):
-        """Get occupancy report for a date"""
+    def search_guests(query, status=None, limit=20):
+        """Search current and past stays by guest name, email, phone or notes"""
+        match = _guest_match_query(query)
+        if not match:
+            return []
+        
         db = get_db()
-        cursor = db.cursor()
+        years = archive.archived_years()
+        archive.attach(db, years)
+        status_filter = 'AND c.status = ?' if status else ''
         
+        # The index covers archived stays too; each year's stays are looked up in its archive.
+        # Name matches outrank email/phone, which outrank free-text notes
+        matches = ' UNION ALL '.join(f'''
+            SELECT c.*, bm25(check_ins_fts, 10.0, 5.0, 5.0, 1.0) AS rank
+            FROM check_ins_fts
+            JOIN {schema}.check_ins c ON c.check_in_id = check_ins_fts.rowid
+            WHERE check_ins_fts MATCH ? {status_filter}
+        ''' for schema in archive.schemas(years))
+        params = ([match] + ([status] if status else [])) * (len(years) + 1)
+        return fetch_all(db, GuestRecord, f'''
+            SELECT {GuestRecord.COLUMNS}
+            FROM ({matches}) c
+            JOIN rooms r ON c.room_id = r.room_id
+            JOIN users u ON c.check_in_employee_id = u.user_id
+            ORDER BY c.rank
+            LIMIT ?
+        ''', params + [min(int(limit), GUEST_SEARCH_MAX_LIMIT)])
+    
+    @staticmethod
+    def get_stay_totals(start_date, end_date):
+        """Get stays, nights, guests and room revenue per room type for stays starting in a date range"""
+        db = get_db()
+        return fetch_all(db, StayTotalRecord, f'''
+            SELECT {StayTotalRecord.COLUMNS}
+            FROM {archive.source(db, 'check_ins', start_date, end_date, alias='c')}
+            JOIN rooms r ON c.room_id = r.room_id
+            WHERE c.check_in_date BETWEEN ? AND ? AND c.status != 'Cancelled'
+            GROUP BY r.room_type
+            ORDER BY r.room_type
+        ''', (start_date, end_date))
+    
+    @staticmethod
+    def get_current_occupancy(report_date):
+        """Get the occupancy snapshot for a date, or live room counts when none has been taken yet"""
+        snapshot = Room.get_occupancy_report(report_date)
+        if snapshot:
+            return snapshot
+        return fetch_one(get_db(), OccupancyRecord, '''
+            SELECT NULL, ?, COUNT(*), COALESCE(SUM(status = 'Occupied'), 0),
+                   COALESCE(SUM(status = 'Available'), 0), COALESCE(SUM(status = 'Maintenance'), 0),
+                   COALESCE(ROUND(SUM(status = 'Occupied') * 100.0 / COUNT(*), 2), 0)
+            FROM rooms
+        ''', (report_date,))
+    
+    @staticmethod
+    def get_occupancy_report(report_date=None):
+        """Get occupancy report for a date"""
         if report_date:
-            cursor.execute('''
-                SELECT * FROM occupancy_report WHERE report_date = ?
+            return fetch_one(get_db(), OccupancyRecord, f'''
+                SELECT {OccupancyRecord.COLUMNS} FROM occupancy_report WHERE report_date = ?
             ''', (report_date,))
-        else:
-            cursor.execute('''
-                SELECT * FROM occupancy_report 
-                ORDER BY report_date DESC 
-                LIMIT 1
-            ''')
-        
-        return cursor.fetchone()
+        return fetch_one(get_db(), OccupancyRecord, f'''
+            SELECT {OccupancyRecord.COLUMNS} FROM occupancy_report
+            ORDER BY report_date DESC
+            LIMIT 1
+        ''')
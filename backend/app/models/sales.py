@@ -1,7 +1,107 @@
 """Sales model for tracking and reporting sales data"""
 import sqlite3
 from datetime import datetime, timedelta
-from app.utils.database import get_db
+from app.utils import archive, audit
+from app.utils.database import get_db, iter_query
+from app.utils.records import record, fetch_all
+
+RAW_SALES_COLUMNS = ['sale_id', 'employee_id', 'sale_date', 'category', 'description', 'amount',
+                     'payment_method', 'transaction_id', 'notes', 'created_at']
+
+SaleRecord = record('SaleRecord', [
+    ('sale_id', int),
+    ('employee_id', int),
+    ('sale_date', str),
+    ('category', str),
+    ('description', str),
+    ('amount', float),
+    ('payment_method', str)
+])
+
+MonthlySaleRecord = record('MonthlySaleRecord', [
+    ('sale_id', int),
+    ('employee_id', int),
+    ('sale_date', str),
+    ('category', str),
+    ('amount', float)
+])
+
+EmployeeDayRecord = record('EmployeeDayRecord', [
+    ('user_id', int, 'u.user_id'),
+    ('employee_name', str, 'u.full_name'),
+    ('total_sales', float, 'SUM(s.amount)'),
+    ('transactions', int, 'COUNT(*)')
+])
+
+DailyTotalRecord = record('DailyTotalRecord', [
+    ('sale_date', str),
+    ('total_sales', float, 'SUM(amount)'),
+    ('transaction_count', int, 'COUNT(*)')
+])
+
+CategoryTotalRecord = record('CategoryTotalRecord', [
+    ('category', str),
+    ('total', float, 'SUM(amount)')
+])
+
+PaymentMethodTotalRecord = record('PaymentMethodTotalRecord', [
+    ('payment_method', str),
+    ('count', int, 'COUNT(*)'),
+    ('total', float, 'SUM(amount)')
+])
+
+DailySummaryRecord = record('DailySummaryRecord', [
+    ('summary_id', int),
+    ('employee_id', int),
+    ('sale_date', str),
+    ('total_sales', float),
+    ('room_sales', float),
+    ('food_sales', float),
+    ('beverage_sales', float),
+    ('service_sales', float),
+    ('transaction_count', int)
+])
+
+EmployeeDaySummaryRecord = record('EmployeeDaySummaryRecord', [
+    ('employee_id', int, 'd.employee_id'),
+    ('employee_name', str, 'u.full_name'),
+    ('sale_date', str, 'd.sale_date'),
+    ('total_sales', float, 'd.total_sales'),
+    ('room_sales', float, 'd.room_sales'),
+    ('food_sales', float, 'd.food_sales'),
+    ('beverage_sales', float, 'd.beverage_sales'),
+    ('service_sales', float, 'd.service_sales'),
+    ('transaction_count', int, 'd.transaction_count')
+])
+
+MonthlySummaryRecord = record('MonthlySummaryRecord', [
+    ('report_id', int, 'm.report_id'),
+    ('employee_id', int, 'm.employee_id'),
+    ('employee_name', str, 'u.full_name'),
+    ('year', int, 'm.year'),
+    ('month', int, 'm.month'),
+    ('total_sales', float, 'm.total_sales'),
+    ('room_sales', float, 'm.room_sales'),
+    ('food_sales', float, 'm.food_sales'),
+    ('beverage_sales', float, 'm.beverage_sales'),
+    ('service_sales', float, 'm.service_sales'),
+    ('transaction_count', int, 'm.transaction_count')
+])
+
+# Exports print employee names, so their watermarks include account changes
+_EMPLOYEES_WATERMARK = '(SELECT MAX(updated_at) FROM users)'
+
+# Upsert clauses shared by the summary rebuilds; sums are compared to the
+# cent so float rounding alone never rewrites a row
+_SUMMARY_COLUMNS = ('total_sales', 'room_sales', 'food_sales', 'beverage_sales', 'service_sales')
+_SUMMARY_UPDATE = ', '.join(
+    [f'{column} = excluded.{column}' for column in _SUMMARY_COLUMNS + ('transaction_count',)]
+    + ['updated_at = CURRENT_TIMESTAMP']
+)
+_SUMMARY_CHANGED = ' OR '.join(
+    [f'ROUND({column}, 2) IS NOT ROUND(excluded.{column}, 2)' for column in _SUMMARY_COLUMNS]
+    + ['transaction_count IS NOT excluded.transaction_count']
+)
 
 class Sales:
     """Sales model for database operations"""
@@ -19,130 +119,401 @@ class Sales:
                 (employee_id, sale_date, category, amount, description, payment_method, transaction_id, notes)
                 VALUES (?, ?, ?, ?, ?, ?, ?, ?)
             ''', (employee_id, sale_date, category, amount, description, payment_method, transaction_id, notes))
+            sale_id = cursor.lastrowid
+
+            # Add the sale to its daily and monthly summaries in the same transaction, so
+            # every report agrees at once; the scheduled rollups recompute them from the sales
+            Sales._add_to_daily_summary(db, employee_id, sale_date, category, amount)
+            Sales._add_to_monthly_summary(db, employee_id, sale_date, category, amount)
             db.commit()
-            
-            # Update daily summary
-            Sales.update_daily_summary(employee_id, sale_date)
-            
-            return {'success': True, 'sale_id': cursor.lastrowid}
+
+            audit.record('create', 'sale', sale_id, new_value={
+                'employee_id': employee_id, 'sale_date': sale_date, 'category': category,
+                'amount': amount, 'description': description, 'payment_method': payment_method,
+                'transaction_id': transaction_id, 'notes': notes
+            })
+            return {'success': True, 'sale_id': sale_id}
         except sqlite3.IntegrityError as e:
+            db.rollback()
             return {'success': False, 'error': str(e)}
     
     @staticmethod
-    def get_daily_sales(employee_id=None, sale_date=None):
-        """Get sales for a specific date"""
+    def get_daily_sales(employee_id=None, sale_date=None, fields=None):
+        """Get sales for a specific date, optionally only some SaleRecord fields"""
         db = get_db()
-        cursor = db.cursor()
+        rec = SaleRecord.project(fields)
         
         if employee_id and sale_date:
-            cursor.execute('''
-                SELECT * FROM sales 
+            return fetch_all(db, rec, f'''
+                SELECT {rec.COLUMNS} FROM {archive.source(db, 'sales', sale_date)}
                 WHERE employee_id = ? AND sale_date = ?
                 ORDER BY created_at DESC
             ''', (employee_id, sale_date))
         elif sale_date:
-            cursor.execute('''
-                SELECT * FROM sales 
+            return fetch_all(db, rec, f'''
+                SELECT {rec.COLUMNS} FROM {archive.source(db, 'sales', sale_date)}
                 WHERE sale_date = ?
                 ORDER BY created_at DESC
             ''', (sale_date,))
-        else:
-            cursor.execute('SELECT * FROM sales ORDER BY created_at DESC LIMIT 100')
-        
-        return cursor.fetchall()
+        return fetch_all(db, rec, f'SELECT {rec.COLUMNS} FROM sales ORDER BY created_at DESC LIMIT 100')
     
     @staticmethod
-    def get_monthly_sales(employee_id=None, year=None, month=None):
-        """Get sales for a specific month"""
-        db = get_db()
-        cursor = db.cursor()
-        
-        date_filter = f' AND strftime("%Y", sale_date) = "{year}" AND strftime("%m", sale_date) = "{month:02d}"'
-        
+    def get_monthly_sales(employee_id=None, year=None, month=None, fields=None):
+        """Get sales for a specific month, optionally only some MonthlySaleRecord fields"""
+        rec = MonthlySaleRecord.project(fields)
+        # A date range rather than strftime() on the column keeps the sale_date index usable
+        params = [f'{year:04d}-{month:02d}-01', f'{year + month // 12:04d}-{month % 12 + 1:02d}-01']
+        employee_filter = ''
         if employee_id:
-            query = f'SELECT * FROM sales WHERE employee_id = {employee_id}{date_filter}'
-        else:
-            query = f'SELECT * FROM sales WHERE 1=1{date_filter}'
+            employee_filter = 'AND employee_id = ?'
+            params.append(employee_id)
         
-        cursor.execute(query)
-        return cursor.fetchall()
+        db = get_db()
+        return fetch_all(db, rec, f'''
+            SELECT {rec.COLUMNS} FROM {archive.source(db, 'sales', params[0], params[0])}
+            WHERE sale_date >= ? AND sale_date < ? {employee_filter}
+        ''', params)
+    
+    @staticmethod
+    def iter_sales_between(start_date, end_date):
+        """Yield sales in a date range for streaming exports"""
+        years = archive.years_between(start_date, end_date)
+        return iter_query(f'''
+            SELECT s.sale_id, s.sale_date, u.full_name, s.category, s.description,
+                   s.amount, s.payment_method, s.transaction_id
+            FROM {archive.union('sales', years, 's')}
+            JOIN users u ON s.employee_id = u.user_id
+            WHERE s.sale_date BETWEEN ? AND ?
+            ORDER BY s.sale_date, s.sale_id
+        ''', (start_date, end_date), prepare=lambda db: archive.attach(db, years))
+    
+    @staticmethod
+    def iter_raw_sales(start_date, end_date):
+        """Yield raw sales rows (RAW_SALES_COLUMNS) in a date range"""
+        years = archive.years_between(start_date, end_date)
+        return iter_query(f'''
+            SELECT {', '.join(RAW_SALES_COLUMNS)}
+            FROM {archive.union('sales', years)}
+            WHERE sale_date BETWEEN ? AND ?
+            ORDER BY sale_date, sale_id
+        ''', (start_date, end_date), prepare=lambda db: archive.attach(db, years))
+    
+    @staticmethod
+    def _add_to_daily_summary(db, employee_id, sale_date, category, amount):
+        """Add one sale to its employee-day summary row without recounting the day"""
+        db.execute('''
+            INSERT INTO daily_sales_summary
+            (employee_id, sale_date, total_sales, room_sales, food_sales, beverage_sales, service_sales, transaction_count)
+            VALUES (?, ?, ?, ?, ?, ?, ?, 1)
+            ON CONFLICT(employee_id, sale_date) DO UPDATE SET
+                total_sales = total_sales + excluded.total_sales,
+                room_sales = room_sales + excluded.room_sales,
+                food_sales = food_sales + excluded.food_sales,
+                beverage_sales = beverage_sales + excluded.beverage_sales,
+                service_sales = service_sales + excluded.service_sales,
+                transaction_count = transaction_count + 1,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (employee_id, sale_date, amount,
+              amount if category == 'Room' else 0, amount if category == 'Food' else 0,
+              amount if category == 'Beverage' else 0, amount if category == 'Services' else 0))
+    
+    @staticmethod
+    def _add_to_monthly_summary(db, employee_id, sale_date, category, amount):
+        """Add one sale to its employee-month report row without recounting the month"""
+        db.execute('''
+            INSERT INTO monthly_sales_report
+            (employee_id, year, month, total_sales, room_sales, food_sales, beverage_sales, service_sales, transaction_count)
+            VALUES (?, CAST(strftime('%Y', ?) AS INTEGER), CAST(strftime('%m', ?) AS INTEGER), ?, ?, ?, ?, ?, 1)
+            ON CONFLICT(employee_id, year, month) DO UPDATE SET
+                total_sales = total_sales + excluded.total_sales,
+                room_sales = room_sales + excluded.room_sales,
+                food_sales = food_sales + excluded.food_sales,
+                beverage_sales = beverage_sales + excluded.beverage_sales,
+                service_sales = service_sales + excluded.service_sales,
+                transaction_count = transaction_count + 1,
+                updated_at = CURRENT_TIMESTAMP
+        ''', (employee_id, sale_date, sale_date, amount,
+              amount if category == 'Room' else 0, amount if category == 'Food' else 0,
+              amount if category == 'Beverage' else 0, amount if category == 'Services' else 0))
     
     @staticmethod
-    def update_daily_summary(employee_id, sale_date):
-        """Update or create daily sales summary"""
+    def rebuild_daily_summaries(start_date, end_date):
+        """Recompute the daily summaries of an inclusive date range from the sales
+
+        Only rows whose figures differ are rewritten. Returns the number of
+        summary rows changed.
+        """
         db = get_db()
         cursor = db.cursor()
-        
-        # Calculate totals for the day
-        cursor.execute('''
-            SELECT 
-                SUM(CASE WHEN category = "Room" THEN amount ELSE 0 END) as room_sales,
-                SUM(CASE WHEN category = "Food" THEN amount ELSE 0 END) as food_sales,
-                SUM(CASE WHEN category = "Beverage" THEN amount ELSE 0 END) as beverage_sales,
-                SUM(CASE WHEN category = "Services" THEN amount ELSE 0 END) as service_sales,
-                SUM(amount) as total_sales,
-                COUNT(*) as transaction_count
-            FROM sales
-            WHERE employee_id = ? AND sale_date = ?
-        ''', (employee_id, sale_date))
-        
-        result = cursor.fetchone()
-        
-        # Insert or update summary
-        cursor.execute('''
-            INSERT INTO daily_sales_summary 
+        cursor.execute(f'''
+            INSERT INTO daily_sales_summary
             (employee_id, sale_date, total_sales, room_sales, food_sales, beverage_sales, service_sales, transaction_count)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            SELECT employee_id, sale_date,
+                   SUM(amount),
+                   SUM(CASE WHEN category = 'Room' THEN amount ELSE 0 END),
+                   SUM(CASE WHEN category = 'Food' THEN amount ELSE 0 END),
+                   SUM(CASE WHEN category = 'Beverage' THEN amount ELSE 0 END),
+                   SUM(CASE WHEN category = 'Services' THEN amount ELSE 0 END),
+                   COUNT(*)
+            FROM {archive.source(db, 'sales', start_date, end_date)}
+            WHERE sale_date BETWEEN ? AND ?
+            GROUP BY employee_id, sale_date
             ON CONFLICT(employee_id, sale_date) DO UPDATE SET
-                total_sales = ?, room_sales = ?, food_sales = ?, beverage_sales = ?, service_sales = ?, transaction_count = ?
-        ''', (employee_id, sale_date, 
-              result[4] or 0, result[0] or 0, result[1] or 0, result[2] or 0, result[3] or 0, result[5] or 0,
-              result[4] or 0, result[0] or 0, result[1] or 0, result[2] or 0, result[3] or 0, result[5] or 0))
+                {_SUMMARY_UPDATE}
+            WHERE {_SUMMARY_CHANGED}
+        ''', (start_date, end_date))
+        changed = cursor.rowcount
+        cursor.execute(f'''
+            DELETE FROM daily_sales_summary
+            WHERE sale_date BETWEEN ? AND ? AND NOT EXISTS (
+                SELECT 1 FROM {archive.source(db, 'sales', start_date, end_date, alias='s')}
+                WHERE s.employee_id = daily_sales_summary.employee_id AND s.sale_date = daily_sales_summary.sale_date
+            )
+        ''', (start_date, end_date))
+        changed += cursor.rowcount
         db.commit()
+        return changed
     
     @staticmethod
-    def get_employee_daily_performance(employee_id):
-        """Get employee's daily performance summary"""
+    def rebuild_monthly_summary(year, month):
+        """Recompute one month of monthly_sales_report from the daily summaries
+
+        Unchanged rows keep their updated_at, so the month's export
+        watermark only moves when its figures do. Returns the number of
+        rows changed.
+        """
         db = get_db()
         cursor = db.cursor()
+        start = f'{year:04d}-{month:02d}-01'
+        cursor.execute(f'''
+            INSERT INTO monthly_sales_report
+            (employee_id, year, month, total_sales, room_sales, food_sales, beverage_sales, service_sales, transaction_count)
+            SELECT employee_id, ?, ?,
+                   SUM(total_sales), SUM(room_sales), SUM(food_sales), SUM(beverage_sales), SUM(service_sales),
+                   SUM(transaction_count)
+            FROM daily_sales_summary
+            WHERE sale_date >= ? AND sale_date < date(?, '+1 month')
+            GROUP BY employee_id
+            ON CONFLICT(employee_id, year, month) DO UPDATE SET
+                {_SUMMARY_UPDATE}
+            WHERE {_SUMMARY_CHANGED}
+        ''', (year, month, start, start))
+        changed = cursor.rowcount
         cursor.execute('''
-            SELECT * FROM daily_sales_summary
+            DELETE FROM monthly_sales_report
+            WHERE year = ? AND month = ? AND employee_id NOT IN (
+                SELECT employee_id FROM daily_sales_summary
+                WHERE sale_date >= ? AND sale_date < date(?, '+1 month')
+            )
+        ''', (year, month, start, start))
+        changed += cursor.rowcount
+        db.commit()
+        return changed
+    
+    @staticmethod
+    def get_employee_daily_performance(employee_id, fields=None):
+        """Get employee's daily performance summary, optionally only some DailySummaryRecord fields"""
+        rec = DailySummaryRecord.project(fields)
+        return fetch_all(get_db(), rec, f'''
+            SELECT {rec.COLUMNS} FROM daily_sales_summary
             WHERE employee_id = ?
             ORDER BY sale_date DESC
             LIMIT 30
         ''', (employee_id,))
+    
+    @staticmethod
+    def get_performance_series(start_date, end_date, employee_id=None):
+        """Get daily performance with rolling averages, deltas and peer rank
+        
+        Windows run over calendar days (days without sales count as zero), and
+        rows from the 29 days before start_date are read so the 30-day average
+        is complete on the first day of the range.
+        """
+        db = get_db()
+        cursor = db.cursor()
+        
+        employee_filter = 'AND w.employee_id = ?' if employee_id else ''
+        params = [start_date, end_date, start_date] + ([employee_id] if employee_id else [])
+        
+        cursor.execute(f'''
+            WITH daily AS (
+                SELECT employee_id, sale_date, julianday(sale_date) as day,
+                       total_sales, room_sales, food_sales, beverage_sales, service_sales,
+                       transaction_count
+                FROM daily_sales_summary
+                WHERE sale_date BETWEEN date(?, '-29 days') AND ?
+            ),
+            windowed AS (
+                SELECT *,
+                    SUM(total_sales) OVER (PARTITION BY employee_id ORDER BY day
+                        RANGE BETWEEN 6 PRECEDING AND CURRENT ROW) / 7.0 as avg_7d,
+                    SUM(total_sales) OVER (PARTITION BY employee_id ORDER BY day
+                        RANGE BETWEEN 29 PRECEDING AND CURRENT ROW) / 30.0 as avg_30d,
+                    total_sales - COALESCE(SUM(total_sales) OVER (PARTITION BY employee_id ORDER BY day
+                        RANGE BETWEEN 1 PRECEDING AND 1 PRECEDING), 0) as day_over_day,
+                    RANK() OVER (PARTITION BY sale_date ORDER BY total_sales DESC) as daily_rank,
+                    COUNT(*) OVER (PARTITION BY sale_date) as peers
+                FROM daily
+            )
+            SELECT w.employee_id, w.sale_date, w.total_sales, w.room_sales, w.food_sales,
+                   w.beverage_sales, w.service_sales, w.transaction_count,
+                   w.avg_7d, w.avg_30d, w.day_over_day, w.daily_rank, w.peers
+            FROM windowed w
+            WHERE w.sale_date >= ? {employee_filter}
+            ORDER BY w.employee_id, w.sale_date
+        ''', params)
         return cursor.fetchall()
     
     @staticmethod
-    def get_all_daily_sales(sale_date):
-        """Get all sales for a date across all employees"""
+    def get_performance_totals(start_date, end_date, employee_id=None):
+        """Get per-employee totals for a period ranked among all peers"""
         db = get_db()
         cursor = db.cursor()
-        cursor.execute('''
-            SELECT u.user_id, u.full_name, SUM(s.amount) as total,
-                   COUNT(*) as transactions
-            FROM sales s
+        
+        employee_filter = 'WHERE employee_id = ?' if employee_id else ''
+        params = [start_date, end_date] + ([employee_id] if employee_id else [])
+        
+        cursor.execute(f'''
+            SELECT * FROM (
+                SELECT d.employee_id, u.full_name, SUM(d.total_sales) as total_sales,
+                       SUM(d.transaction_count) as transactions, COUNT(*) as active_days,
+                       RANK() OVER (ORDER BY SUM(d.total_sales) DESC) as rank,
+                       COUNT(*) OVER () as peers
+                FROM daily_sales_summary d
+                JOIN users u ON d.employee_id = u.user_id
+                WHERE d.sale_date BETWEEN ? AND ?
+                GROUP BY d.employee_id
+            )
+            {employee_filter}
+            ORDER BY rank
+        ''', params)
+        return cursor.fetchall()
+    
+    @staticmethod
+    def get_daily_summaries(start_date, end_date):
+        """Get every employee's daily summary rows over an inclusive date range"""
+        return fetch_all(get_db(), EmployeeDaySummaryRecord, f'''
+            SELECT {EmployeeDaySummaryRecord.COLUMNS}
+            FROM daily_sales_summary d
+            LEFT JOIN users u ON d.employee_id = u.user_id
+            WHERE d.sale_date BETWEEN ? AND ?
+        ''', (start_date, end_date))
+    
+    @staticmethod
+    def get_all_daily_sales(sale_date, fields=None):
+        """Get all sales for a date across all employees, optionally only some EmployeeDayRecord fields"""
+        rec = EmployeeDayRecord.project(fields)
+        db = get_db()
+        return fetch_all(db, rec, f'''
+            SELECT {rec.COLUMNS}
+            FROM {archive.source(db, 'sales', sale_date, alias='s')}
             JOIN users u ON s.employee_id = u.user_id
             WHERE s.sale_date = ?
             GROUP BY s.employee_id
         ''', (sale_date,))
-        return cursor.fetchall()
+    
+    @staticmethod
+    def get_employee_totals(start_date, end_date):
+        """Get per-employee sales totals over an inclusive date range"""
+        db = get_db()
+        return fetch_all(db, EmployeeDayRecord, f'''
+            SELECT {EmployeeDayRecord.COLUMNS}
+            FROM {archive.source(db, 'sales', start_date, end_date, alias='s')}
+            JOIN users u ON s.employee_id = u.user_id
+            WHERE s.sale_date BETWEEN ? AND ?
+            GROUP BY s.employee_id
+        ''', (start_date, end_date))
+    
+    @staticmethod
+    def get_daily_totals(start_date, end_date):
+        """Get sales totals per day over an inclusive date range (days with sales only)"""
+        db = get_db()
+        return fetch_all(db, DailyTotalRecord, f'''
+            SELECT {DailyTotalRecord.COLUMNS}
+            FROM {archive.source(db, 'sales', start_date, end_date)}
+            WHERE sale_date BETWEEN ? AND ?
+            GROUP BY sale_date
+            ORDER BY sale_date
+        ''', (start_date, end_date))
+    
+    @staticmethod
+    def get_category_totals(sale_date):
+        """Get sales totals per category for a date"""
+        db = get_db()
+        return fetch_all(db, CategoryTotalRecord, f'''
+            SELECT {CategoryTotalRecord.COLUMNS}
+            FROM {archive.source(db, 'sales', sale_date)}
+            WHERE sale_date = ?
+            GROUP BY category
+        ''', (sale_date,))
+    
+    @staticmethod
+    def get_payment_method_totals(sale_date):
+        """Get sales counts and totals per payment method for a date"""
+        db = get_db()
+        return fetch_all(db, PaymentMethodTotalRecord, f'''
+            SELECT {PaymentMethodTotalRecord.COLUMNS}
+            FROM {archive.source(db, 'sales', sale_date)}
+            WHERE sale_date = ?
+            GROUP BY payment_method
+        ''', (sale_date,))
     
     @staticmethod
     def get_monthly_summary(year, month, employee_id=None):
         """Get monthly summary"""
+        employee_filter = 'AND m.employee_id = ?' if employee_id else ''
+        params = [year, month] + ([employee_id] if employee_id else [])
+        
+        return fetch_all(get_db(), MonthlySummaryRecord, f'''
+            SELECT {MonthlySummaryRecord.COLUMNS}
+            FROM monthly_sales_report m
+            LEFT JOIN users u ON m.employee_id = u.user_id
+            WHERE m.year = ? AND m.month = ? {employee_filter}
+        ''', params)
+    
+    @staticmethod
+    def get_monthly_totals(years):
+        """Get per-month totals and category splits for a set of years in one scan"""
         db = get_db()
         cursor = db.cursor()
         
-        if employee_id:
-            cursor.execute('''
-                SELECT * FROM monthly_sales_report
-                WHERE year = ? AND month = ? AND employee_id = ?
-            ''', (year, month, employee_id))
-        else:
-            cursor.execute('''
-                SELECT * FROM monthly_sales_report
-                WHERE year = ? AND month = ?
-            ''', (year, month))
+        # One sargable range per year keeps idx_daily_summary_date usable
+        ranges = ' OR '.join(['(sale_date >= ? AND sale_date < ?)'] * len(years))
+        params = []
+        for year in years:
+            params += [f'{year:04d}-01-01', f'{year + 1:04d}-01-01']
         
+        cursor.execute(f'''
+            SELECT CAST(strftime('%Y', sale_date) AS INTEGER) as year,
+                   CAST(strftime('%m', sale_date) AS INTEGER) as month,
+                   TOTAL(total_sales), TOTAL(room_sales), TOTAL(food_sales),
+                   TOTAL(beverage_sales), TOTAL(service_sales), TOTAL(transaction_count)
+            FROM daily_sales_summary
+            WHERE {ranges}
+            GROUP BY year, month
+        ''', params)
         return cursor.fetchall()
+    
+    @staticmethod
+    def get_sales_watermark(start_date, end_date):
+        """Get a value that changes whenever sales in a date range, or the employees named in them, change"""
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute(f'''
+            SELECT COUNT(*), MAX(sale_id), TOTAL(amount), {_EMPLOYEES_WATERMARK}
+            FROM {archive.source(db, 'sales', start_date, end_date)}
+            WHERE sale_date BETWEEN ? AND ?
+        ''', (start_date, end_date))
+        return ':'.join(str(value) for value in cursor.fetchone())
+    
+    @staticmethod
+    def get_monthly_summary_watermark(year, month):
+        """Get a value that changes whenever a month's summary rows, or the employees named in them, change"""
+        db = get_db()
+        cursor = db.cursor()
+        cursor.execute(f'''
+            SELECT COUNT(*), MAX(updated_at), TOTAL(total_sales), TOTAL(transaction_count), {_EMPLOYEES_WATERMARK}
+            FROM monthly_sales_report
+            WHERE year = ? AND month = ?
+        ''', (year, month))
+        return ':'.join(str(value) for value in cursor.fetchone())
@@ -1,84 +1,131 @@
 """User model for authentication and user management"""
 import sqlite3
 from werkzeug.security import generate_password_hash, check_password_hash
-from app.utils.database import get_db
+from app.utils import audit, properties
+from app.utils.database import PROPERTIES, current_property, get_group_db
+from app.utils.records import record, fetch_all, fetch_one
+
+EmployeeRecord = record('EmployeeRecord', [
+    ('user_id', int),
+    ('username', str),
+    ('email', str),
+    ('full_name', str),
+    ('role', str),
+    ('department', str),
+    ('phone', str),
+    ('property', str),
+    ('is_active', int)
+])
+
+# Carries the password hash; only for authentication, never for responses
+CredentialsRecord = record('CredentialsRecord', [
+    ('user_id', int),
+    ('username', str),
+    ('password', str),
+    ('email', str),
+    ('full_name', str),
+    ('role', str),
+    ('department', str),
+    ('property', str),
+    ('is_active', int)
+])
 
 class User:
     """User model for database operations"""
     
     @staticmethod
-    def create_user(username, password, email, full_name, role, department=None, phone=None):
-        """Create a new user in the database"""
-        db = get_db()
+    def create_user(username, password, email, full_name, role, department=None, phone=None, property=None):
+        """Create a new user in the database
+        
+        property is the user's home property, or None for group-wide access.
+        """
+        if property is not None and property not in PROPERTIES:
+            return {'success': False, 'error': f'Unknown property {property!r}'}
+        db = get_group_db()
         hashed_password = generate_password_hash(password)
         
         try:
             cursor = db.cursor()
             cursor.execute('''
-                INSERT INTO users (username, password, email, full_name, role, department, phone)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (username, hashed_password, email, full_name, role, department, phone))
+                INSERT INTO users (username, password, email, full_name, role, department, phone, property)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (username, hashed_password, email, full_name, role, department, phone, property))
             db.commit()
+            properties.sync_users()
+            # The password hash stays out of the audit trail
+            audit.record('create', 'user', cursor.lastrowid, new_value={
+                'username': username, 'email': email, 'full_name': full_name,
+                'role': role, 'department': department, 'phone': phone, 'property': property
+            })
             return {'success': True, 'user_id': cursor.lastrowid}
         except sqlite3.IntegrityError as e:
             return {'success': False, 'error': str(e)}
     
     @staticmethod
     def get_user_by_username(username):
-        """Retrieve user by username"""
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM users WHERE username = ?', (username,))
-        user = cursor.fetchone()
-        return user
+        """Retrieve user by username, including the password hash"""
+        return fetch_one(get_group_db(), CredentialsRecord,
+                         f'SELECT {CredentialsRecord.COLUMNS} FROM users WHERE username = ?', (username,))
     
     @staticmethod
     def get_user_by_id(user_id):
         """Retrieve user by ID"""
-        db = get_db()
-        cursor = db.cursor()
-        cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-        user = cursor.fetchone()
-        return user
+        return fetch_one(get_group_db(), EmployeeRecord,
+                         f'SELECT {EmployeeRecord.COLUMNS} FROM users WHERE user_id = ?', (user_id,))
     
     @staticmethod
     def verify_password(username, password):
         """Verify user password"""
         user = User.get_user_by_username(username)
         if user:
-            # user[2] is the password column (hashed)
-            return check_password_hash(user[2], password)
+            return check_password_hash(user.password, password)
         return False
     
     @staticmethod
-    def get_all_users(role=None):
-        """Get all users, optionally filtered by role"""
-        db = get_db()
-        cursor = db.cursor()
+    def get_all_users(role=None, fields=None):
+        """Get all users, optionally filtered by role and only some EmployeeRecord fields
+        
+        With a property selected, only its staff and group-wide accounts.
+        """
+        rec = EmployeeRecord.project(fields)
+        conditions, params = ['is_active = 1'], []
         if role:
-            cursor.execute('SELECT * FROM users WHERE role = ? AND is_active = 1', (role,))
-        else:
-            cursor.execute('SELECT * FROM users WHERE is_active = 1')
-        return cursor.fetchall()
+            conditions.append('role = ?')
+            params.append(role)
+        code = current_property()
+        if code is not None:
+            conditions.append('(property = ? OR property IS NULL)')
+            params.append(code)
+        return fetch_all(get_group_db(), rec, f'''
+            SELECT {rec.COLUMNS} FROM users
+            WHERE {' AND '.join(conditions)}
+        ''', params)
     
     @staticmethod
     def update_user(user_id, **kwargs):
         """Update user information"""
-        db = get_db()
+        db = get_group_db()
         cursor = db.cursor()
         
-        allowed_fields = {'email', 'full_name', 'department', 'phone', 'is_active'}
+        allowed_fields = {'email', 'full_name', 'department', 'phone', 'is_active', 'property'}
         fields_to_update = {k: v for k, v in kwargs.items() if k in allowed_fields}
         
         if not fields_to_update:
             return {'success': False, 'error': 'No valid fields to update'}
+        if fields_to_update.get('property') is not None and fields_to_update['property'] not in PROPERTIES:
+            return {'success': False, 'error': f"Unknown property {fields_to_update['property']!r}"}
         
         set_clause = ', '.join([f'{key} = ?' for key in fields_to_update.keys()])
         values = list(fields_to_update.values()) + [user_id]
         
         try:
-            cursor.execute(f'UPDATE users SET {set_clause} WHERE user_id = ?', values)
+            cursor.execute(f'SELECT {", ".join(fields_to_update)} FROM users WHERE user_id = ?', (user_id,))
+            old = cursor.fetchone()
+            cursor.execute(f'UPDATE users SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?', values)
             db.commit()
+            properties.sync_users()
+            audit.record('update', 'user', user_id,
+                         dict(zip(fields_to_update, old)) if old else None, fields_to_update)
             return {'success': True}
         except Exception as e:
             return {'success': False, 'error': str(e)}
@@ -86,8 +133,13 @@ class User:
     @staticmethod
     def deactivate_user(user_id):
         """Deactivate a user"""
-        db = get_db()
+        db = get_group_db()
         cursor = db.cursor()
-        cursor.execute('UPDATE users SET is_active = 0 WHERE user_id = ?', (user_id,))
+        cursor.execute('SELECT is_active FROM users WHERE user_id = ?', (user_id,))
+        old = cursor.fetchone()
+        cursor.execute('UPDATE users SET is_active = 0, updated_at = CURRENT_TIMESTAMP WHERE user_id = ?', (user_id,))
         db.commit()
+        properties.sync_users()
+        audit.record('deactivate', 'user', user_id,
+                     {'is_active': old[0]} if old else None, {'is_active': 0})
         return {'success': True}
@@ -0,0 +1,39 @@
+"""Audit log routes"""
+from flask import Blueprint, request, jsonify
+from app.models.audit import AuditLog
+from app.utils.auth import token_required, role_required
+
+bp = Blueprint('audit', __name__, url_prefix='/api/audit')
+
+@bp.route('/', methods=['GET'])
+@token_required
+@role_required('Manager', 'Admin')
+def get_audit_log():
+    """Page through audit entries, newest first"""
+    try:
+        entity_id, user_id, before = (
+            int(request.args[name]) if name in request.args else None
+            for name in ('entity_id', 'user_id', 'before')
+        )
+        limit = int(request.args.get('limit', 50))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid numeric parameter'}), 400
+    if limit < 1:
+        return jsonify({'success': False, 'error': 'Invalid limit'}), 400
+
+    entries, next_cursor = AuditLog.query(
+        entity_type=request.args.get('entity_type'),
+        entity_id=entity_id,
+        user_id=user_id,
+        action=request.args.get('action'),
+        start_date=request.args.get('from'),
+        end_date=request.args.get('to'),
+        before=before,
+        limit=limit
+    )
+
+    return jsonify({
+        'success': True,
+        'entries': entries,
+        'next_cursor': next_cursor
+    }), 200
@@ -1,6 +1,7 @@
 """Authentication routes"""
 from flask import Blueprint, request, jsonify
 from app.models.user import User
+from app.utils import database
 from app.utils.auth import generate_token, token_required
 import os
 
@@ -26,23 +27,25 @@ def login():
     if not User.verify_password(username, password):
         return jsonify({'success': False, 'error': 'Invalid credentials'}), 401
     
-    if not user[8]:  # is_active check
+    if not user.is_active:
         return jsonify({'success': False, 'error': 'User account is inactive'}), 401
     
     # Generate token
-    token = generate_token(user[0], user[5], username)
+    token = generate_token(user.user_id, user.role, username, user.property)
     
     return jsonify({
         'success': True,
         'token': token,
         'user': {
-            'user_id': user[0],
-            'username': user[1],
-            'email': user[3],
-            'full_name': user[4],
-            'role': user[5],
-            'department': user[6]
-        }
+            'user_id': user.user_id,
+            'username': user.username,
+            'email': user.email,
+            'full_name': user.full_name,
+            'role': user.role,
+            'department': user.department,
+            'property': user.property
+        },
+        'properties': database.PROPERTIES
     }), 200
 
 @bp.route('/register', methods=['POST'])
@@ -61,7 +64,8 @@ def register():
         full_name=data['full_name'],
         role=data['role'],
         department=data.get('department'),
-        phone=data.get('phone')
+        phone=data.get('phone'),
+        property=data.get('property')
     )
     
     if result['success']:
@@ -94,14 +98,16 @@ def get_profile():
     return jsonify({
         'success': True,
         'user': {
-            'user_id': user[0],
-            'username': user[1],
-            'email': user[3],
-            'full_name': user[4],
-            'role': user[5],
-            'department': user[6],
-            'phone': user[7]
-        }
+            'user_id': user.user_id,
+            'username': user.username,
+            'email': user.email,
+            'full_name': user.full_name,
+            'role': user.role,
+            'department': user.department,
+            'phone': user.phone,
+            'property': user.property
+        },
+        'properties': database.PROPERTIES
     }), 200
 
 @bp.route('/logout', methods=['POST'])
@@ -0,0 +1,86 @@
+"""Change feed routes"""
+from flask import Blueprint, request, jsonify
+from app.utils import changes
+from app.utils.auth import token_required, role_required
+from app.utils.database import get_db
+
+bp = Blueprint('changes', __name__, url_prefix='/api/changes')
+
+@bp.route('', methods=['GET'])
+@token_required
+@role_required('Manager', 'Admin')
+def get_changes():
+    """Long-poll for changes after a seq (or after a consumer's acknowledged position)"""
+    consumer = request.args.get('consumer')
+    tables = [table.strip() for table in request.args.get('tables', '').split(',') if table.strip()]
+    unknown = sorted(set(tables).difference(changes.TRACKED_TABLES))
+    if unknown:
+        return jsonify({'success': False, 'error': f"Unknown table(s): {', '.join(unknown)}. "
+                                                   f"Allowed: {', '.join(changes.TRACKED_TABLES)}"}), 400
+    try:
+        since = int(request.args['since']) if 'since' in request.args else None
+        limit = int(request.args.get('limit', changes.CHANGES_BATCH_SIZE))
+        wait = float(request.args.get('wait', changes.CHANGES_LONG_POLL))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid numeric parameter'}), 400
+    if limit < 1 or wait < 0:
+        return jsonify({'success': False, 'error': 'Invalid limit or wait'}), 400
+
+    db = get_db()
+    if since is None:
+        if not consumer:
+            return jsonify({'success': False, 'error': 'since or consumer parameter required'}), 400
+        since = changes.position(db, consumer) or 0
+
+    limit = min(limit, changes.CHANGES_BATCH_SIZE)
+    if wait:
+        batch, last_seq = changes.wait(db, since, wait, limit, tables)
+    else:
+        batch, last_seq = changes.read(db, since, limit, tables)
+
+    return jsonify({
+        'success': True,
+        'changes': batch,
+        'last_seq': last_seq,
+        'more': len(batch) == limit
+    }), 200
+
+@bp.route('/ack', methods=['POST'])
+@token_required
+@role_required('Manager', 'Admin')
+def ack_changes():
+    """Acknowledge every change up to a seq for a consumer, registering it if new"""
+    data = request.get_json(silent=True) or {}
+    consumer = data.get('consumer')
+    seq = data.get('seq')
+    if not isinstance(consumer, str) or not consumer.strip() or not isinstance(seq, int) or seq < 0:
+        return jsonify({'success': False, 'error': 'consumer (string) and seq (integer) required'}), 400
+
+    return jsonify({
+        'success': True,
+        'consumer': consumer,
+        'acked_seq': changes.ack(get_db(), consumer, seq)
+    }), 200
+
+@bp.route('/consumers', methods=['GET'])
+@token_required
+@role_required('Admin')
+def get_consumers():
+    """Registered consumers with their positions and lag"""
+    db = get_db()
+    head = changes.head(db)
+    return jsonify({
+        'success': True,
+        'head': head,
+        'consumers': [dict(consumer.to_dict(), behind=head - consumer.acked_seq)
+                      for consumer in changes.consumers(db)]
+    }), 200
+
+@bp.route('/consumers/<consumer>', methods=['DELETE'])
+@token_required
+@role_required('Admin')
+def delete_consumer(consumer):
+    """Forget a consumer so its position no longer holds back pruning"""
+    if not changes.drop_consumer(get_db(), consumer):
+        return jsonify({'success': False, 'error': 'Consumer not found'}), 404
+    return jsonify({'success': True}), 200
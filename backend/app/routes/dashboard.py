@@ -1,7 +1,9 @@
 """Dashboard routes for analytics"""
 from flask import Blueprint, request, jsonify
+from app.models.analytics import Analytics
 from app.models.sales import Sales
 from app.models.room import Room
+from app.utils import analytics, properties
 from app.utils.auth import token_required, role_required
 from datetime import datetime, timedelta
 
@@ -10,24 +12,32 @@ bp = Blueprint('dashboard', __name__, url_prefix='/api/dashboard')
 @bp.route('/overview', methods=['GET'])
 @token_required
 def get_dashboard_overview():
-    """Get dashboard overview data"""
+    """Get dashboard overview data (across every property in group scope)"""
     today = datetime.now().date().isoformat()
     
     # Get today's sales
-    daily_sales = Sales.get_all_daily_sales(today)
-    total_today = sum(row[2] for row in daily_sales)
+    daily_sales = [row for rows in properties.fan_out(Sales.get_all_daily_sales, today).values()
+                   for row in rows]
+    total_today = sum(row.total_sales for row in daily_sales)
     
     # Get occupancy
-    occupancy = Room.get_occupancy_report(today)
+    reports = list(properties.fan_out(Room.get_current_occupancy, today).values())
+    total_rooms = sum(row.total_rooms for row in reports)
+    occupied_rooms = sum(row.occupied_rooms for row in reports)
+    if len(reports) == 1:
+        occupancy_rate = reports[0].occupancy_rate
+    else:
+        # The group's rate comes from its room counts, not an average of the properties' rates
+        occupancy_rate = round(occupied_rooms / total_rooms * 100, 2) if total_rooms else 0
     
     return jsonify({
         'success': True,
         'overview': {
             'today_sales': total_today,
-            'total_transactions': sum(row[3] for row in daily_sales),
-            'occupancy_rate': occupancy[6] if occupancy else 0,
-            'occupied_rooms': occupancy[3] if occupancy else 0,
-            'total_rooms': occupancy[2] if occupancy else 0
+            'total_transactions': sum(row.transactions for row in daily_sales),
+            'occupancy_rate': occupancy_rate,
+            'occupied_rooms': occupied_rooms,
+            'total_rooms': total_rooms
         }
     }), 200
 
@@ -35,52 +45,50 @@ def get_dashboard_overview():
 @token_required
 @role_required('Manager', 'Admin')
 def get_sales_trend(days):
-    """Get sales trend for last N days"""
+    """Get sales trend for last N days (across every property in group scope)"""
+    today = datetime.now().date()
+    partials = properties.fan_out(Analytics.get_daily_totals, (today - timedelta(days=days)).isoformat(),
+                                  (today - timedelta(days=1)).isoformat())
+    totals = {row.sale_date: row for row in
+              properties.merge(partials.values(), 'sale_date', ('total_sales', 'transaction_count'))}
     trend_data = []
     
     for i in range(days, 0, -1):
-        date = (datetime.now().date() - timedelta(days=i)).isoformat()
-        sales = Sales.get_all_daily_sales(date)
-        total = sum(row[2] for row in sales)
+        date = (today - timedelta(days=i)).isoformat()
+        row = totals.get(date)
         
         trend_data.append({
             'date': date,
-            'total_sales': total,
-            'transaction_count': sum(row[3] for row in sales)
+            'total_sales': row.total_sales if row else 0,
+            'transaction_count': row.transaction_count if row else 0
         })
     
     return jsonify({
         'success': True,
-        'trend': trend_data
+        'trend': trend_data,
+        'freshness': analytics.freshness()
     }), 200
 
 @bp.route('/employee-leaderboard', methods=['GET'])
 @token_required
 @role_required('Manager', 'Admin')
 def get_employee_leaderboard():
-    """Get top performing employees"""
+    """Get top performing employees (across every property in group scope)"""
     days = int(request.args.get('days', 30))
     
-    employee_totals = {}
-    
-    for i in range(days, 0, -1):
-        date = (datetime.now().date() - timedelta(days=i)).isoformat()
-        sales = Sales.get_all_daily_sales(date)
-        
-        for row in sales:
-            emp_id = row[0]
-            if emp_id not in employee_totals:
-                employee_totals[emp_id] = {
-                    'name': row[1],
-                    'total': 0,
-                    'transactions': 0
-                }
-            employee_totals[emp_id]['total'] += row[2]
-            employee_totals[emp_id]['transactions'] += row[3]
+    today = datetime.now().date()
+    partials = properties.fan_out(Analytics.get_employee_totals,
+                                  (today - timedelta(days=days)).isoformat(),
+                                  (today - timedelta(days=1)).isoformat())
+    employee_totals = [{
+        'name': row.employee_name,
+        'total': row.total_sales,
+        'transactions': row.transactions
+    } for row in properties.merge(partials.values(), 'user_id', ('total_sales', 'transactions'))]
     
     # Sort by total sales
     leaderboard = sorted(
-        employee_totals.values(),
+        employee_totals,
         key=lambda x: x['total'],
         reverse=True
     )[:10]
@@ -88,59 +96,29 @@ def get_employee_leaderboard():
     return jsonify({
         'success': True,
         'leaderboard': leaderboard,
-        'period_days': days
+        'period_days': days,
+        'freshness': analytics.freshness()
     }), 200
 
 @bp.route('/category-breakdown/<date>', methods=['GET'])
 @token_required
 def get_category_breakdown(date):
-    """Get sales breakdown by category"""
-    from app.utils.database import get_db
-    
-    db = get_db()
-    cursor = db.cursor()
-    
-    cursor.execute('''
-        SELECT category, SUM(amount) as total
-        FROM sales
-        WHERE sale_date = ?
-        GROUP BY category
-    ''', (date,))
-    
-    results = cursor.fetchall()
-    
+    """Get sales breakdown by category (across every property in group scope)"""
+    partials = properties.fan_out(Analytics.get_category_totals, date)
     return jsonify({
         'success': True,
-        'breakdown': [{
-            'category': row[0],
-            'total': row[1]
-        } for row in results]
+        'breakdown': properties.merge(partials.values(), 'category', ('total',)),
+        'freshness': analytics.freshness()
     }), 200
 
 @bp.route('/payment-method-breakdown/<date>', methods=['GET'])
 @token_required
 @role_required('Manager', 'Admin')
 def get_payment_breakdown(date):
-    """Get payment method breakdown"""
-    from app.utils.database import get_db
-    
-    db = get_db()
-    cursor = db.cursor()
-    
-    cursor.execute('''
-        SELECT payment_method, COUNT(*) as count, SUM(amount) as total
-        FROM sales
-        WHERE sale_date = ?
-        GROUP BY payment_method
-    ''', (date,))
-    
-    results = cursor.fetchall()
-    
+    """Get payment method breakdown (across every property in group scope)"""
+    partials = properties.fan_out(Analytics.get_payment_method_totals, date)
     return jsonify({
         'success': True,
-        'breakdown': [{
-            'payment_method': row[0],
-            'count': row[1],
-            'total': row[2]
-        } for row in results]
+        'breakdown': properties.merge(partials.values(), 'payment_method', ('count', 'total')),
+        'freshness': analytics.freshness()
     }), 200
@@ -2,6 +2,8 @@
 from flask import Blueprint, request, jsonify
 from app.models.user import User
 from app.utils.auth import token_required, role_required
+from app.utils.database import current_property
+from app.utils.records import split_fields, UnknownFieldError
 
 bp = Blueprint('employees', __name__, url_prefix='/api/employees')
 
@@ -11,20 +13,14 @@ bp = Blueprint('employees', __name__, url_prefix='/api/employees')
 def get_employees():
     """Get all employees"""
     role = request.args.get('role')
-    users = User.get_all_users(role)
+    try:
+        users = User.get_all_users(role, fields=split_fields(request.args.get('fields')))
+    except UnknownFieldError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     return jsonify({
         'success': True,
-        'employees': [{
-            'user_id': row[0],
-            'username': row[1],
-            'email': row[3],
-            'full_name': row[4],
-            'role': row[5],
-            'department': row[6],
-            'phone': row[7],
-            'is_active': row[8]
-        } for row in users]
+        'employees': users
     }), 200
 
 @bp.route('/<int:employee_id>', methods=['GET'])
@@ -42,16 +38,7 @@ def get_employee(employee_id):
     
     return jsonify({
         'success': True,
-        'employee': {
-            'user_id': user[0],
-            'username': user[1],
-            'email': user[3],
-            'full_name': user[4],
-            'role': user[5],
-            'department': user[6],
-            'phone': user[7],
-            'is_active': user[8]
-        }
+        'employee': user
     }), 200
 
 @bp.route('/', methods=['POST'])
@@ -65,6 +52,11 @@ def create_employee():
     if not all(field in data for field in required_fields):
         return jsonify({'success': False, 'error': 'Missing required fields'}), 400
     
+    # Property admins only create staff for their own property
+    home = request.user.get('property')
+    if home is not None and data.get('property', home) != home:
+        return jsonify({'success': False, 'error': 'Insufficient permissions'}), 403
+    
     result = User.create_user(
         username=data['username'],
         password=data['password'],
@@ -72,7 +64,8 @@ def create_employee():
         full_name=data['full_name'],
         role=data['role'],
         department=data.get('department'),
-        phone=data.get('phone')
+        phone=data.get('phone'),
+        property=data.get('property', current_property())
     )
     
     if result['success']:
@@ -91,6 +84,10 @@ def update_employee(employee_id):
     """Update employee details"""
     data = request.get_json()
     
+    home = request.user.get('property')
+    if home is not None and data.get('property', home) != home:
+        return jsonify({'success': False, 'error': 'Insufficient permissions'}), 403
+    
     result = User.update_user(employee_id, **data)
     
     if result['success']:
@@ -120,14 +117,14 @@ def get_employees_by_department(department):
     """Get employees by department"""
     users = User.get_all_users()
     
-    filtered = [row for row in users if row[6] == department]
+    filtered = [user for user in users if user.department == department]
     
     return jsonify({
         'success': True,
         'employees': [{
-            'user_id': row[0],
-            'username': row[1],
-            'full_name': row[4],
-            'department': row[6]
-        } for row in filtered]
+            'user_id': user.user_id,
+            'username': user.username,
+            'full_name': user.full_name,
+            'department': user.department
+        } for user in filtered]
     }), 200
@@ -1,174 +1,377 @@
 """Reports generation routes"""
-from flask import Blueprint, request, jsonify, send_file
+from flask import Blueprint, Response, current_app, request, jsonify, send_file
+from app.models.analytics import Analytics
 from app.models.sales import Sales
+from app.utils import analytics, export_jobs, properties
 from app.utils.auth import token_required, role_required
-from app.utils.export import export_to_excel, export_to_pdf
+from app.utils.database import PropertyError
+from app.utils.export import stream_export, STREAM_MIMETYPES, OPENPYXL_AVAILABLE
+from app.utils.reporting import build_period_report, build_performance_report, period_range
 from datetime import datetime, timedelta
 import os
 
 bp = Blueprint('reports', __name__, url_prefix='/api/reports')
 
+MAX_COMPARISON_YEARS = 10
+
+MONTHLY_TOTAL_FIELDS = ('total_sales', 'room_sales', 'food_sales', 'beverage_sales',
+                        'service_sales', 'transaction_count')
+
+SALES_EXPORT_HEADERS = ['Sale ID', 'Date', 'Employee', 'Category', 'Description',
+                        'Amount', 'Payment Method', 'Transaction ID']
+
+def _stream_download(rows, filename, title, headers=None, export_format='excel'):
+    """Stream rows to the client as an XLSX, CSV or gzipped CSV attachment"""
+    if export_format == 'excel' and not OPENPYXL_AVAILABLE:
+        return jsonify({'success': False, 'error': 'openpyxl not installed'}), 500
+    
+    return Response(
+        stream_export(rows, headers, title, export_format),
+        mimetype=STREAM_MIMETYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 @bp.route('/daily/<date>', methods=['GET'])
 @token_required
 @role_required('Manager', 'Admin')
 def get_daily_report(date):
-    """Get daily sales report"""
-    sales = Sales.get_all_daily_sales(date)
+    """Get daily sales report (across every property in group scope)"""
+    partials = properties.fan_out(Analytics.get_employee_totals, date, date)
+    sales = properties.merge(partials.values(), 'user_id', ('total_sales', 'transactions'))
+    
+    total_sales = sum(row.total_sales for row in sales)
+    total_transactions = sum(row.transactions for row in sales)
     
-    total_sales = sum(row[2] for row in sales)
-    total_transactions = sum(row[3] for row in sales)
+    report = {
+        'date': date,
+        'total_sales': total_sales,
+        'total_transactions': total_transactions,
+        'employees': sales
+    }
+    if None not in partials:
+        report['properties'] = {code: {
+            'total_sales': sum(row.total_sales for row in rows),
+            'total_transactions': sum(row.transactions for row in rows)
+        } for code, rows in partials.items()}
     
     return jsonify({
         'success': True,
-        'report': {
-            'date': date,
-            'total_sales': total_sales,
-            'total_transactions': total_transactions,
-            'employees': [{
-                'user_id': row[0],
-                'employee_name': row[1],
-                'total_sales': row[2],
-                'transactions': row[3]
-            } for row in sales]
-        }
+        'report': report,
+        'freshness': analytics.freshness()
+    }), 200
+
+@bp.route('/stays', methods=['GET'])
+@token_required
+@role_required('Manager', 'Admin')
+def get_stays_report():
+    """Get stays, nights, guests and room revenue per room type (across every property in group scope)"""
+    start_date = request.args.get('from')
+    end_date = request.args.get('to', start_date)
+    try:
+        datetime.strptime(start_date or '', '%Y-%m-%d')
+        datetime.strptime(end_date, '%Y-%m-%d')
+    except ValueError:
+        return jsonify({'success': False, 'error': 'from and to must be YYYY-MM-DD dates'}), 400
+    
+    partials = properties.fan_out(Analytics.get_stay_totals, start_date, end_date)
+    room_types = properties.merge(partials.values(), 'room_type', ('stays', 'nights', 'guests', 'revenue'))
+    
+    report = {
+        'from': start_date,
+        'to': end_date,
+        'stays': sum(row.stays for row in room_types),
+        'revenue': sum(row.revenue for row in room_types),
+        'room_types': sorted(room_types, key=lambda row: row.room_type)
+    }
+    if None not in partials:
+        report['properties'] = {code: {
+            'stays': sum(row.stays for row in rows),
+            'revenue': sum(row.revenue for row in rows)
+        } for code, rows in partials.items()}
+    
+    return jsonify({
+        'success': True,
+        'report': report,
+        'freshness': analytics.freshness()
     }), 200
 
 @bp.route('/monthly/<year>/<month>', methods=['GET'])
 @token_required
 @role_required('Manager', 'Admin')
 def get_monthly_report(year, month):
-    """Get monthly sales report"""
-    sales = Sales.get_all_daily_sales.__doc__  # This is a placeholder for proper monthly aggregation
+    """Get monthly sales report (across every property in group scope)"""
+    partials = properties.fan_out(Sales.get_monthly_summary, int(year), int(month))
     
-    # Aggregate monthly data
-    summary = Sales.get_monthly_summary(int(year), int(month))
+    def totals(summary):
+        return (sum(row.total_sales for row in summary if row.total_sales),
+                sum(row.transaction_count for row in summary if row.transaction_count))
     
-    total_sales = 0
-    total_transactions = 0
+    # Per-employee rows merged across properties
+    summary = properties.merge(partials.values(), 'employee_id', MONTHLY_TOTAL_FIELDS)
+    total_sales, total_transactions = totals(summary)
     
-    if summary:
-        total_sales = sum(row[4] for row in summary if row[4])
-        total_transactions = sum(row[8] for row in summary if row[8])
+    report = {
+        'year': year,
+        'month': month,
+        'total_sales': total_sales,
+        'total_transactions': total_transactions
+    }
+    if None not in partials:
+        report['properties'] = {code: dict(zip(('total_sales', 'total_transactions'), totals(rows)))
+                                for code, rows in partials.items()}
     
     return jsonify({
         'success': True,
-        'report': {
-            'year': year,
-            'month': month,
-            'total_sales': total_sales,
-            'total_transactions': total_transactions
-        }
+        'report': report
     }), 200
 
 @bp.route('/yearly/<year>', methods=['GET'])
 @token_required
 @role_required('Manager', 'Admin')
 def get_yearly_report(year):
-    """Get yearly sales report"""
-    yearly_total = 0
-    yearly_data = []
-    
-    for month in range(1, 13):
-        summary = Sales.get_monthly_summary(int(year), month)
-        month_total = sum(row[4] for row in summary if row[4]) if summary else 0
-        yearly_total += month_total
-        yearly_data.append({
-            'month': month,
-            'total': month_total
-        })
+    """Get yearly sales report with growth over the previous year (across every property in group scope)"""
+    year = int(year)
+    report = build_period_report([year - 1, year])
+    current = report['years'][year]
     
     return jsonify({
         'success': True,
         'report': {
             'year': year,
-            'total_sales': yearly_total,
-            'monthly_breakdown': yearly_data
+            'total_sales': current['total_sales'],
+            'transactions': current['transactions'],
+            'categories': current['categories'],
+            'monthly_breakdown': [{
+                'month': month['month'],
+                'total': month['total_sales'],
+                'transactions': month['transactions'],
+                'categories': month['categories']
+            } for month in current['monthly']],
+            'quarterly_breakdown': current['quarterly'],
+            'growth': report['comparisons'][0]
         }
     }), 200
 
+@bp.route('/comparison', methods=['GET'])
+@token_required
+@role_required('Manager', 'Admin')
+def get_year_comparison():
+    """Compare any set of years by year, quarter, month and category (across every property in group scope)"""
+    try:
+        years = [int(year) for year in request.args.get('years', '').split(',') if year.strip()]
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid years'}), 400
+    
+    if not years:
+        return jsonify({'success': False, 'error': 'years parameter required'}), 400
+    
+    if len(set(years)) > MAX_COMPARISON_YEARS:
+        return jsonify({'success': False, 'error': f'At most {MAX_COMPARISON_YEARS} years can be compared'}), 400
+    
+    return jsonify({
+        'success': True,
+        'report': build_period_report(years)
+    }), 200
+
 @bp.route('/employee-performance/<employee_id>/<period>', methods=['GET'])
 @token_required
 def get_employee_report(employee_id, period):
-    """Get employee performance report"""
-    performance = Sales.get_employee_daily_performance(int(employee_id))
+    """Get employee performance report for a period or date range
+    
+    Pass ``all`` as the employee id for every employee at once. In group
+    scope, figures and ranks cover every property.
+    """
+    batch = employee_id == 'all'
+    
+    if batch or int(employee_id) != request.user['user_id']:
+        if request.user['role'] not in ['Manager', 'Admin']:
+            return jsonify({'success': False, 'error': 'Insufficient permissions'}), 403
+    
+    try:
+        start_date, end_date = period_range(period, request.args.get('from'), request.args.get('to'))
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    performance = build_performance_report(start_date, end_date, None if batch else int(employee_id))
     
-    total_sales = sum(row[3] for row in performance if row[3])
-    avg_daily_sales = total_sales / len(performance) if performance else 0
+    if batch:
+        return jsonify({
+            'success': True,
+            'report': {
+                'period': period,
+                'from': start_date,
+                'to': end_date,
+                'employees': performance
+            }
+        }), 200
+    
+    employee = performance[0] if performance else {
+        'total_sales': 0, 'transactions': 0, 'active_days': 0, 'avg_daily_sales': 0,
+        'rank': None, 'peers': None, 'daily_performance': []
+    }
     
     return jsonify({
         'success': True,
         'report': {
             'employee_id': employee_id,
             'period': period,
-            'total_sales': total_sales,
-            'avg_daily_sales': avg_daily_sales,
-            'daily_performance': [{
-                'date': row[2],
-                'total_sales': row[3],
-                'room_sales': row[4],
-                'food_sales': row[5],
-                'beverage_sales': row[6],
-                'service_sales': row[7],
-                'transactions': row[8]
-            } for row in performance]
+            'from': start_date,
+            'to': end_date,
+            'total_sales': employee['total_sales'],
+            'transactions': employee['transactions'],
+            'active_days': employee['active_days'],
+            'avg_daily_sales': employee['avg_daily_sales'],
+            'rank': employee['rank'],
+            'peers': employee['peers'],
+            'daily_performance': employee['daily_performance']
         }
     }), 200
 
-@bp.route('/export/daily/<date>', methods=['GET'])
-@token_required
-@role_required('Manager', 'Admin')
-def export_daily_report(date):
-    """Export daily report to Excel or PDF"""
-    export_format = request.args.get('format', 'excel')
-    
+def _daily_export(date):
+    """Rows for the daily report export"""
     sales = Sales.get_all_daily_sales(date)
     
     data = [{
-        'Employee': row[1],
-        'Total Sales': row[2],
-        'Transactions': row[3]
+        'Employee': row.employee_name,
+        'Total Sales': row.total_sales,
+        'Transactions': row.transactions
     } for row in sales]
     
-    filename = f"daily_report_{date}_.{'xlsx' if export_format == 'excel' else 'pdf'}"
-    filepath = os.path.join('/tmp', filename)
+    return data, None, f"Daily Sales Report - {date}"
+
+def _monthly_export(year, month):
+    """Rows for the monthly report export"""
+    summary = Sales.get_monthly_summary(year, month)
+    
+    data = [{
+        'Employee': row.employee_name or 'N/A',
+        'Total Sales': row.total_sales,
+        'Room Sales': row.room_sales,
+        'Food Sales': row.food_sales,
+        'Beverage Sales': row.beverage_sales,
+        'Service Sales': row.service_sales
+    } for row in summary] if summary else []
     
-    if export_format == 'excel':
-        result_file, status = export_to_excel(data, filepath, f"Daily Sales Report - {date}")
-    else:
-        result_file, status = export_to_pdf(data, filepath, f"Daily Sales Report - {date}")
+    return data, None, f"Monthly Sales Report - {year}-{month:02d}"
+
+def _sales_export(date_from, date_to):
+    """Rows for the individual sales export"""
+    rows = Sales.iter_sales_between(date_from, date_to)
+    return rows, SALES_EXPORT_HEADERS, f"Sales - {date_from} to {date_to}"
+
+export_jobs.register_report(
+    'daily', {'date': str}, _daily_export,
+    watermark=lambda date: Sales.get_sales_watermark(date, date),
+    filename=lambda date: f"daily_report_{date}_"
+)
+export_jobs.register_report(
+    'monthly', {'year': int, 'month': int}, _monthly_export,
+    watermark=Sales.get_monthly_summary_watermark,
+    filename=lambda year, month: f"monthly_report_{year}_{month:02d}_"
+)
+export_jobs.register_report(
+    'sales', {'date_from': str, 'date_to': str}, _sales_export,
+    watermark=lambda date_from, date_to: Sales.get_sales_watermark(date_from, date_to),
+    filename=lambda date_from, date_to: f"sales_{date_from}_{date_to}",
+    pdf_section='Employee'
+)
+
+def _export_download(report_type, params, export_format):
+    """Send an export, streaming Excel/CSV and serving PDF from the artifact cache"""
+    try:
+        if export_format in STREAM_MIMETYPES:
+            rows, headers, title, filename = export_jobs.build_export(report_type, params, export_format)
+            return _stream_download(rows, filename, title, headers, export_format)
+        
+        path, filename = export_jobs.render_cached(report_type, params, export_format)
+    except (export_jobs.ExportError, PropertyError) as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'success': False, 'error': str(e)}), 500
     
-    if result_file:
-        return send_file(result_file, as_attachment=True, download_name=filename)
-    else:
-        return jsonify({'success': False, 'error': status}), 500
+    return send_file(path, as_attachment=True, download_name=filename)
+
+@bp.route('/export/daily/<date>', methods=['GET'])
+@token_required
+@role_required('Manager', 'Admin')
+def export_daily_report(date):
+    """Export daily report to Excel, PDF or CSV"""
+    export_format = request.args.get('format', 'excel')
+    return _export_download('daily', {'date': date}, export_format)
 
 @bp.route('/export/monthly/<year>/<month>', methods=['GET'])
 @token_required
 @role_required('Manager', 'Admin')
 def export_monthly_report(year, month):
-    """Export monthly report to Excel or PDF"""
+    """Export monthly report to Excel, PDF or CSV"""
     export_format = request.args.get('format', 'excel')
+    return _export_download('monthly', {'year': year, 'month': month}, export_format)
+
+@bp.route('/export/sales', methods=['GET'])
+@token_required
+@role_required('Manager', 'Admin')
+def export_sales():
+    """Export individual sales for a date range to Excel, PDF or CSV"""
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
     
-    summary = Sales.get_monthly_summary(int(year), int(month))
+    if not date_from or not date_to:
+        return jsonify({'success': False, 'error': 'from and to dates required'}), 400
     
-    data = [{
-        'Employee': row[2] if row[2] else 'N/A',
-        'Total Sales': row[4],
-        'Room Sales': row[5],
-        'Food Sales': row[6],
-        'Beverage Sales': row[7],
-        'Service Sales': row[8]
-    } for row in summary] if summary else []
+    export_format = request.args.get('format', 'excel')
+    return _export_download('sales', {'date_from': date_from, 'date_to': date_to}, export_format)
+
+@bp.route('/export-jobs', methods=['POST'])
+@token_required
+@role_required('Manager', 'Admin')
+def create_export_job():
+    """Queue a report export to run in the background"""
+    data = request.get_json()
+    
+    if not data or 'report' not in data:
+        return jsonify({'success': False, 'error': 'Missing required fields'}), 400
+    
+    try:
+        job = export_jobs.submit_job(
+            current_app._get_current_object(),
+            data['report'],
+            data.get('params'),
+            data.get('format', 'excel'),
+            user_id=request.user['user_id']
+        )
+    except export_jobs.ExportError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    return jsonify({'success': True, 'job': job}), 202
+
+@bp.route('/export-jobs/<job_id>', methods=['GET'])
+@token_required
+@role_required('Manager', 'Admin')
+def get_export_job(job_id):
+    """Get export job status and progress"""
+    job = export_jobs.get_job(job_id)
+    
+    if not job:
+        return jsonify({'success': False, 'error': 'Export job not found'}), 404
+    
+    return jsonify({'success': True, 'job': job}), 200
+
+@bp.route('/export-jobs/<job_id>/download', methods=['GET'])
+@token_required
+@role_required('Manager', 'Admin')
+def download_export_job(job_id):
+    """Download a finished export"""
+    job = export_jobs.get_job(job_id)
+    
+    if not job:
+        return jsonify({'success': False, 'error': 'Export job not found'}), 404
     
-    filename = f"monthly_report_{year}_{month:02d}_.{'xlsx' if export_format == 'excel' else 'pdf'}"
-    filepath = os.path.join('/tmp', filename)
+    if job['status'] != 'Completed':
+        return jsonify({'success': False, 'error': f"Export job is {job['status'].lower()}"}), 409
     
-    if export_format == 'excel':
-        result_file, status = export_to_excel(data, filepath, f"Monthly Sales Report - {year}-{month:02d}")
-    else:
-        result_file, status = export_to_pdf(data, filepath, f"Monthly Sales Report - {year}-{month:02d}")
+    path = export_jobs.artifact_path(job['cache_key'], job['export_format'])
+    if not os.path.exists(path):
+        return jsonify({'success': False, 'error': 'Export has expired, please request it again'}), 410
     
-    if result_file:
-        return send_file(result_file, as_attachment=True, download_name=filename)
-    else:
-        return jsonify({'success': False, 'error': status}), 500
+    filename = export_jobs.download_name(job['report_type'], job['params'], job['export_format'])
+    return send_file(path, as_attachment=True, download_name=filename)
@@ -3,6 +3,7 @@ from flask import Blueprint, request, jsonify
 from app.models.room import Room
 from app.utils.auth import token_required, role_required
 from app.utils.database import generate_occupancy_report
+from app.utils.records import split_fields, UnknownFieldError
 
 bp = Blueprint('rooms', __name__, url_prefix='/api/rooms')
 
@@ -10,35 +11,28 @@ bp = Blueprint('rooms', __name__, url_prefix='/api/rooms')
 @token_required
 def get_rooms():
     """Get all rooms"""
-    rooms = Room.get_all_rooms()
+    try:
+        rooms = Room.get_all_rooms(fields=split_fields(request.args.get('fields')))
+    except UnknownFieldError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     return jsonify({
         'success': True,
-        'rooms': [{
-            'room_id': row[0],
-            'room_number': row[1],
-            'room_type': row[2],
-            'capacity': row[3],
-            'price_per_night': row[4],
-            'status': row[5]
-        } for row in rooms]
+        'rooms': rooms
     }), 200
 
 @bp.route('/available', methods=['GET'])
 @token_required
 def get_available_rooms():
     """Get available rooms"""
-    rooms = Room.get_available_rooms()
+    try:
+        rooms = Room.get_available_rooms(fields=split_fields(request.args.get('fields')))
+    except UnknownFieldError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     return jsonify({
         'success': True,
-        'rooms': [{
-            'room_id': row[0],
-            'room_number': row[1],
-            'room_type': row[2],
-            'capacity': row[3],
-            'price_per_night': row[4]
-        } for row in rooms]
+        'rooms': rooms
     }), 200
 
 @bp.route('/', methods=['POST'])
@@ -128,45 +122,50 @@ def check_out_room(room_id):
 @token_required
 def get_active_check_ins():
     """Get all active check-ins"""
-    check_ins = Room.get_active_check_ins()
+    try:
+        check_ins = Room.get_active_check_ins(fields=split_fields(request.args.get('fields')))
+    except UnknownFieldError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     return jsonify({
         'success': True,
-        'check_ins': [{
-            'check_in_id': row[0],
-            'room_id': row[1],
-            'guest_name': row[2],
-            'guest_email': row[3],
-            'guest_phone': row[4],
-            'check_in_date': row[5],
-            'check_out_date': row[6],
-            'number_of_guests': row[7],
-            'room_number': row[10],
-            'employee_name': row[11]
-        } for row in check_ins]
+        'check_ins': check_ins
+    }), 200
+
+@bp.route('/guests/search', methods=['GET'])
+@token_required
+def search_guests():
+    """Search guests across active and historical stays"""
+    query = request.args.get('q', '').strip()
+    if not query:
+        return jsonify({'success': False, 'error': 'Search query required'}), 400
+    
+    status = request.args.get('status')
+    if status and status not in ('Active', 'Completed', 'Cancelled'):
+        return jsonify({'success': False, 'error': 'Invalid status'}), 400
+    
+    try:
+        limit = int(request.args.get('limit', 20))
+    except ValueError:
+        return jsonify({'success': False, 'error': 'Invalid limit'}), 400
+    if limit < 1:
+        return jsonify({'success': False, 'error': 'Invalid limit'}), 400
+    
+    guests = Room.search_guests(query, status=status, limit=limit)
+    
+    return jsonify({
+        'success': True,
+        'guests': guests
     }), 200
 
 @bp.route('/occupancy-report', methods=['GET'])
 @token_required
 @role_required('Manager', 'Admin')
 def get_occupancy_report():
-    """Get occupancy report"""
-    generate_occupancy_report()
-    
+    """Get occupancy report (refreshed by check-ins, check-outs and the scheduler)"""
     report = Room.get_occupancy_report()
     
-    if report:
-        return jsonify({
-            'success': True,
-            'occupancy': {
-                'occupancy_id': report[0],
-                'report_date': report[1],
-                'total_rooms': report[2],
-                'occupied_rooms': report[3],
-                'available_rooms': report[4],
-                'maintenance_rooms': report[5],
-                'occupancy_rate': report[6]
-            }
-        }), 200
-    else:
-        return jsonify({'success': True, 'occupancy': None}), 200
+    return jsonify({
+        'success': True,
+        'occupancy': report
+    }), 200
@@ -1,8 +1,10 @@
 """Sales routes"""
-from flask import Blueprint, request, jsonify
-from app.models.sales import Sales
+from flask import Blueprint, Response, request, jsonify
+from app.models.sales import Sales, RAW_SALES_COLUMNS
 from app.models.user import User
 from app.utils.auth import token_required, role_required
+from app.utils.export import stream_export, STREAM_MIMETYPES
+from app.utils.records import split_fields, UnknownFieldError
 from datetime import datetime
 
 bp = Blueprint('sales', __name__, url_prefix='/api/sales')
@@ -48,19 +50,14 @@ def record_sale():
 @token_required
 def get_daily_sales(employee_id, date):
     """Get daily sales for an employee"""
-    sales = Sales.get_daily_sales(int(employee_id), date)
+    try:
+        sales = Sales.get_daily_sales(int(employee_id), date, fields=split_fields(request.args.get('fields')))
+    except UnknownFieldError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     return jsonify({
         'success': True,
-        'sales': [{
-            'sale_id': row[0],
-            'employee_id': row[1],
-            'sale_date': row[2],
-            'category': row[3],
-            'description': row[4],
-            'amount': row[5],
-            'payment_method': row[6]
-        } for row in sales]
+        'sales': sales
     }), 200
 
 @bp.route('/monthly/<year>/<month>', methods=['GET'])
@@ -70,60 +67,73 @@ def get_monthly_sales(year, month):
     """Get monthly sales"""
     employee_id = request.args.get('employee_id')
     
-    sales = Sales.get_monthly_sales(
-        employee_id=int(employee_id) if employee_id else None,
-        year=int(year),
-        month=int(month)
-    )
+    try:
+        sales = Sales.get_monthly_sales(
+            employee_id=int(employee_id) if employee_id else None,
+            year=int(year),
+            month=int(month),
+            fields=split_fields(request.args.get('fields'))
+        )
+    except UnknownFieldError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     return jsonify({
         'success': True,
-        'sales': [{
-            'sale_id': row[0],
-            'employee_id': row[1],
-            'sale_date': row[2],
-            'category': row[3],
-            'amount': row[5]
-        } for row in sales]
+        'sales': sales
     }), 200
 
 @bp.route('/daily-summary/<date>', methods=['GET'])
 @token_required
 def get_daily_summary(date):
     """Get daily summary across all employees"""
-    summary = Sales.get_all_daily_sales(date)
+    try:
+        summary = Sales.get_all_daily_sales(date, fields=split_fields(request.args.get('fields')))
+    except UnknownFieldError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     return jsonify({
         'success': True,
-        'summary': [{
-            'user_id': row[0],
-            'employee_name': row[1],
-            'total_sales': row[2],
-            'transactions': row[3]
-        } for row in summary]
+        'summary': summary
     }), 200
 
 @bp.route('/employee-performance/<employee_id>', methods=['GET'])
 @token_required
 def get_employee_performance(employee_id):
     """Get employee's performance summary"""
-    performance = Sales.get_employee_daily_performance(int(employee_id))
+    try:
+        performance = Sales.get_employee_daily_performance(int(employee_id), fields=split_fields(request.args.get('fields')))
+    except UnknownFieldError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
     
     return jsonify({
         'success': True,
-        'performance': [{
-            'summary_id': row[0],
-            'employee_id': row[1],
-            'sale_date': row[2],
-            'total_sales': row[3],
-            'room_sales': row[4],
-            'food_sales': row[5],
-            'beverage_sales': row[6],
-            'service_sales': row[7],
-            'transaction_count': row[8]
-        } for row in performance]
+        'performance': performance
     }), 200
 
+@bp.route('/export', methods=['GET'])
+@token_required
+@role_required('Manager', 'Admin')
+def export_sales():
+    """Stream raw sales rows for a date range as CSV or gzipped CSV"""
+    date_from = request.args.get('from')
+    date_to = request.args.get('to')
+    export_format = request.args.get('format', 'csv')
+    
+    if not date_from or not date_to:
+        return jsonify({'success': False, 'error': 'from and to dates required'}), 400
+    
+    if export_format not in ('csv', 'csv.gz'):
+        return jsonify({'success': False, 'error': 'Unsupported export format'}), 400
+    
+    rows = Sales.iter_raw_sales(date_from, date_to)
+    filename = f"sales_{date_from}_{date_to}.{export_format}"
+    
+    return Response(
+        stream_export(rows, RAW_SALES_COLUMNS, export_format=export_format),
+        mimetype=STREAM_MIMETYPES[export_format],
+        headers={'Content-Disposition': f'attachment; filename={filename}'}
+    )
+
 @bp.route('/categories', methods=['GET'])
 @token_required
 def get_sale_categories():
@@ -0,0 +1,367 @@
+"""
+Read-optimized analytics replica
+
+Report and dashboard aggregations scan ``sales`` and ``check_ins`` in the
+database that every sale and check-in is written to, and join them to
+``users`` and ``rooms`` on each request. With ANALYTICS_REPLICA=1 they
+read a separate file instead, ``<name>-analytics.db`` beside the
+database (one per property database), holding pre-joined fact tables:
+
+- ``sales_fact``: each sale with its employee's name and department.
+- ``stay_fact``: each stay with its room's number, type and price, the
+  number of nights and the room revenue.
+
+Both have wide covering indexes, so each routed report reads a single
+index range and never touches the table rows. The replica is only
+written by ``refresh()``, which the scheduler runs every minute
+(``analytics_refresh``).
+
+A refresh is incremental. New rows are copied past the high-water marks
+of ``sale_id`` and ``check_in_id`` kept in ``replica_state``, in chunks
+of ANALYTICS_CHUNK_SIZE rows, each its own short transaction, so the
+primary is only read-locked for a chunk at a time. Sales are never
+updated in place; the only stay updates are check-outs of active stays,
+so active stays are re-read on every refresh. Renamed employees and
+changed rooms are found by comparing the primary with small dimension
+copies (``employee_dim``, ``room_dim``) and patched into the facts. The
+first refresh also copies the archived years (app.utils.archive); rows
+archived later are kept.
+
+Routed responses carry ``freshness``: when the replica was refreshed,
+its age in seconds and how many sales and check-ins it has not seen
+yet. Until a replica has been built, reports read the primary.
+
+Settings (environment):
+    ANALYTICS_REPLICA       1 to refresh the replica and route reports to it (default off)
+    ANALYTICS_CHUNK_SIZE    rows copied per transaction (5000)
+
+Usage (from the backend directory):
+    python -m app.utils.analytics              refresh now
+    python -m app.utils.analytics --rebuild    rebuild from scratch
+    python -m app.utils.analytics --status
+"""
+import logging
+import os
+import sqlite3
+import time
+from datetime import datetime, timezone
+from flask import g
+from app.utils import archive, cli, database
+
+ANALYTICS_REPLICA = os.environ.get('ANALYTICS_REPLICA', '0') != '0'
+ANALYTICS_CHUNK_SIZE = int(os.environ.get('ANALYTICS_CHUNK_SIZE', 5000))
+
+logger = logging.getLogger('app.analytics')
+
+REPLICA_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS {db}.sales_fact (
+    sale_id INTEGER PRIMARY KEY,
+    sale_date DATE NOT NULL,
+    employee_id INTEGER NOT NULL,
+    employee_name TEXT,
+    department TEXT,
+    category TEXT NOT NULL,
+    payment_method TEXT,
+    amount REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS {db}.idx_sales_fact_date
+    ON sales_fact(sale_date, employee_id, category, payment_method, amount, employee_name);
+CREATE INDEX IF NOT EXISTS {db}.idx_sales_fact_employee ON sales_fact(employee_id);
+
+CREATE TABLE IF NOT EXISTS {db}.stay_fact (
+    check_in_id INTEGER PRIMARY KEY,
+    check_in_date DATE NOT NULL,
+    check_out_date DATE NOT NULL,
+    nights INTEGER NOT NULL,
+    status TEXT,
+    number_of_guests INTEGER,
+    employee_id INTEGER,
+    room_id INTEGER NOT NULL,
+    room_number TEXT,
+    room_type TEXT,
+    price_per_night REAL,
+    revenue REAL
+);
+CREATE INDEX IF NOT EXISTS {db}.idx_stay_fact_date
+    ON stay_fact(check_in_date, room_type, status, nights, number_of_guests, revenue);
+CREATE INDEX IF NOT EXISTS {db}.idx_stay_fact_room ON stay_fact(room_id);
+CREATE INDEX IF NOT EXISTS {db}.idx_stay_fact_active ON stay_fact(check_in_id) WHERE status = 'Active';
+
+CREATE TABLE IF NOT EXISTS {db}.employee_dim (
+    user_id INTEGER PRIMARY KEY,
+    full_name TEXT,
+    department TEXT
+);
+
+CREATE TABLE IF NOT EXISTS {db}.room_dim (
+    room_id INTEGER PRIMARY KEY,
+    room_number TEXT,
+    room_type TEXT,
+    price_per_night REAL
+);
+
+CREATE TABLE IF NOT EXISTS {db}.replica_state (
+    source TEXT PRIMARY KEY,
+    high_water INTEGER NOT NULL,
+    refreshed_at REAL,
+    duration_seconds REAL
+);
+'''
+
+# Fact rows as selected from the primary (aliases s/u and c/r)
+_SALES_SELECT = '''
+    SELECT s.sale_id, s.sale_date, s.employee_id, u.full_name, u.department,
+           s.category, s.payment_method, s.amount
+'''
+_STAYS_SELECT = '''
+    SELECT c.check_in_id, c.check_in_date, c.check_out_date,
+           MAX(CAST(julianday(c.check_out_date) - julianday(c.check_in_date) AS INTEGER), 0),
+           c.status, c.number_of_guests, c.check_in_employee_id,
+           c.room_id, r.room_number, r.room_type, r.price_per_night,
+           MAX(CAST(julianday(c.check_out_date) - julianday(c.check_in_date) AS INTEGER), 0) * r.price_per_night
+'''
+
+def replica_path(db_path=None):
+    """Replica file of a database (default: the current property's)"""
+    stem, ext = os.path.splitext(db_path or database.current_path())
+    return f'{stem}-analytics{ext}'
+
+def _high_water(db, source):
+    row = db.execute('SELECT high_water FROM replica.replica_state WHERE source = ?', (source,)).fetchone()
+    return row[0] if row else None
+
+def _copy_new(db, source, select, table, key, started):
+    """Copy rows past the high-water mark in chunks; returns the rows copied"""
+    copied = 0
+    while True:
+        mark = _high_water(db, source) or 0
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            count = db.execute(f'''
+                INSERT OR REPLACE INTO replica.{table}
+                {select.format(mark=mark)}
+                LIMIT {ANALYTICS_CHUNK_SIZE}
+            ''').rowcount
+            top = db.execute(f'SELECT MAX({key}) FROM replica.{table}').fetchone()[0] or 0
+            db.execute('''
+                INSERT INTO replica.replica_state (source, high_water, refreshed_at) VALUES (?, ?, ?)
+                ON CONFLICT(source) DO UPDATE SET high_water = excluded.high_water
+            ''', (source, max(top, mark), started))
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        copied += count
+        if count < ANALYTICS_CHUNK_SIZE:
+            return copied
+
+def _patch_dimensions(db):
+    """Apply renamed employees and changed rooms to the facts; returns (employees, rooms) changed"""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        employees = db.execute('''
+            SELECT u.user_id, u.full_name, u.department FROM main.users u
+            LEFT JOIN replica.employee_dim d ON d.user_id = u.user_id
+            WHERE d.user_id IS NULL OR d.full_name IS NOT u.full_name OR d.department IS NOT u.department
+        ''').fetchall()
+        for user_id, full_name, department in employees:
+            db.execute('UPDATE replica.sales_fact SET employee_name = ?, department = ? WHERE employee_id = ?',
+                       (full_name, department, user_id))
+        db.executemany('INSERT OR REPLACE INTO replica.employee_dim VALUES (?, ?, ?)', employees)
+
+        rooms = db.execute('''
+            SELECT r.room_id, r.room_number, r.room_type, r.price_per_night FROM main.rooms r
+            LEFT JOIN replica.room_dim d ON d.room_id = r.room_id
+            WHERE d.room_id IS NULL OR d.room_number IS NOT r.room_number
+               OR d.room_type IS NOT r.room_type OR d.price_per_night IS NOT r.price_per_night
+        ''').fetchall()
+        for room_id, room_number, room_type, price in rooms:
+            db.execute('''
+                UPDATE replica.stay_fact SET room_number = ?, room_type = ?, price_per_night = ?,
+                    revenue = nights * ?
+                WHERE room_id = ?
+            ''', (room_number, room_type, price, price, room_id))
+        db.executemany('INSERT OR REPLACE INTO replica.room_dim VALUES (?, ?, ?, ?)', rooms)
+        db.execute('COMMIT')
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    return len(employees), len(rooms)
+
+def _resync_active(db):
+    """Re-read stays that were active at the last refresh; returns the rows re-read"""
+    db.execute('BEGIN IMMEDIATE')
+    try:
+        count = db.execute(f'''
+            INSERT OR REPLACE INTO replica.stay_fact
+            {_STAYS_SELECT}
+            FROM main.check_ins c JOIN main.rooms r ON c.room_id = r.room_id
+            WHERE c.check_in_id IN (SELECT check_in_id FROM replica.stay_fact WHERE status = 'Active')
+        ''').rowcount
+        db.execute('COMMIT')
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    return count
+
+def refresh(rebuild=False):
+    """Bring the current database's replica up to date; returns what was copied"""
+    started = time.time()
+    began = time.perf_counter()
+    primary = database.current_path()
+    path = replica_path(primary)
+    if rebuild:
+        for suffix in ('', '-journal', '-wal', '-shm'):
+            if os.path.exists(path + suffix):
+                os.remove(path + suffix)
+
+    # The primary is main, so archive.source() and unqualified names keep their meaning
+    db = sqlite3.connect(primary, timeout=database.BUSY_TIMEOUT, isolation_level=None)
+    try:
+        db.execute('ATTACH DATABASE ? AS replica', (path,))
+        db.executescript(REPLICA_SCHEMA.format(db='replica'))
+        # Until the first build completes (user_version 1) the copy includes
+        # the archived years; after that, new rows only ever arrive hot
+        first = db.execute('PRAGMA replica.user_version').fetchone()[0] == 0
+        years = archive.archived_years(primary) if first else []
+        archive.attach(db, years)
+        employees, rooms = _patch_dimensions(db)
+        result = {
+            'employees_changed': employees,
+            'rooms_changed': rooms,
+            'sales': _copy_new(db, 'sales', _SALES_SELECT + f'''
+                FROM {archive.union('sales', years, 's')}
+                LEFT JOIN main.users u ON s.employee_id = u.user_id
+                WHERE s.sale_id > {{mark}} ORDER BY s.sale_id
+            ''', 'sales_fact', 'sale_id', started),
+            'stays_rechecked': _resync_active(db),
+            'stays': _copy_new(db, 'check_ins', _STAYS_SELECT + f'''
+                FROM {archive.union('check_ins', years, 'c')}
+                JOIN main.rooms r ON c.room_id = r.room_id
+                WHERE c.check_in_id > {{mark}} ORDER BY c.check_in_id
+            ''', 'stay_fact', 'check_in_id', started),
+        }
+        duration = round(time.perf_counter() - began, 3)
+        db.execute('UPDATE replica.replica_state SET refreshed_at = ?, duration_seconds = ?', (started, duration))
+        if first:
+            db.execute('ANALYZE replica')
+            db.execute('PRAGMA replica.user_version = 1')
+    finally:
+        db.close()
+    result['seconds'] = duration
+    if first or result['sales'] or result['stays']:
+        logger.info('Analytics replica %s: %d sales, %d stays copied in %.2fs',
+                    os.path.basename(path), result['sales'], result['stays'], duration)
+    return result
+
+def _state(path):
+    """replica_state of a built replica as {source: (high_water, refreshed_at)}, or None"""
+    if not os.path.exists(path):
+        return None
+    db = sqlite3.connect(f'file:{path}?mode=ro', uri=True, timeout=database.BUSY_TIMEOUT)
+    try:
+        if not db.execute('PRAGMA user_version').fetchone()[0]:
+            return None
+        rows = db.execute('SELECT source, high_water, refreshed_at FROM replica_state').fetchall()
+    except sqlite3.OperationalError:
+        return None
+    finally:
+        db.close()
+    return {source: (high_water, refreshed_at) for source, high_water, refreshed_at in rows} or None
+
+def routed():
+    """Whether reports for the current property read the replica"""
+    return ANALYTICS_REPLICA and _state(replica_path()) is not None
+
+def get_replica_db():
+    """Get the request's read-only connection to the current property's replica"""
+    db = getattr(g, '_analytics_database', None)
+    if db is None:
+        db = g._analytics_database = sqlite3.connect(
+            f'file:{replica_path()}?mode=ro', uri=True, timeout=database.BUSY_TIMEOUT,
+            factory=database._connection_factory)
+    return db
+
+def close_replica_db(e=None):
+    db = g.pop('_analytics_database', None)
+    if db is not None:
+        db.close()
+
+def _freshness():
+    primary = database.current_path()
+    state = _state(replica_path(primary)) if ANALYTICS_REPLICA else None
+    if state is None:
+        return {'source': 'primary', 'refreshed_at': None, 'age_seconds': 0,
+                'pending_sales': 0, 'pending_check_ins': 0}
+    db = database.get_db()
+    pending = {}
+    for source, table, key in (('sales', 'sales', 'sale_id'), ('check_ins', 'check_ins', 'check_in_id')):
+        mark = state.get(source, (0, None))[0]
+        pending[source] = db.execute(f'SELECT COUNT(*) FROM {table} WHERE {key} > ?', (mark,)).fetchone()[0]
+    refreshed_at = min(refreshed for _, refreshed in state.values())
+    return {
+        'source': 'replica',
+        'refreshed_at': datetime.fromtimestamp(refreshed_at, timezone.utc).isoformat(timespec='seconds'),
+        'age_seconds': round(time.time() - refreshed_at, 1),
+        'pending_sales': pending['sales'],
+        'pending_check_ins': pending['check_ins'],
+    }
+
+def freshness():
+    """Where report data came from and how stale it is, across the properties a report covers"""
+    from app.utils import properties
+    parts = list(properties.fan_out(_freshness).values())
+    if len(parts) == 1:
+        return parts[0]
+    sources = {part['source'] for part in parts}
+    refreshed = [part['refreshed_at'] for part in parts if part['refreshed_at']]
+    return {
+        'source': sources.pop() if len(sources) == 1 else 'mixed',
+        'refreshed_at': min(refreshed) if refreshed else None,
+        'age_seconds': max(part['age_seconds'] for part in parts),
+        'pending_sales': sum(part['pending_sales'] for part in parts),
+        'pending_check_ins': sum(part['pending_check_ins'] for part in parts),
+    }
+
+def metric_lines():
+    """Prometheus lines for the age of each replica"""
+    lines = ['# HELP analytics_replica_age_seconds Seconds since the analytics replica was refreshed',
+             '# TYPE analytics_replica_age_seconds gauge']
+    for code, path in database.database_paths()[1:] if database.PROPERTIES else database.database_paths():
+        state = _state(replica_path(path))
+        if state is None:
+            continue
+        labels = f'{{property="{code}"}}' if code else ''
+        age = time.time() - min(refreshed for _, refreshed in state.values())
+        lines.append(f'analytics_replica_age_seconds{labels} {age:.1f}')
+    return lines
+
+def init_analytics(app):
+    """Close replica connections with the app context and report replica age on /metrics"""
+    app.teardown_appcontext(close_replica_db)
+    if ANALYTICS_REPLICA and app.config.get('METRICS_ENABLED'):
+        from app.utils import metrics
+        metrics.register_collector(metric_lines)
+
+def main(argv=None):
+    parser = cli.parser(__doc__, 'primary database')
+    parser.add_argument('--property', help='property whose replica to refresh (required with PROPERTIES set)')
+    parser.add_argument('--rebuild', action='store_true', help='delete the replica and copy everything again')
+    parser.add_argument('--status', action='store_true', help='show high-water marks and refresh times')
+    args = cli.parse(parser, argv)
+    if database.PROPERTIES and not args.property:
+        parser.error('--property is required with PROPERTIES set')
+
+    with database.use_property(args.property):
+        if args.status:
+            state = _state(replica_path())
+            if state is None:
+                print(f'No replica at {replica_path()}')
+            for source, (high_water, refreshed_at) in sorted((state or {}).items()):
+                print(f'{source:<10} high water {high_water:>12,}  refreshed '
+                      f'{datetime.fromtimestamp(refreshed_at):%Y-%m-%d %H:%M:%S}')
+            return
+        print(refresh(rebuild=args.rebuild))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""
+Hot/cold partitioning of sales history
+
+Closed years of ``sales`` and finished ``check_ins`` move out of the main
+database into one archive file per year, so the indexes, VACUUM and
+backups of the live database only grow with recent history. Archives sit
+next to the database as ``<name>-archive-<year>.db`` (or in ARCHIVE_DIR);
+with PROPERTIES set, every property database has archives of its own. They
+are ATTACHed to a connection only when a query's date range reaches
+into an archived year; ``source()`` then returns the union of the hot
+table and those archives.
+
+The daily and monthly summary tables stay in the main database, so the
+report engine never needs the archives; only queries over individual
+sales do. The guest search index stays in the main database too and
+keeps the archived stays, so guest search covers every year.
+
+A year is closed once the February after it has begun, so the previous
+month is always hot. Moving a year is one transaction over both files,
+which is atomic with the default rollback journal. In WAL mode a crash
+during the commit can leave rows in both; running the archive again for
+that year finishes the move.
+
+Usage (from the backend directory):
+    python -m app.utils.archive                 archive every closed year
+    python -m app.utils.archive --year 2023     archive one year
+    python -m app.utils.archive --list
+    python -m app.utils.archive --property north    with PROPERTIES set
+"""
+import glob
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import date
+from app.utils import cli, database
+
+# Tables moved to the archives, and the date column and extra condition selecting a year's rows
+ARCHIVED_TABLES = {
+    'sales': ('sale_date', ''),
+    'check_ins': ('check_in_date', "AND status != 'Active'"),
+}
+
+# Directory of the archive files (default: the database's own directory)
+ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR')
+
+_years_cache = {}
+
+def archive_dir(db_path=None):
+    return ARCHIVE_DIR or os.path.dirname(os.path.abspath(db_path or database.current_path()))
+
+def archive_path(year, db_path=None):
+    """Archive file of a year for a database (default: the current property's)"""
+    db_path = db_path or database.current_path()
+    name = os.path.splitext(os.path.basename(db_path))[0]
+    return os.path.join(archive_dir(db_path), f'{name}-archive-{year}.db')
+
+def _alias(year):
+    return f'archive_{year}'
+
+def archived_years(db_path=None):
+    """Years that have an archive file, cached until the directory changes"""
+    db_path = db_path or database.current_path()
+    directory = archive_dir(db_path)
+    pattern = archive_path('*', db_path)
+    try:
+        mtime = os.stat(directory).st_mtime_ns
+    except OSError:
+        return []
+    cached = _years_cache.get(pattern)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    prefix, suffix = pattern.split('*')
+    years = sorted(int(path[len(prefix):-len(suffix)]) for path in glob.glob(pattern)
+                   if path[len(prefix):-len(suffix)].isdigit())
+    _years_cache[pattern] = (mtime, years)
+    return years
+
+def years_between(start_date, end_date):
+    """Archived years overlapping an inclusive range of ISO dates"""
+    try:
+        first, last = int(str(start_date)[:4]), int(str(end_date)[:4])
+    except ValueError:
+        return []
+    return [year for year in archived_years() if first <= year <= last]
+
+def attach(db, years):
+    """ATTACH the archives for years to a connection, skipping ones already attached"""
+    if not years:
+        return
+    databases = {row[1]: row[2] for row in db.execute('PRAGMA database_list')}
+    for year in years:
+        if _alias(year) not in databases:
+            # The archives of whichever database the connection is open on
+            db.execute('ATTACH DATABASE ? AS ' + _alias(year), (archive_path(year, databases['main']),))
+
+def union(table, years, alias=None):
+    """FROM-clause item for table plus its partitions in years, named alias (or table)"""
+    if not years:
+        return f'{table} {alias}' if alias else table
+    parts = [f'SELECT * FROM main.{table}'] + [f'SELECT * FROM {_alias(year)}.{table}' for year in years]
+    return f"({' UNION ALL '.join(parts)}) AS {alias or table}"
+
+def schemas(years):
+    """Schema names of the main database and the attached archives of years"""
+    return ['main'] + [_alias(year) for year in years]
+
+def source(db, table, start_date, end_date=None, alias=None):
+    """Attach the archives a date range needs and return the FROM-clause item for it"""
+    years = years_between(start_date, end_date or start_date)
+    attach(db, years)
+    return union(table, years, alias)
+
+def closed_years(db, today=None):
+    """Years with rows still in the main database that are old enough to archive"""
+    today = today or date.today()
+    rows = db.execute('''
+        SELECT DISTINCT CAST(substr(sale_date, 1, 4) AS INTEGER) FROM sales
+        UNION
+        SELECT DISTINCT CAST(substr(check_in_date, 1, 4) AS INTEGER) FROM check_ins WHERE status != 'Active'
+    ''').fetchall()
+    return sorted(year for (year,) in rows if year and date(year + 1, 2, 1) <= today)
+
+def _create_tables(db, alias):
+    """Copy the archived tables and their indexes from the main schema"""
+    for table in ARCHIVED_TABLES:
+        rows = db.execute('''
+            SELECT type, sql FROM main.sqlite_master
+            WHERE tbl_name = ? AND type IN ('table', 'index') AND sql IS NOT NULL
+            ORDER BY type = 'index'
+        ''', (table,)).fetchall()
+        for kind, sql in rows:
+            db.execute(re.sub(rf'^CREATE {kind.upper()}\s+(IF NOT EXISTS\s+)?',
+                              f'CREATE {kind.upper()} IF NOT EXISTS {alias}.', sql, flags=re.IGNORECASE))
+
+def archive_year(year, today=None):
+    """Move a closed year into its archive file; returns rows moved per table"""
+    today = today or date.today()
+    if date(year + 1, 2, 1) > today:
+        raise ValueError(f'{year} is not closed yet; it can be archived from {year + 1}-02-01')
+
+    start, end = f'{year:04d}-01-01', f'{year + 1:04d}-01-01'
+    db = sqlite3.connect(database.current_path(), timeout=database.BUSY_TIMEOUT, isolation_level=None)
+    try:
+        alias = _alias(year)
+        path = archive_path(year)
+        if not os.path.exists(path):
+            # Readers attach any file matching the name, so it must have its tables when it appears
+            db.execute('ATTACH DATABASE ? AS ' + alias, (path + '.tmp',))
+            _create_tables(db, alias)
+            db.execute('DETACH DATABASE ' + alias)
+            os.replace(path + '.tmp', path)
+        db.execute('ATTACH DATABASE ? AS ' + alias, (path,))
+        moved = {}
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            # Marks the deletes below as a move for the triggers (migration 004); never committed
+            db.execute('INSERT OR IGNORE INTO main.archive_in_progress (year) VALUES (?)', (year,))
+            for table, (column, condition) in ARCHIVED_TABLES.items():
+                where = f'WHERE {column} >= ? AND {column} < ? {condition}'
+                # OR IGNORE makes a rerun after an interrupted move safe
+                db.execute(f'INSERT OR IGNORE INTO {alias}.{table} SELECT * FROM main.{table} {where}',
+                           (start, end))
+                moved[table] = db.execute(f'DELETE FROM main.{table} {where}', (start, end)).rowcount
+            db.execute('DELETE FROM main.archive_in_progress')
+            db.execute('COMMIT')
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute(f'ANALYZE {alias}')
+        return moved
+    finally:
+        db.close()
+
+def main(argv=None):
+    parser = cli.parser(__doc__, 'main database')
+    parser.add_argument('--year', type=int, action='append', help='year to archive (repeatable; default: all closed)')
+    parser.add_argument('--list', action='store_true', help='list archives and their row counts')
+    parser.add_argument('--property', help='property whose database to archive (required with PROPERTIES set)')
+    args = cli.parse(parser, argv, log=False)
+    if database.PROPERTIES and not args.property:
+        parser.error('--property is required with PROPERTIES set')
+    with database.use_property(args.property):
+        _main(args)
+
+def _main(args):
+    if args.list:
+        for year in archived_years():
+            db = sqlite3.connect(archive_path(year))
+            counts = ', '.join(f"{table} {db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:,}"
+                               for table in ARCHIVED_TABLES)
+            db.close()
+            print(f'{year}  {counts}  {archive_path(year)}')
+        return
+
+    years = args.year
+    if not years:
+        db = sqlite3.connect(database.current_path())
+        years = closed_years(db)
+        db.close()
+        if not years:
+            print('No closed years left to archive')
+    for year in years:
+        began = time.perf_counter()
+        try:
+            moved = archive_year(year)
+        except ValueError as e:
+            sys.exit(str(e))
+        counts = ', '.join(f'{table} {count:,}' for table, count in moved.items())
+        print(f'{year}: moved {counts} in {time.perf_counter() - began:.2f}s -> {archive_path(year)}')
+
+if __name__ == '__main__':
+    main()
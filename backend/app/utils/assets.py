@@ -0,0 +1,143 @@
+"""Fingerprinted, precompressed frontend assets served from memory
+
+At startup every file under the frontend directory is read once, given a
+content-hashed name (``js/app.3f2a9c1b7d.js``) and compressed with gzip
+and, when the brotli package is installed, brotli. ``index.html`` is
+rewritten to reference the hashed names, so those can be cached forever
+by browsers; only ``index.html`` itself is revalidated (by ETag).
+
+Requests never touch the disk. Unknown paths fall back to ``index.html``
+as before. In debug mode the files are re-read whenever ``index.html``
+is requested, so edits show up on reload.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import threading
+from flask import Response, request
+
+try:
+    import brotli
+    BROTLI_AVAILABLE = True
+except ImportError:
+    BROTLI_AVAILABLE = False
+
+FINGERPRINT_LENGTH = 10
+MIN_COMPRESS_SIZE = 256
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+IMMUTABLE_CACHE = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE = 'no-cache'
+
+# src="..." / href="..." attributes with a relative path
+ASSET_REFERENCE = re.compile(r'''((?:src|href)\s*=\s*["'])(?!https?:|//|#|data:|mailto:)([^"'?#]+)''')
+
+class Asset:
+    """One servable file with its precompressed variants"""
+    __slots__ = ('body', 'gzip', 'br', 'etag', 'content_type', 'cache_control')
+
+    def __init__(self, body, content_type, cache_control):
+        self.body = body
+        self.content_type = content_type
+        self.cache_control = cache_control
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+        self.gzip = self.br = None
+
+        if len(body) >= MIN_COMPRESS_SIZE and content_type.startswith(COMPRESSIBLE_TYPES):
+            compressed = gzip.compress(body, compresslevel=9, mtime=0)
+            if len(compressed) < len(body):
+                self.gzip = compressed
+            if BROTLI_AVAILABLE:
+                compressed = brotli.compress(body, quality=11)
+                if len(compressed) < len(body):
+                    self.br = compressed
+
+def _content_type(path):
+    mimetype = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+    if mimetype.startswith('text/') or mimetype == 'application/javascript':
+        mimetype += '; charset=utf-8'
+    return mimetype
+
+def fingerprint(path, body):
+    """Name with a content hash before the extension: js/app.js -> js/app.<hash>.js"""
+    stem, ext = os.path.splitext(path)
+    return f'{stem}.{hashlib.sha256(body).hexdigest()[:FINGERPRINT_LENGTH]}{ext}'
+
+def build_assets(root, index='index.html'):
+    """Read the frontend tree into {url path: Asset} and the rewritten index"""
+    files = {}
+    for directory, _, names in os.walk(root):
+        for name in names:
+            full = os.path.join(directory, name)
+            path = os.path.relpath(full, root).replace(os.sep, '/')
+            with open(full, 'rb') as f:
+                files[path] = f.read()
+
+    assets = {}
+    hashed_names = {}
+    for path, body in files.items():
+        if path == index:
+            continue
+        hashed = fingerprint(path, body)
+        hashed_names[path] = hashed
+        content_type = _content_type(path)
+        assets[hashed] = Asset(body, content_type, IMMUTABLE_CACHE)
+        # The plain name keeps working (e.g. for cached old pages) but must revalidate
+        assets[path] = Asset(body, content_type, REVALIDATE_CACHE)
+
+    index_body = files.get(index, b'')
+    if index_body:
+        def rewrite(match):
+            prefix, target = match.groups()
+            path = target[2:] if target.startswith('./') else target
+            return prefix + hashed_names.get(path, target)
+
+        html = ASSET_REFERENCE.sub(rewrite, index_body.decode('utf-8'))
+        index_body = html.encode('utf-8')
+    index_asset = Asset(index_body, 'text/html; charset=utf-8', REVALIDATE_CACHE)
+    assets[index] = index_asset
+    return assets, index_asset
+
+def _accepts(encoding):
+    return encoding in request.headers.get('Accept-Encoding', '').lower()
+
+def asset_response(asset):
+    """Response for an asset, honouring If-None-Match and Accept-Encoding"""
+    headers = {'Cache-Control': asset.cache_control, 'ETag': asset.etag, 'Vary': 'Accept-Encoding'}
+    if asset.etag in request.headers.get('If-None-Match', ''):
+        return Response(status=304, headers=headers)
+
+    body = asset.body
+    if asset.br is not None and _accepts('br'):
+        body = asset.br
+        headers['Content-Encoding'] = 'br'
+    elif asset.gzip is not None and _accepts('gzip'):
+        body = asset.gzip
+        headers['Content-Encoding'] = 'gzip'
+    return Response(body, content_type=asset.content_type, headers=headers)
+
+def init_assets(app, root):
+    """Serve the frontend directory at / from the in-memory asset cache"""
+    state = {}
+    lock = threading.Lock()
+
+    def load():
+        assets, index_asset = build_assets(root)
+        state['assets'] = assets
+        state['index'] = index_asset
+
+    load()
+
+    def serve_index():
+        if app.debug:
+            with lock:
+                load()
+        return asset_response(state['index'])
+
+    def serve_static(path):
+        asset = state['assets'].get(path)
+        return asset_response(asset if asset is not None else state['index'])
+
+    app.add_url_rule('/', 'serve_index', serve_index)
+    app.add_url_rule('/<path:path>', 'serve_static', serve_static)
@@ -0,0 +1,175 @@
+"""Buffered, asynchronous audit trail
+
+Model mutators call ``record()`` with the old and new values of what
+they changed. Entries go into an in-memory ring buffer and a background
+thread writes them to ``audit_log`` (in the group database, tagged with
+the property they happened in) in batched inserts, so auditing adds
+no commit to the write path it observes.
+
+Loss is bounded:
+- If the writer falls behind, a full buffer drops its oldest entries
+  (counted in ``stats()['dropped']``), so at most AUDIT_BUFFER_SIZE
+  entries are lost.
+- On a crash, at most the last AUDIT_FLUSH_INTERVAL seconds are lost.
+- On a normal shutdown the buffer is flushed with synchronous=FULL, so
+  everything recorded is on disk before the process exits.
+
+Each process has its own buffer and writer. Server workers call reset()
+after fork so they don't inherit the master's pending entries.
+
+Settings (environment):
+    AUDIT_ENABLED          0 to record nothing (default on)
+    AUDIT_BUFFER_SIZE      ring buffer capacity in entries (10000)
+    AUDIT_FLUSH_INTERVAL   seconds between flushes (1.0)
+    AUDIT_BATCH_SIZE       entries per insert transaction (500)
+"""
+import atexit
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from flask import has_request_context, request
+from app.utils.database import PropertyError, connect_group_db, current_property
+from app.utils.server import lazy_thread
+
+AUDIT_ENABLED = os.environ.get('AUDIT_ENABLED', '1') != '0'
+AUDIT_BUFFER_SIZE = int(os.environ.get('AUDIT_BUFFER_SIZE', 10000))
+AUDIT_FLUSH_INTERVAL = float(os.environ.get('AUDIT_FLUSH_INTERVAL', 1.0))
+AUDIT_BATCH_SIZE = int(os.environ.get('AUDIT_BATCH_SIZE', 500))
+
+logger = logging.getLogger('app.audit')
+
+_buffer = deque(maxlen=AUDIT_BUFFER_SIZE)
+_lock = threading.Lock()
+_flush_lock = threading.Lock()
+_wakeup = threading.Event()
+_stats = {'recorded': 0, 'written': 0, 'dropped': 0, 'failed_flushes': 0}
+
+def _json(value):
+    if value is None:
+        return None
+    return json.dumps(value, default=str, sort_keys=True)
+
+def _acting_user():
+    """user_id of the authenticated request, if any"""
+    if has_request_context():
+        user = getattr(request, 'user', None)
+        if user:
+            return user.get('user_id')
+    return None
+
+def _property():
+    """Property the change was made in, if any"""
+    try:
+        return current_property()
+    except PropertyError:
+        return None
+
+def record(action, entity_type, entity_id, old_value=None, new_value=None, user_id=None):
+    """Queue one audit entry; never blocks on the database"""
+    if not AUDIT_ENABLED:
+        return
+    entry = (
+        user_id if user_id is not None else _acting_user(),
+        action,
+        entity_type,
+        entity_id,
+        _json(old_value),
+        _json(new_value),
+        time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime()),
+        _property()
+    )
+    with _lock:
+        if len(_buffer) == _buffer.maxlen:
+            _stats['dropped'] += 1
+        _buffer.append(entry)
+        _stats['recorded'] += 1
+        full = len(_buffer) >= AUDIT_BATCH_SIZE
+    _writer.start()
+    if full:
+        _wakeup.set()
+
+def _take(limit):
+    with _lock:
+        return [_buffer.popleft() for _ in range(min(limit, len(_buffer)))]
+
+def _requeue(batch):
+    """Put a batch that failed to write back at the front of the buffer"""
+    with _lock:
+        room = _buffer.maxlen - len(_buffer)
+        if room < len(batch):
+            _stats['dropped'] += len(batch) - room
+            batch = batch[len(batch) - room:]
+        _buffer.extendleft(reversed(batch))
+
+def flush(sync=False):
+    """Write every buffered entry now; sync forces an fsync on commit"""
+    with _flush_lock:
+        if not _buffer:
+            return 0
+        written = 0
+        db = connect_group_db()
+        try:
+            if sync:
+                db.execute('PRAGMA synchronous = FULL')
+            while True:
+                batch = _take(AUDIT_BATCH_SIZE)
+                if not batch:
+                    break
+                try:
+                    db.executemany('''
+                        INSERT INTO audit_log
+                        (user_id, action, entity_type, entity_id, old_value, new_value, created_at, property)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+                    ''', batch)
+                    db.commit()
+                except sqlite3.Error:
+                    db.rollback()
+                    _requeue(batch)
+                    raise
+                written += len(batch)
+        finally:
+            db.close()
+        with _lock:
+            _stats['written'] += written
+        return written
+
+def _run():
+    while True:
+        _wakeup.wait(AUDIT_FLUSH_INTERVAL)
+        _wakeup.clear()
+        try:
+            flush()
+        except sqlite3.Error:
+            with _lock:
+                _stats['failed_flushes'] += 1
+            logger.exception('Audit flush failed; %d entries kept for retry', len(_buffer))
+
+def shutdown():
+    """Flush everything with fsync; call before the process exits"""
+    try:
+        flush(sync=True)
+    except sqlite3.Error:
+        logger.exception('Final audit flush failed; %d entries lost', len(_buffer))
+
+def _reset():
+    """Forget inherited entries in a forked child (the parent still flushes them)"""
+    global _lock, _flush_lock, _wakeup
+    _lock = threading.Lock()
+    _flush_lock = threading.Lock()
+    _wakeup = threading.Event()
+    _buffer.clear()
+    for key in _stats:
+        _stats[key] = 0
+
+_writer = lazy_thread(_run, 'audit-writer', on_reset=_reset)
+
+def stats():
+    """Counters plus the current buffer depth"""
+    with _lock:
+        return dict(_stats, buffered=len(_buffer))
+
+atexit.register(shutdown)
@@ -8,12 +8,17 @@ from flask import request, jsonify
 SECRET_KEY = os.environ.get('SECRET_KEY', 'your-secret-key-change-in-production')
 TOKEN_EXPIRY = 86400  # 24 hours
 
-def generate_token(user_id, role, username):
-    """Generate JWT token"""
+def generate_token(user_id, role, username, property=None):
+    """Generate JWT token
+    
+    property is the user's home property, which selects the database
+    every request with the token uses (None: group-wide).
+    """
     payload = {
         'user_id': user_id,
         'role': role,
         'username': username,
+        'property': property,
         'exp': datetime.utcnow() + timedelta(seconds=TOKEN_EXPIRY),
         'iat': datetime.utcnow()
     }
@@ -0,0 +1,284 @@
+"""
+Online backups through the SQLite backup API
+
+Copying the database file while the app is running can capture a torn
+write, and copying a large file in one go stalls everyone waiting on it.
+Backups here use ``sqlite3.Connection.backup`` instead: BACKUP_PAGES pages
+are copied per step with a BACKUP_SLEEP pause between steps, and the
+source is only read-locked during a step, so writers keep committing.
+
+Each run writes a backup set, ``<name>-<UTC time>/`` under BACKUP_DIR,
+with the main database, every property database (app.utils.database),
+every archive file (app.utils.archive) and a ``manifest.json`` holding
+the duration, size and throughput. Archives
+that have not changed since the previous set are hard-linked from it
+rather than copied. The set is checked with ``PRAGMA integrity_check``
+on the copy before it is renamed into place, so an incomplete or corrupt
+set never replaces a good one.
+
+A write to the source restarts the copy of that file. After
+BACKUP_MAX_RESTARTS restarts, the rest of the file is copied in one step,
+holding the read lock for that long.
+
+Rotation keeps the newest BACKUP_KEEP sets plus the newest set of each of
+the last BACKUP_KEEP_DAYS days; older sets are deleted.
+
+Settings (environment):
+    BACKUP_DIR            where sets go (default: backups/ beside the database)
+    BACKUP_PAGES          pages copied per step (1024)
+    BACKUP_SLEEP          seconds to pause between steps (0.05)
+    BACKUP_MAX_RESTARTS   restarts before copying in one step (5)
+    BACKUP_KEEP           newest sets always kept (24)
+    BACKUP_KEEP_DAYS      days for which the day's newest set is kept (14)
+
+Usage (from the backend directory):
+    python -m app.utils.backup                run one backup
+    python -m app.utils.backup --every 3600   back up every hour until stopped
+    python -m app.utils.backup --list
+"""
+import json
+import logging
+import os
+import shutil
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from app.utils import archive, cli, database
+
+BACKUP_DIR = os.environ.get('BACKUP_DIR')
+BACKUP_PAGES = int(os.environ.get('BACKUP_PAGES', 1024))
+BACKUP_SLEEP = float(os.environ.get('BACKUP_SLEEP', 0.05))
+BACKUP_MAX_RESTARTS = int(os.environ.get('BACKUP_MAX_RESTARTS', 5))
+BACKUP_KEEP = int(os.environ.get('BACKUP_KEEP', 24))
+BACKUP_KEEP_DAYS = int(os.environ.get('BACKUP_KEEP_DAYS', 14))
+
+STAMP_FORMAT = '%Y%m%dT%H%M%SZ'
+
+logger = logging.getLogger('app.backup')
+
+class BackupError(Exception):
+    """A backup copy failed verification"""
+
+class _TooManyRestarts(Exception):
+    pass
+
+def backup_dir():
+    return BACKUP_DIR or os.path.join(os.path.dirname(os.path.abspath(database.DATABASE_PATH)), 'backups')
+
+def _db_name():
+    return os.path.splitext(os.path.basename(database.DATABASE_PATH))[0]
+
+def list_sets():
+    """Completed backup sets, newest first, as (timestamp, path)"""
+    prefix = _db_name() + '-'
+    try:
+        names = os.listdir(backup_dir())
+    except FileNotFoundError:
+        return []
+    sets = []
+    for name in names:
+        if not name.startswith(prefix):
+            continue
+        try:
+            stamp = datetime.strptime(name[len(prefix):], STAMP_FORMAT).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        sets.append((stamp, os.path.join(backup_dir(), name)))
+    return sorted(sets, reverse=True)
+
+def read_manifest(path):
+    with open(os.path.join(path, 'manifest.json')) as f:
+        return json.load(f)
+
+def _copy(source_path, target_path):
+    """Copy one database in page batches; returns (pages, restarts)"""
+    progress = {'remaining': None, 'restarts': 0, 'total': 0}
+
+    def pause(status, remaining, total):
+        # The remaining count going back up means a write restarted the copy
+        if progress['remaining'] is not None and remaining > progress['remaining']:
+            progress['restarts'] += 1
+            if progress['restarts'] > BACKUP_MAX_RESTARTS:
+                raise _TooManyRestarts()
+        progress['remaining'] = remaining
+        progress['total'] = total
+        time.sleep(BACKUP_SLEEP)
+
+    source = sqlite3.connect(source_path, timeout=database.BUSY_TIMEOUT)
+    target = sqlite3.connect(target_path)
+    try:
+        try:
+            source.backup(target, pages=BACKUP_PAGES, progress=pause)
+        except _TooManyRestarts:
+            logger.warning('%s kept changing during backup; copying the rest in one step', source_path)
+            source.backup(target, pages=-1)
+            progress['total'] = target.execute('PRAGMA page_count').fetchone()[0]
+    finally:
+        target.close()
+        source.close()
+    return progress['total'], progress['restarts']
+
+def _verify(path):
+    db = sqlite3.connect(path)
+    try:
+        result = [row[0] for row in db.execute('PRAGMA integrity_check')]
+    finally:
+        db.close()
+    if result != ['ok']:
+        raise BackupError(f'{path} failed integrity_check: {"; ".join(result[:5])}')
+
+def _unchanged(source_path, previous, name):
+    """The file entry of the previous set if the archive at source_path has not changed since"""
+    # A WAL database can change without its main file changing
+    if previous is None or os.path.exists(source_path + '-wal'):
+        return None
+    entry = previous[1]['files'].get(name)
+    stat = os.stat(source_path)
+    if entry and entry['source_mtime_ns'] == stat.st_mtime_ns and entry['source_size'] == stat.st_size:
+        return entry
+    return None
+
+def run_backup(now=None):
+    """Write a verified backup set and rotate old ones; returns its manifest"""
+    now = now or datetime.now(timezone.utc)
+    directory = backup_dir()
+    os.makedirs(directory, exist_ok=True)
+    final = os.path.join(directory, f'{_db_name()}-{now.strftime(STAMP_FORMAT)}')
+    partial = final + '.partial'
+    shutil.rmtree(partial, ignore_errors=True)
+    os.makedirs(partial)
+
+    previous = None
+    for _, path in list_sets():
+        try:
+            previous = (path, read_manifest(path))
+            break
+        except (OSError, ValueError):
+            continue
+
+    live = [path for _, path in database.database_paths()]
+    sources = live + [archive.archive_path(year, path) for path in live for year in archive.archived_years(path)]
+    manifest = {'started_at': now.isoformat(), 'files': {}}
+    began = time.perf_counter()
+    try:
+        for source_path in sources:
+            name = os.path.basename(source_path)
+            target_path = os.path.join(partial, name)
+            file_began = time.perf_counter()
+            stat = os.stat(source_path)
+            entry = _unchanged(source_path, previous, name) if source_path not in live else None
+            if entry is not None:
+                try:
+                    os.link(os.path.join(previous[0], name), target_path)
+                    pages, restarts, method = entry['pages'], 0, 'link'
+                except OSError:
+                    entry = None
+            if entry is None:
+                pages, restarts = _copy(source_path, target_path)
+                _verify(target_path)
+                method = 'backup'
+            manifest['files'][name] = {
+                'method': method,
+                'bytes': os.path.getsize(target_path),
+                'pages': pages,
+                'restarts': restarts,
+                'seconds': round(time.perf_counter() - file_began, 3),
+                'source_mtime_ns': stat.st_mtime_ns,
+                'source_size': stat.st_size,
+            }
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+
+    duration = time.perf_counter() - began
+    copied = sum(entry['bytes'] for entry in manifest['files'].values() if entry['method'] == 'backup')
+    manifest.update({
+        'duration_seconds': round(duration, 3),
+        'bytes': sum(entry['bytes'] for entry in manifest['files'].values()),
+        'copied_bytes': copied,
+        'throughput_bytes_per_second': round(copied / duration) if duration else 0,
+        'integrity': 'ok',
+    })
+    with open(os.path.join(partial, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.rename(partial, final)
+    rotate(now)
+    logger.info('Backup %s: %d bytes copied in %.2fs (%.1f MB/s)', final, copied, duration,
+                manifest['throughput_bytes_per_second'] / 1e6)
+    return dict(manifest, path=final)
+
+def rotate(now=None):
+    """Delete sets outside the retention policy; returns the deleted paths"""
+    now = now or datetime.now(timezone.utc)
+    sets = list_sets()
+    keep = {path for _, path in sets[:BACKUP_KEEP]}
+    seen_days = set()
+    cutoff = (now - timedelta(days=BACKUP_KEEP_DAYS)).date()
+    for stamp, path in sets:
+        if stamp.date() > cutoff and stamp.date() not in seen_days:
+            seen_days.add(stamp.date())
+            keep.add(path)
+    deleted = [path for _, path in sets if path not in keep]
+    for path in deleted:
+        shutil.rmtree(path, ignore_errors=True)
+    return deleted
+
+def metric_lines():
+    """Prometheus lines describing the newest backup set"""
+    sets = list_sets()
+    lines = [
+        '# HELP backup_sets Backup sets currently retained',
+        '# TYPE backup_sets gauge',
+        f'backup_sets {len(sets)}',
+    ]
+    if not sets:
+        return lines
+    stamp, path = sets[0]
+    try:
+        manifest = read_manifest(path)
+    except (OSError, ValueError):
+        return lines
+    for name, help_text, value in (
+        ('backup_last_success_timestamp_seconds', 'When the newest backup set was started', stamp.timestamp()),
+        ('backup_last_duration_seconds', 'Duration of the newest backup', manifest['duration_seconds']),
+        ('backup_last_size_bytes', 'Size of the newest backup set', manifest['bytes']),
+        ('backup_last_throughput_bytes_per_second', 'Copy throughput of the newest backup',
+         manifest['throughput_bytes_per_second']),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge', f'{name} {value}']
+    return lines
+
+def init_backups(app):
+    """Report the newest backup set on /metrics when METRICS_ENABLED is set"""
+    if not app.config.get('METRICS_ENABLED'):
+        return
+
+    from app.utils import metrics
+    metrics.register_collector(metric_lines)
+
+def main(argv=None):
+    parser = cli.parser(__doc__, 'database to back up')
+    parser.add_argument('--every', type=float, help='repeat every this many seconds until interrupted')
+    parser.add_argument('--list', action='store_true', help='list retained backup sets')
+    args = cli.parse(parser, argv)
+
+    if args.list:
+        for _, path in list_sets():
+            manifest = read_manifest(path)
+            print(f"{path}  {manifest['bytes']:>14,} bytes  {manifest['duration_seconds']:>8.2f}s")
+        return
+
+    while True:
+        try:
+            run_backup()
+        except (sqlite3.Error, OSError, BackupError) as e:
+            if not args.every:
+                sys.exit(f'Backup failed: {e}')
+            logger.error('Backup failed: %s', e)
+        if not args.every:
+            return
+        time.sleep(args.every)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,361 @@
+"""
+Change feed for downstream consumers and cache invalidation
+
+Triggers (migration 003) append a compact record, ``(seq, table_name,
+row_id, op)``, to ``changes`` for every insert (I), update (U) and
+delete (D) on ``sales``, ``check_ins``, ``rooms`` and ``users``, in the
+same transaction as the change itself. ``seq`` only ever increases, and
+SQLite commits one writer at a time, so a consumer that has read up to
+some seq never misses a change committed later: it keeps its position
+and asks for what came after.
+
+Each database has its own feed; with PROPERTIES set, a property's feed
+also carries the changes to its mirror of ``users``. Moving a closed
+year into an archive (app.utils.archive) is not a change: the rows still
+exist, so the delete triggers skip them (migration 005).
+
+Two kinds of consumer read it:
+
+- Remote consumers long-poll ``GET /api/changes?since=<seq>`` and
+  acknowledge what they have processed (``ack()``). The ``changes_prune``
+  job deletes whatever every registered consumer has acknowledged, in
+  chunks of CHANGES_PRUNE_CHUNK rows, and, so a consumer that went away
+  cannot keep the table growing, anything older than CHANGES_MAX_AGE_DAYS.
+  With no consumer registered, only the age limit applies, so clients
+  that read without acknowledging can still keep up.
+  A consumer that falls behind the pruned range gets 410 and has to
+  resynchronize.
+- In-process caches ``subscribe()`` a callback. One dispatcher thread per
+  process checks every database each CHANGES_POLL_INTERVAL (a
+  ``PRAGMA data_version`` read, which touches no table unless something
+  was committed), and passes each new batch to the subscribers. Waiting
+  long-polls are woken by the same thread.
+
+Settings (environment):
+    CHANGES_POLL_INTERVAL   seconds between checks for new changes (0.25)
+    CHANGES_LONG_POLL       longest wait, in seconds, of a long-poll (25)
+    CHANGES_MAX_WAITERS     long-polls waiting at once per process (4); more return at once
+    CHANGES_BATCH_SIZE      largest batch returned or dispatched (1000)
+    CHANGES_MAX_AGE_DAYS    changes kept at most, acknowledged or not (7)
+    CHANGES_PRUNE_CHUNK     rows deleted per pruning transaction (5000)
+
+Usage (from the backend directory):
+    python -m app.utils.changes                 feed head and consumer positions
+    python -m app.utils.changes --prune
+    python -m app.utils.changes --drop-consumer NAME
+"""
+import logging
+import os
+import sqlite3
+import threading
+import time
+from flask import jsonify
+from app.utils import cli, database
+from app.utils.records import record, fetch_all
+from app.utils.server import lazy_thread
+
+CHANGES_POLL_INTERVAL = float(os.environ.get('CHANGES_POLL_INTERVAL', 0.25))
+CHANGES_LONG_POLL = float(os.environ.get('CHANGES_LONG_POLL', 25))
+CHANGES_MAX_WAITERS = int(os.environ.get('CHANGES_MAX_WAITERS', 4))
+CHANGES_BATCH_SIZE = int(os.environ.get('CHANGES_BATCH_SIZE', 1000))
+CHANGES_MAX_AGE_DAYS = float(os.environ.get('CHANGES_MAX_AGE_DAYS', 7))
+CHANGES_PRUNE_CHUNK = int(os.environ.get('CHANGES_PRUNE_CHUNK', 5000))
+
+TRACKED_TABLES = ('sales', 'check_ins', 'rooms', 'users')
+
+logger = logging.getLogger('app.changes')
+
+ChangeRecord = record('ChangeRecord', [
+    ('seq', int),
+    ('table_name', str),
+    ('row_id', int),
+    ('op', str),
+    ('changed_at', str)
+])
+
+ConsumerRecord = record('ConsumerRecord', [
+    ('consumer', str),
+    ('acked_seq', int),
+    ('acked_at', str)
+])
+
+class ChangesPrunedError(Exception):
+    """Changes after the requested seq were pruned before they were read"""
+
+    def __init__(self, since, oldest, head):
+        self.since = since
+        self.oldest = oldest
+        self.head = head
+        super().__init__(f'Changes after seq {since} were pruned (oldest kept: {oldest}); '
+                         f'resynchronize and continue from seq {head}')
+
+class Subscription:
+    """A callback for the changes to some tables, as returned by subscribe()"""
+    __slots__ = ('callback', 'tables')
+
+    def __init__(self, callback, tables):
+        self.callback = callback
+        self.tables = frozenset(tables) if tables else None
+
+    def cancel(self):
+        """Stop delivering changes to the callback"""
+        with _lock:
+            if self in _subscriptions:
+                _subscriptions.remove(self)
+
+_subscriptions = []
+_lock = threading.Lock()
+_changed = threading.Condition()
+_generation = 0
+_waiters = 0
+_stop = threading.Event()
+
+def head(db):
+    """Highest seq ever assigned in a database's feed (0 before the first change)"""
+    row = db.execute("SELECT seq FROM sqlite_sequence WHERE name = 'changes'").fetchone()
+    return row[0] if row else 0
+
+def _oldest(db):
+    return db.execute('SELECT MIN(seq) FROM changes').fetchone()[0]
+
+def read(db, since, limit=None, tables=None):
+    """Changes after seq since, oldest first, at most limit of them
+
+    Returns (changes, seq to continue from). With tables, the seq to
+    continue from can be past the last change returned, so changes to
+    other tables are not read again. Raises ChangesPrunedError if some
+    of the changes after since are no longer kept.
+    """
+    limit = min(limit or CHANGES_BATCH_SIZE, CHANGES_BATCH_SIZE)
+    table_filter = f"AND table_name IN ({', '.join('?' * len(tables))})" if tables else ''
+    # Read first, so every change up to it is visible to the query below
+    top = head(db)
+    rows = fetch_all(db, ChangeRecord, f'''
+        SELECT {ChangeRecord.COLUMNS} FROM changes
+        WHERE seq > ? {table_filter}
+        ORDER BY seq
+        LIMIT ?
+    ''', (since, *(tables or ()), limit))
+    # seq has no gaps below the head except what pruning removed
+    if not rows or rows[0].seq != since + 1:
+        oldest = _oldest(db)
+        if since < top and (oldest is None or oldest > since + 1):
+            raise ChangesPrunedError(since, oldest, top)
+    if len(rows) == limit:
+        return rows, rows[-1].seq
+    return rows, max(top, rows[-1].seq if rows else since)
+
+def wait(db, since, timeout, limit=None, tables=None):
+    """Like read(), but wait up to timeout seconds for a change if there is none yet"""
+    global _waiters
+    deadline = time.monotonic() + min(timeout, CHANGES_LONG_POLL)
+    with _changed:
+        if _waiters >= CHANGES_MAX_WAITERS:
+            deadline = 0
+        _waiters += 1
+    _dispatcher.start()
+    try:
+        while True:
+            generation = _generation
+            rows, since = read(db, since, limit, tables)
+            remaining = deadline - time.monotonic()
+            if rows or remaining <= 0:
+                return rows, since
+            # Changes to other tables wake this up too; the loop reads again from where it got to
+            with _changed:
+                _changed.wait_for(lambda: _generation != generation, remaining)
+    finally:
+        with _changed:
+            _waiters -= 1
+
+def ack(db, consumer, seq):
+    """Record that a consumer has processed every change up to seq; returns its position
+
+    Positions never move backwards, so a late or repeated ack is harmless.
+    """
+    db.execute('''
+        INSERT INTO change_consumers (consumer, acked_seq) VALUES (?, ?)
+        ON CONFLICT(consumer) DO UPDATE SET acked_seq = MAX(acked_seq, excluded.acked_seq),
+            acked_at = CURRENT_TIMESTAMP
+    ''', (consumer, seq))
+    db.commit()
+    return db.execute('SELECT acked_seq FROM change_consumers WHERE consumer = ?', (consumer,)).fetchone()[0]
+
+def position(db, consumer):
+    """Last seq a consumer acknowledged, or None for an unknown consumer"""
+    row = db.execute('SELECT acked_seq FROM change_consumers WHERE consumer = ?', (consumer,)).fetchone()
+    return row[0] if row else None
+
+def consumers(db):
+    """Registered consumers and their positions"""
+    return fetch_all(db, ConsumerRecord, f'SELECT {ConsumerRecord.COLUMNS} FROM change_consumers ORDER BY consumer')
+
+def drop_consumer(db, consumer):
+    """Forget a consumer, so its position no longer holds back pruning"""
+    deleted = db.execute('DELETE FROM change_consumers WHERE consumer = ?', (consumer,)).rowcount
+    db.commit()
+    return bool(deleted)
+
+def prune():
+    """Delete changes of the current database that are no longer needed; returns rows deleted"""
+    db = sqlite3.connect(database.current_path(), timeout=database.BUSY_TIMEOUT, isolation_level=None)
+    try:
+        top = head(db)
+        acked = db.execute('SELECT MIN(acked_seq) FROM change_consumers').fetchone()[0]
+        # seq and changed_at rise together, so only the expired rows are scanned
+        kept = db.execute('SELECT seq FROM changes WHERE changed_at >= datetime(?, ?) ORDER BY seq LIMIT 1',
+                          ('now', f'-{CHANGES_MAX_AGE_DAYS} days')).fetchone()
+        expired = kept[0] - 1 if kept else top
+        # With no consumers registered, unacknowledging readers still need the recent changes
+        floor = expired if acked is None else max(acked, expired)
+        deleted = 0
+        while True:
+            # A range of seq at a time, each its own short transaction
+            count = db.execute('DELETE FROM changes WHERE seq <= ? AND seq < (SELECT MIN(seq) FROM changes) + ?',
+                               (floor, CHANGES_PRUNE_CHUNK)).rowcount
+            if not count:
+                break
+            deleted += count
+        if acked is not None and acked < floor:
+            for (consumer,) in db.execute('SELECT consumer FROM change_consumers WHERE acked_seq < ?', (floor,)):
+                logger.warning('Changes consumer %s fell more than %g days behind; it has to resynchronize',
+                               consumer, CHANGES_MAX_AGE_DAYS)
+        return deleted
+    finally:
+        db.close()
+
+def subscribe(callback, tables=None):
+    """Call callback(property code, changes) for every new batch of changes in this process
+
+    changes is a list of ChangeRecord, only for tables if given. It is
+    None if changes were pruned before the dispatcher read them, so the
+    subscriber cannot know what changed and should drop everything it
+    holds for that property. The code is None without PROPERTIES (and
+    for the group database). Callbacks run on the dispatcher thread, so
+    they should be quick and must not raise; exceptions are logged.
+    The dispatcher starts with the first request a process serves.
+    """
+    subscription = Subscription(callback, tables)
+    with _lock:
+        _subscriptions.append(subscription)
+    return subscription
+
+def _dispatch(code, rows):
+    for subscription in list(_subscriptions):
+        if rows is None:
+            batch = None
+        elif subscription.tables is None:
+            batch = rows
+        else:
+            batch = [row for row in rows if row.table_name in subscription.tables]
+            if not batch:
+                continue
+        try:
+            subscription.callback(code, batch)
+        except Exception:
+            logger.exception('Change subscriber %r failed', subscription.callback)
+
+def _poll(code, db, positions, versions):
+    """Dispatch what was committed to one database since the last poll; returns whether anything was"""
+    version = db.execute('PRAGMA data_version').fetchone()[0]
+    if versions.get(code) == version:
+        return False
+    versions[code] = version
+    found = False
+    while True:
+        try:
+            rows, positions[code] = read(db, positions[code])
+        except ChangesPrunedError as e:
+            positions[code] = e.head
+            _dispatch(code, None)
+            return True
+        if not rows:
+            return found
+        found = True
+        _dispatch(code, rows)
+        if len(rows) < CHANGES_BATCH_SIZE:
+            return found
+
+def _run():
+    global _generation
+    connections = {}
+    positions = {}
+    versions = {}
+    try:
+        while not _stop.is_set():
+            found = False
+            for code, path in database.database_paths():
+                try:
+                    db = connections.get(code)
+                    if db is None:
+                        db = connections[code] = sqlite3.connect(path, timeout=database.BUSY_TIMEOUT)
+                        positions[code] = head(db)
+                    found = _poll(code, db, positions, versions) or found
+                except sqlite3.Error:
+                    # Locked, or the feed table is not there yet; the next poll retries
+                    logger.debug('Could not read changes of %s', path, exc_info=True)
+            if found:
+                with _changed:
+                    _generation += 1
+                    _changed.notify_all()
+            _stop.wait(CHANGES_POLL_INTERVAL)
+    finally:
+        for db in connections.values():
+            db.close()
+
+def _reset():
+    """Fresh locks in a forked child (subscriptions are kept)"""
+    global _lock, _changed, _stop, _waiters
+    _lock = threading.Lock()
+    _changed = threading.Condition()
+    _stop = threading.Event()
+    _waiters = 0
+
+_dispatcher = lazy_thread(_run, 'change-dispatcher', on_reset=_reset)
+
+def _start_for_subscribers():
+    if _subscriptions:
+        _dispatcher.start()
+
+def stop(timeout=None):
+    """Stop the dispatcher thread"""
+    _stop.set()
+    if _dispatcher.current is not None:
+        _dispatcher.current.join(timeout)
+
+def init_changes(app):
+    """Answer reads of pruned changes with 410 and start the dispatcher for subscribers"""
+    def pruned(error):
+        return jsonify({'success': False, 'error': str(error), 'oldest_seq': error.oldest,
+                        'head': error.head}), 410
+
+    app.register_error_handler(ChangesPrunedError, pruned)
+    app.before_request(_start_for_subscribers)
+
+def main(argv=None):
+    parser = cli.parser(__doc__, 'database')
+    parser.add_argument('--property', help='property whose feed to use (default: the group database)')
+    parser.add_argument('--prune', action='store_true', help='delete acknowledged and expired changes now')
+    parser.add_argument('--drop-consumer', metavar='NAME', help='forget a consumer that is gone for good')
+    args = cli.parse(parser, argv)
+
+    with database.use_property(args.property):
+        if args.prune:
+            print(f'{prune():,} changes pruned')
+            return
+        db = database.connect_db()
+        try:
+            if args.drop_consumer:
+                print('Dropped' if drop_consumer(db, args.drop_consumer) else f'No consumer {args.drop_consumer!r}')
+                return
+            top = head(db)
+            count, oldest = db.execute('SELECT COUNT(*), MIN(seq) FROM changes').fetchone()
+            print(f'head {top:,}, {count:,} changes kept' + (f' from seq {oldest:,}' if oldest else ''))
+            for consumer in consumers(db):
+                print(f'{consumer.consumer:<24} acked {consumer.acked_seq:>12,}  '
+                      f'{top - consumer.acked_seq:>10,} behind  at {consumer.acked_at}')
+        finally:
+            db.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,18 @@
+"""Shared setup for the ``python -m app.utils.<module>`` commands"""
+import argparse
+import logging
+from app.utils import database
+
+def parser(doc, db_help):
+    """Argument parser for a command's module docstring, with the --db option every command takes"""
+    result = argparse.ArgumentParser(description=doc, formatter_class=argparse.RawDescriptionHelpFormatter)
+    result.add_argument('--db', default=database.DATABASE_PATH, help=f'{db_help} (default: the app database)')
+    return result
+
+def parse(parser, argv=None, log=True):
+    """Parse the command line, switch to the --db database and log progress to stderr"""
+    args = parser.parse_args(argv)
+    database.configure(args.db)
+    if log:
+        logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+    return args
@@ -0,0 +1,126 @@
+"""Columnar encoding of API payloads
+
+Time series and report responses are mostly arrays of objects that
+repeat the same keys in every element. The columnar encoding, which
+clients opt into with ``Accept: application/vnd.hotel.columnar+json``
+(or ``+msgpack`` when the msgpack package is installed), stores such an
+array once per column instead:
+
+    [{"date": "2024-11-01", "total_sales": 10.5},
+     {"date": "2024-11-02", "total_sales": 12.0}]
+
+becomes
+
+    {"$table": 2, "columns": {
+        "date": {"$dates": "2024-11-01", "deltas": [1]},
+        "total_sales": [10.5, 12.0]}}
+
+``$table`` is the row count. A column of ISO dates is stored as its first
+date and the day differences between consecutive rows. A column whose
+values are objects with the same keys is itself a table. Everything else
+is left as it is, so ``from_columnar`` restores the original payload.
+"""
+from datetime import date
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+COLUMNAR_JSON_MIMETYPE = 'application/vnd.hotel.columnar+json'
+COLUMNAR_MSGPACK_MIMETYPE = 'application/vnd.hotel.columnar+msgpack'
+
+SCALAR_TYPES = (str, int, float, bool, type(None))
+
+def _as_mapping(value):
+    if isinstance(value, dict):
+        return value
+    to_dict = getattr(value, 'to_dict', None)
+    return to_dict() if to_dict is not None else None
+
+def _record_table(rows):
+    """Table for a list of records of one type, read by attribute"""
+    return {'$table': len(rows), 'columns': {
+        field: _column([getattr(row, field) for row in rows]) for field in rows[0].FIELDS
+    }}
+
+def _table(rows):
+    """Table for a list of mappings with the same keys, else None"""
+    keys = rows[0].keys()
+    if any(row.keys() != keys for row in rows):
+        return None
+    return {'$table': len(rows), 'columns': {key: _column([row[key] for row in rows]) for key in keys}}
+
+def _dates(values):
+    """Day ordinals if every value is an ISO date string, else None"""
+    ordinals = []
+    for value in values:
+        if not (isinstance(value, str) and len(value) == 10 and value[4] == '-' and value[7] == '-'):
+            return None
+        try:
+            ordinals.append(date.fromisoformat(value).toordinal())
+        except ValueError:
+            return None
+    return ordinals
+
+def _column(values):
+    ordinals = _dates(values)
+    if ordinals is not None:
+        return {'$dates': values[0], 'deltas': [b - a for a, b in zip(ordinals, ordinals[1:])]}
+    if all(isinstance(value, SCALAR_TYPES) for value in values):
+        return values
+    mappings = [_as_mapping(value) for value in values]
+    if all(mapping is not None for mapping in mappings):
+        table = _table(mappings)
+        if table is not None:
+            return table
+    return [to_columnar(value) for value in values]
+
+def to_columnar(obj):
+    """Payload with every list of same-shaped objects stored as a table"""
+    mapping = _as_mapping(obj)
+    if mapping is not None:
+        return {key: to_columnar(value) for key, value in mapping.items()}
+    if isinstance(obj, (list, tuple)):
+        kind = type(obj[0]) if obj else None
+        if hasattr(kind, 'FIELDS') and all(type(value) is kind for value in obj):
+            return _record_table(obj)
+        if obj:
+            mappings = [_as_mapping(value) for value in obj]
+            if all(mapping is not None for mapping in mappings):
+                table = _table(mappings)
+                if table is not None:
+                    return table
+        return [to_columnar(value) for value in obj]
+    return obj
+
+def _decode_column(column):
+    if isinstance(column, dict) and '$dates' in column:
+        day = date.fromisoformat(column['$dates'])
+        values = [column['$dates']]
+        for delta in column['deltas']:
+            day = date.fromordinal(day.toordinal() + delta)
+            values.append(day.isoformat())
+        return values
+    if isinstance(column, dict) and '$table' in column:
+        return _decode_table(column)
+    return [from_columnar(value) for value in column]
+
+def _decode_table(table):
+    columns = {key: _decode_column(column) for key, column in table['columns'].items()}
+    return [{key: values[index] for key, values in columns.items()} for index in range(table['$table'])]
+
+def from_columnar(obj):
+    """Inverse of to_columnar (records come back as plain dicts)"""
+    if isinstance(obj, dict):
+        if '$table' in obj:
+            return _decode_table(obj)
+        return {key: from_columnar(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [from_columnar(value) for value in obj]
+    return obj
+
+def packb(obj, default=None):
+    """MessagePack bytes for an already columnar payload"""
+    return msgpack.packb(obj, default=default, use_bin_type=True)
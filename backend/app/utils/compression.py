@@ -0,0 +1,42 @@
+"""gzip compression of API responses
+
+Buffered JSON (and columnar) responses are gzipped when the client sends
+``Accept-Encoding: gzip`` and the body is at least COMPRESS_MIN_SIZE
+bytes. Streamed exports and the frontend assets, which are precompressed
+(app.utils.assets), pass through untouched.
+
+Settings (app config, from the environment):
+    COMPRESS_ENABLED    0 to switch compression off (default on)
+    COMPRESS_MIN_SIZE   smallest body worth compressing, in bytes (500)
+    COMPRESS_LEVEL      gzip level 1-9 (6)
+"""
+import gzip
+from flask import current_app, request
+from app.utils.columnar import COLUMNAR_JSON_MIMETYPE, COLUMNAR_MSGPACK_MIMETYPE
+
+COMPRESSIBLE_MIMETYPES = {'application/json', COLUMNAR_JSON_MIMETYPE, COLUMNAR_MSGPACK_MIMETYPE}
+
+def _compress(response):
+    if (response.mimetype not in COMPRESSIBLE_MIMETYPES or response.is_streamed
+            or response.direct_passthrough or 'Content-Encoding' in response.headers
+            or response.status_code < 200 or response.status_code in (204, 304)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    if not request.accept_encodings['gzip']:
+        return response
+
+    data = response.get_data()
+    if len(data) < current_app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    response.set_data(gzip.compress(data, compresslevel=current_app.config['COMPRESS_LEVEL']))
+    response.headers['Content-Encoding'] = 'gzip'
+    return response
+
+def init_compression(app):
+    """Compress JSON responses when COMPRESS_ENABLED is set"""
+    if not app.config.get('COMPRESS_ENABLED'):
+        return
+
+    app.after_request(_compress)
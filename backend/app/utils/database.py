@@ -1,88 +1,278 @@
-"""Database connection and initialization utilities"""
+"""Database connection and initialization utilities
+
+With PROPERTIES set (comma-separated codes, e.g. ``PROPERTIES=north,south``)
+every property gets its own database beside the group database,
+``<name>-<code>.db``. The group database (DATABASE_PATH) keeps accounts,
+the audit trail and scheduler state; rooms, stays and sales live in the
+property databases, which hold a read-only mirror of ``users`` for joins.
+``get_db``/``connect_db`` open the database of the current property: the
+one selected with ``use_property``, else the ``property`` claim of the
+authenticated user, else (for group-wide accounts) the ``X-Property``
+header. Without a property they raise PropertyError; group-level reports
+fan out over every property instead (app.utils.properties).
+"""
+import re
 import sqlite3
 import os
-from flask import g
+from contextlib import contextmanager
+from contextvars import ContextVar
+from flask import g, has_request_context, request
 
 DATABASE_PATH = os.path.join(os.path.dirname(__file__), '../../database/hotel_management.db')
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '../../../database/schema.sql')
+
+PROPERTIES = [code.strip() for code in os.environ.get('PROPERTIES', '').split(',') if code.strip()]
+for _code in PROPERTIES:
+    if not re.fullmatch(r'[a-z0-9_]+', _code) or _code in ('archive', 'analytics'):
+        raise ValueError(f'Invalid property code {_code!r} in PROPERTIES')
+
+# Seconds a connection waits on a locked database before raising "database is locked"
+BUSY_TIMEOUT = float(os.environ.get('DATABASE_BUSY_TIMEOUT', 5.0))
+
+# Fixed demo accounts and rooms; also seeded by the synthetic data generator
+SAMPLE_USERS = [
+    ('admin', 'admin123', 'admin@hotel.com', 'Administrator', 'Admin', None),
+    ('manager1', 'manager123', 'manager1@hotel.com', 'John Manager', 'Manager', 'Management'),
+    ('waiter1', 'waiter123', 'waiter1@hotel.com', 'James Smith', 'Employee', 'Dining'),
+    ('waiter2', 'waiter123', 'waiter2@hotel.com', 'Sarah Johnson', 'Employee', 'Dining'),
+    ('receptionist1', 'recept123', 'recept1@hotel.com', 'Emma Davis', 'Employee', 'Front Desk'),
+]
+
+SAMPLE_ROOMS = [
+    ('101', 'Single', 1, 50.00),
+    ('102', 'Double', 2, 75.00),
+    ('201', 'Suite', 4, 150.00),
+    ('202', 'Deluxe', 2, 100.00),
+    ('301', 'Single', 1, 50.00),
+    ('302', 'Double', 2, 75.00),
+]
+
+_connection_factory = sqlite3.Connection
+
+# Property selected for this thread/task; '' selects the group database
+_selected = ContextVar('property', default=None)
+
+class PropertyError(Exception):
+    """No property, or an unknown one, was selected for property data"""
+
+def property_path(code=None, db_path=None):
+    """Database file of a property, or of the group for None, beside db_path (default: DATABASE_PATH)"""
+    db_path = db_path or DATABASE_PATH
+    if code is None:
+        return db_path
+    stem, ext = os.path.splitext(db_path)
+    return f'{stem}-{code}{ext}'
+
+def configure(path):
+    """Use another group database; property databases are looked up beside it"""
+    global DATABASE_PATH
+    DATABASE_PATH = path
+
+def database_paths():
+    """(property code, path) for every database, the group's (None) first"""
+    return [(None, DATABASE_PATH)] + [(code, property_path(code)) for code in PROPERTIES]
+
+@contextmanager
+def use_property(code):
+    """Route connections opened in this block to a property (None: the group database)"""
+    if code is not None and code not in PROPERTIES:
+        raise PropertyError(f'Unknown property {code!r}')
+    token = _selected.set(code or '')
+    try:
+        yield
+    finally:
+        _selected.reset(token)
+
+def current_property():
+    """Code of the property the current code runs for, or None for group scope"""
+    selected = _selected.get()
+    if selected is not None:
+        return selected or None
+    if not PROPERTIES or not has_request_context():
+        return None
+    user = getattr(request, 'user', None)
+    if not user:
+        return None
+    code = user.get('property')
+    if code is None:
+        # Group-wide accounts may pick a property per request
+        code = request.headers.get('X-Property') or None
+    if code is not None and code not in PROPERTIES:
+        raise PropertyError(f'Unknown property {code!r}')
+    return code
+
+def current_path():
+    """Database file for the current property, or the group's inside use_property(None)"""
+    if not PROPERTIES:
+        return DATABASE_PATH
+    code = current_property()
+    if code is not None:
+        return property_path(code)
+    if _selected.get() == '':
+        return DATABASE_PATH
+    raise PropertyError('Select a property with the X-Property header')
+
+def set_connection_factory(factory):
+    """Use a sqlite3.Connection subclass (e.g. for instrumentation) for new connections"""
+    global _connection_factory
+    _connection_factory = factory
+
+def connect_db(path=None):
+    """Open a new connection to path (default: the current property's database)"""
+    db = sqlite3.connect(path or current_path(), timeout=BUSY_TIMEOUT, factory=_connection_factory)
+    db.row_factory = sqlite3.Row
+    return db
+
+def connect_group_db():
+    """Open a new connection to the group database"""
+    return connect_db(DATABASE_PATH)
+
+def iter_query(sql, params=(), prepare=None):
+    """Yield plain tuples for a query from a dedicated connection
+
+    Rows are pulled from the cursor lazily, so exports can stream result
+    sets of any size after the request-scoped connection has closed.
+    prepare(db), if given, runs on the connection first (e.g. to ATTACH).
+    """
+    # The database is chosen now, while the request still selects it
+    return _iter_rows(current_path(), sql, params, prepare)
+
+def _iter_rows(path, sql, params, prepare):
+    db = connect_db(path)
+    db.row_factory = None
+    try:
+        if prepare is not None:
+            prepare(db)
+        yield from db.execute(sql, params)
+    finally:
+        db.close()
 
 def get_db():
     """Get database connection"""
     db = getattr(g, '_database', None)
     if db is None:
-        db = g._database = sqlite3.connect(DATABASE_PATH)
-        db.row_factory = sqlite3.Row
+        db = g._database = connect_db()
+    return db
+
+def get_group_db():
+    """Get the request's connection to the group database (accounts, audit trail)"""
+    if not PROPERTIES:
+        return get_db()
+    db = getattr(g, '_group_database', None)
+    if db is None:
+        db = g._group_database = connect_group_db()
     return db
 
 def close_db(e=None):
-    """Close database connection"""
-    db = getattr(g, '_database', None)
-    if db is not None:
-        db.close()
+    """Close database connections"""
+    for name in ('_database', '_group_database'):
+        db = g.pop(name, None)
+        if db is not None:
+            db.close()
 
 def init_db(app):
-    """Initialize database with schema"""
+    """Initialize the database(s) with schema"""
     app.teardown_appcontext(close_db)
     
-    # Create database if it doesn't exist
-    if not os.path.exists(DATABASE_PATH):
-        os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
+    os.makedirs(os.path.dirname(DATABASE_PATH), exist_ok=True)
+    if not os.path.exists(SCHEMA_PATH):
+        return
+    
+    from app.utils import migrations
+    from app.utils.maintenance import ensure_statistics
+    new = set()
+    for code, path in database_paths():
+        if not os.path.exists(path) or os.path.getsize(path) == 0:
+            new.add(code)
         
-        # Read and execute schema
-        schema_path = os.path.join(os.path.dirname(__file__), '../../database/schema.sql')
-        if os.path.exists(schema_path):
-            db = sqlite3.connect(DATABASE_PATH)
-            with open(schema_path, 'r') as f:
-                db.executescript(f.read())
-            db.commit()
+        db = sqlite3.connect(path)
+        apply_schema(db)
+        db.close()
+        
+        # Numbered migrations on top of the baseline schema
+        if app.config.get('MIGRATE_ON_STARTUP', True):
+            migrations.upgrade(path)
+        else:
+            db = sqlite3.connect(path)
+            waiting = migrations.pending(db)
+            db.close()
+            if waiting:
+                app.logger.warning('%d schema migration(s) pending in %s; run python -m app.utils.migrations',
+                                   len(waiting), os.path.basename(path))
+    
+    for code, path in database_paths():
+        # Create sample data: accounts in the group database, rooms wherever rooms live
+        if code in new:
+            with app.app_context():
+                _create_sample_data(path, users=code is None, rooms=code is not None or not PROPERTIES)
+        
+        # Planner statistics for databases that have never been analyzed
+        db = sqlite3.connect(path, timeout=BUSY_TIMEOUT)
+        try:
+            ensure_statistics(db)
+        finally:
             db.close()
-            
-            # Create sample data
-            _create_sample_data()
 
-def _create_sample_data():
+def apply_schema(db):
+    """Read and execute the schema on an open connection
+    
+    Every statement is IF NOT EXISTS, so this also brings existing
+    databases up to date with new tables and triggers.
+    """
+    has_guest_index = _table_exists(db, 'check_ins_fts')
+    with open(SCHEMA_PATH, 'r') as f:
+        db.executescript(f.read())
+    if not has_guest_index:
+        # Index stays that predate the search triggers
+        db.execute("INSERT INTO check_ins_fts(check_ins_fts) VALUES ('rebuild')")
+    db.commit()
+
+def missing_schema(db):
+    """(type, name) of every baseline schema object apply_schema would create on this connection"""
+    with open(SCHEMA_PATH, 'r') as f:
+        wanted = re.findall(r'CREATE\s+(?:VIRTUAL\s+)?(TABLE|INDEX|TRIGGER|VIEW)\s+IF\s+NOT\s+EXISTS\s+(\w+)',
+                            f.read(), re.IGNORECASE)
+    existing = {row[0] for row in db.execute('SELECT name FROM sqlite_master')}
+    return [(kind.lower(), name) for kind, name in wanted if name not in existing]
+
+def _table_exists(db, name):
+    """Check whether a table (or virtual table) exists"""
+    row = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+def _create_sample_data(path, users=True, rooms=True):
     """Create sample data for testing"""
     from app.models.user import User
     
-    db = sqlite3.connect(DATABASE_PATH)
+    db = sqlite3.connect(path)
     cursor = db.cursor()
     
-    # Check if admin already exists
-    cursor.execute('SELECT COUNT(*) FROM users')
-    if cursor.fetchone()[0] == 0:
-        # Create admin user
-        User.create_user('admin', 'admin123', 'admin@hotel.com', 'Administrator', 'Admin')
-        # Create manager user
-        User.create_user('manager1', 'manager123', 'manager1@hotel.com', 'John Manager', 'Manager', 'Management')
-        # Create employees
-        User.create_user('waiter1', 'waiter123', 'waiter1@hotel.com', 'James Smith', 'Employee', 'Dining')
-        User.create_user('waiter2', 'waiter123', 'waiter2@hotel.com', 'Sarah Johnson', 'Employee', 'Dining')
-        User.create_user('receptionist1', 'recept123', 'recept1@hotel.com', 'Emma Davis', 'Employee', 'Front Desk')
-        
-        # Create sample rooms
-        rooms = [
-            ('101', 'Single', 1, 50.00),
-            ('102', 'Double', 2, 75.00),
-            ('201', 'Suite', 4, 150.00),
-            ('202', 'Deluxe', 2, 100.00),
-            ('301', 'Single', 1, 50.00),
-            ('302', 'Double', 2, 75.00),
-        ]
-        
-        for room_num, room_type, capacity, price in rooms:
-            cursor.execute('''
-                INSERT INTO rooms (room_number, room_type, capacity, price_per_night)
-                VALUES (?, ?, ?, ?)
-            ''', (room_num, room_type, capacity, price))
-        
-        db.commit()
+    if users:
+        # Check if admin already exists
+        cursor.execute('SELECT COUNT(*) FROM users')
+        if cursor.fetchone()[0] == 0:
+            for username, password, email, full_name, role, department in SAMPLE_USERS:
+                User.create_user(username, password, email, full_name, role, department)
+    
+    if rooms:
+        cursor.execute('SELECT COUNT(*) FROM rooms')
+        if cursor.fetchone()[0] == 0:
+            for room_num, room_type, capacity, price in SAMPLE_ROOMS:
+                cursor.execute('''
+                    INSERT INTO rooms (room_number, room_type, capacity, price_per_night)
+                    VALUES (?, ?, ?, ?)
+                ''', (room_num, room_type, capacity, price))
+            db.commit()
     
     db.close()
 
 def generate_occupancy_report():
-    """Generate occupancy report"""
+    """Generate occupancy report for the current property"""
     from datetime import datetime
     
-    db = sqlite3.connect(DATABASE_PATH)
+    db = connect_db()
     cursor = db.cursor()
     
     # Count rooms by status
@@ -0,0 +1,377 @@
+"""
+Synthetic dataset generator for load and performance testing
+
+Builds on the fixed demo accounts and rooms from ``_create_sample_data``
+and adds seeded, reproducible staff, rooms, check-in histories and sales
+at configurable scale, then rebuilds the summary tables from the sales.
+
+With PROPERTIES set, the data is laid out as the app expects it then:
+accounts go to the group database at --db, each generated employee with
+a home property, and every property gets a database of its own
+(``<name>-<code>.db``) with its share of the rooms, stays and sales and a
+mirror of the accounts.
+
+Usage (from the backend directory):
+    python -m app.utils.datagen --db /tmp/hotel_large.db --reset
+    python -m app.utils.datagen --db /tmp/hotel_large.db --reset \\
+        --users 500 --rooms 3000 --days 730 --sales-per-day 40000
+    PROPERTIES=north,south python -m app.utils.datagen --db /tmp/hotel_group.db --reset
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import date, timedelta
+from werkzeug.security import generate_password_hash
+from app.utils import database, migrations
+from app.utils.database import DATABASE_PATH, SAMPLE_USERS, SAMPLE_ROOMS, apply_schema
+
+GENERATED_PASSWORD = 'password123'
+
+# Share of sales, typical amount range and example descriptions per category
+CATEGORIES = {
+    'Room': (0.15, (50.0, 450.0), ['Room charge', 'Late checkout', 'Room upgrade', 'Extra bed']),
+    'Food': (0.40, (6.0, 120.0), ['Breakfast', 'Lunch', 'Dinner', 'Room service', 'Snack']),
+    'Beverage': (0.30, (2.5, 60.0), ['Coffee', 'Soft drink', 'Wine', 'Cocktail', 'Beer']),
+    'Services': (0.10, (10.0, 200.0), ['Laundry', 'Spa', 'Airport transfer', 'Parking', 'Tour']),
+    'Other': (0.05, (1.0, 80.0), ['Gift shop', 'Minibar', 'Phone', 'Misc']),
+}
+PAYMENT_METHODS = (('Card', 0.55), ('Cash', 0.20), ('Mobile', 0.15), ('Online', 0.07), ('Check', 0.03))
+
+# Relative sales volume by hour of day, Monday-first weekday and calendar month
+HOUR_WEIGHTS = [1, 1, 1, 1, 1, 2, 6, 10, 12, 8, 5, 6, 11, 12, 7, 5, 5, 7, 11, 13, 10, 7, 4, 2]
+WEEKDAY_FACTORS = [0.85, 0.85, 0.9, 0.95, 1.15, 1.25, 1.05]
+MONTH_FACTORS = [0.8, 0.8, 0.9, 0.95, 1.0, 1.15, 1.3, 1.3, 1.05, 0.95, 0.85, 1.0]
+
+ROOM_TYPES = (('Single', 1, 50.0, 0.3), ('Double', 2, 75.0, 0.4), ('Deluxe', 2, 100.0, 0.2), ('Suite', 4, 150.0, 0.1))
+DEPARTMENTS = ('Dining', 'Front Desk', 'Bar', 'Housekeeping', 'Spa')
+
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'David', 'Elizabeth',
+               'William', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Daniel', 'Karen',
+               'Amina', 'Wanjiru', 'Otieno', 'Akinyi', 'Kamau', 'Jose', 'Lucia', 'Chen', 'Yuki', 'Priya']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Garcia', 'Miller', 'Davis', 'Martinez', 'Lopez',
+              'Wilson', 'Anderson', 'Taylor', 'Thomas', 'Moore', 'Jackson', 'Martin', 'Lee', 'Mwangi', 'Odhiambo',
+              'Njoroge', 'Kariuki', 'Alvarez', 'Rossi', 'Wang', 'Tanaka', 'Patel', 'Nguyen', 'Kim', 'Muller']
+
+# Precomputed draws per category; sampling from pools keeps the hot loop cheap
+POOL_SIZE = 4096
+
+def _person(rng):
+    return f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+
+def generate_users(db, rng, count, properties=()):
+    """Seed the demo accounts plus count generated staff; returns employee ids
+
+    With properties, each generated account gets one of them as its home
+    property; the demo accounts stay group-wide.
+    """
+    rows = [(username, generate_password_hash(password), email, full_name, role, department, None)
+            for username, password, email, full_name, role, department in SAMPLE_USERS]
+
+    # Hashing is deliberately slow, so every generated account shares one hash
+    shared_hash = generate_password_hash(GENERATED_PASSWORD)
+    managers = max(1, count // 25)
+    for idx in range(1, count + 1):
+        role = 'Manager' if idx <= managers else 'Employee'
+        department = 'Management' if role == 'Manager' else rng.choice(DEPARTMENTS)
+        rows.append((f'staff{idx:05d}', shared_hash, f'staff{idx:05d}@hotel.com',
+                     _person(rng), role, department, rng.choice(properties) if properties else None))
+
+    if properties:
+        # Migration 002 adds users.property later; loading it now saves rewriting every account
+        db.execute('ALTER TABLE users ADD COLUMN property TEXT')
+        db.executemany('''
+            INSERT INTO users (username, password, email, full_name, role, department, property)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+    else:
+        db.executemany('''
+            INSERT INTO users (username, password, email, full_name, role, department)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', [row[:-1] for row in rows])
+    return [row[0] for row in db.execute("SELECT user_id FROM users WHERE role = 'Employee' ORDER BY user_id")]
+
+def copy_users(db, group_path):
+    """Mirror the group database's accounts into a property database, as properties.sync_users does"""
+    db.execute('ATTACH DATABASE ? AS group_db', (group_path,))
+    db.execute('ALTER TABLE users ADD COLUMN property TEXT')
+    db.execute('INSERT INTO main.users SELECT * FROM group_db.users')
+    employees = [row[0] for row in db.execute(
+        "SELECT user_id FROM users WHERE role = 'Employee' ORDER BY user_id")]
+    db.execute('DETACH DATABASE group_db')
+    return employees
+
+def generate_rooms(db, rng, count):
+    """Seed the demo rooms plus count generated rooms, 50 to a floor from the 10th floor up"""
+    rows = list(SAMPLE_ROOMS)
+    types = [room[:3] for room in ROOM_TYPES]
+    weights = [room[3] for room in ROOM_TYPES]
+
+    for idx in range(count):
+        floor, number = divmod(idx, 50)
+        room_type, capacity, base_price = rng.choices(types, weights)[0]
+        price = round(base_price * rng.uniform(0.9, 1.3), 2)
+        rows.append((f'{floor + 10}{number + 1:02d}', room_type, capacity, price))
+
+    db.executemany('''
+        INSERT INTO rooms (room_number, room_type, capacity, price_per_night)
+        VALUES (?, ?, ?, ?)
+    ''', rows)
+    return [(row[0], row[1]) for row in db.execute('SELECT room_id, capacity FROM rooms ORDER BY room_id')]
+
+def generate_check_ins(db, rng, rooms, employees, start, days, today):
+    """Back-to-back stays per room over the period; returns check-in count
+
+    Stays overlapping today are left Active and their rooms Occupied, and
+    the per-day occupancy is written to occupancy_report.
+    """
+    occupied = [0] * (days + 1)  # difference array over day offsets
+    occupied_rooms = []
+    check_in_id = 0
+
+    def stays():
+        nonlocal check_in_id
+        for room_id, capacity in rooms:
+            offset = rng.randint(0, 3)
+            while offset < days:
+                nights = min(rng.choices((1, 2, 3, 4, 5, 7, 10, 14), (20, 25, 20, 12, 9, 8, 4, 2))[0], days - offset)
+                check_in = start + timedelta(days=offset)
+                check_out = check_in + timedelta(days=nights)
+                check_in_id += 1
+                occupied[offset] += 1
+                occupied[offset + nights] -= 1
+
+                if check_in <= today < check_out:
+                    status = 'Active'
+                    occupied_rooms.append((room_id,))
+                else:
+                    status = 'Cancelled' if rng.random() < 0.03 else 'Completed'
+
+                guest = _person(rng)
+                handle = guest.lower().replace(' ', '.')
+                yield (check_in_id, room_id, guest, f'{handle}{check_in_id % 1000}@example.com',
+                       f'+1555{rng.randint(1000000, 9999999)}', check_in.isoformat(), check_out.isoformat(),
+                       rng.randint(1, capacity), rng.choice(employees), status)
+                offset += nights + rng.choices((0, 0, 1, 2, 3, 5), k=1)[0]
+
+    db.executemany('''
+        INSERT INTO check_ins
+        (check_in_id, room_id, guest_name, guest_email, guest_phone, check_in_date, check_out_date,
+         number_of_guests, check_in_employee_id, status)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', stays())
+
+    db.executemany("UPDATE rooms SET status = 'Occupied' WHERE room_id = ?", occupied_rooms)
+
+    total = len(rooms)
+    report = []
+    running = 0
+    for offset in range(days):
+        running += occupied[offset]
+        report.append(((start + timedelta(days=offset)).isoformat(), total, running, total - running,
+                       round(running / total * 100, 2) if total else 0))
+    db.executemany('''
+        INSERT INTO occupancy_report (report_date, total_rooms, occupied_rooms, available_rooms, occupancy_rate)
+        VALUES (?, ?, ?, ?, ?)
+    ''', report)
+    return check_in_id
+
+def _sale_pools(rng):
+    """Pools of pre-drawn (category, description, amount) and payment values"""
+    names = list(CATEGORIES)
+    shares = [CATEGORIES[name][0] for name in names]
+    items = []
+    for name in rng.choices(names, shares, k=POOL_SIZE):
+        _, (low, high), descriptions = CATEGORIES[name]
+        # Skew towards the low end of the range, as real tickets are
+        amount = round(low + (high - low) * rng.random() ** 2, 2)
+        items.append((name, rng.choice(descriptions), amount))
+
+    payments = rng.choices([p[0] for p in PAYMENT_METHODS], [p[1] for p in PAYMENT_METHODS], k=POOL_SIZE)
+    times = [f'{hour:02d}:{rng.randrange(60):02d}:{rng.randrange(60):02d}'
+             for hour in rng.choices(range(24), HOUR_WEIGHTS, k=POOL_SIZE)]
+    return items, payments, times
+
+def generate_sales(db, rng, employees, start, days, sales_per_day):
+    """Insert sales with weekday and seasonal volume; returns the row count"""
+    items, payments, times = _sale_pools(rng)
+    sale_id = 0
+
+    def sales():
+        nonlocal sale_id
+        for offset in range(days):
+            day = start + timedelta(days=offset)
+            sale_date = day.isoformat()
+            factor = WEEKDAY_FACTORS[day.weekday()] * MONTH_FACTORS[day.month - 1]
+            count = int(sales_per_day * factor * rng.uniform(0.9, 1.1))
+            staff = rng.choices(employees, k=count)
+            picks = rng.choices(items, k=count)
+            methods = rng.choices(payments, k=count)
+            stamps = rng.choices(times, k=count)
+            for idx in range(count):
+                sale_id += 1
+                category, description, amount = picks[idx]
+                method = methods[idx]
+                yield (sale_id, staff[idx], sale_date, category, description, amount, method,
+                       None if method == 'Cash' else f'TX{sale_id:010d}', f'{sale_date} {stamps[idx]}')
+
+    # executemany consumes the generator directly, so rows are never all in memory
+    db.executemany('''
+        INSERT INTO sales
+        (sale_id, employee_id, sale_date, category, description, amount, payment_method, transaction_id, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', sales())
+    return sale_id
+
+def rebuild_summaries(db):
+    """Recompute daily_sales_summary and monthly_sales_report from sales"""
+    db.execute('DELETE FROM daily_sales_summary')
+    db.execute('''
+        INSERT INTO daily_sales_summary
+        (employee_id, sale_date, total_sales, room_sales, food_sales, beverage_sales, service_sales, transaction_count)
+        SELECT employee_id, sale_date,
+               SUM(amount),
+               SUM(CASE WHEN category = 'Room' THEN amount ELSE 0 END),
+               SUM(CASE WHEN category = 'Food' THEN amount ELSE 0 END),
+               SUM(CASE WHEN category = 'Beverage' THEN amount ELSE 0 END),
+               SUM(CASE WHEN category = 'Services' THEN amount ELSE 0 END),
+               COUNT(*)
+        FROM sales
+        GROUP BY employee_id, sale_date
+    ''')
+    db.execute('DELETE FROM monthly_sales_report')
+    db.execute('''
+        INSERT INTO monthly_sales_report
+        (employee_id, year, month, total_sales, room_sales, food_sales, beverage_sales, service_sales, transaction_count)
+        SELECT employee_id, CAST(strftime('%Y', sale_date) AS INTEGER), CAST(strftime('%m', sale_date) AS INTEGER),
+               SUM(total_sales), SUM(room_sales), SUM(food_sales), SUM(beverage_sales), SUM(service_sales),
+               SUM(transaction_count)
+        FROM daily_sales_summary
+        GROUP BY employee_id, strftime('%Y-%m', sale_date)
+    ''')
+
+def _open(path):
+    """Connection for bulk loading an empty database"""
+    db = sqlite3.connect(path, isolation_level=None)
+    apply_schema(db)
+    if db.execute('SELECT COUNT(*) FROM users').fetchone()[0]:
+        db.close()
+        raise ValueError(f'{path} already has data; pass --reset to replace it')
+
+    # Bulk load settings: a crash mid-load just means regenerating
+    db.execute('PRAGMA journal_mode = OFF')
+    db.execute('PRAGMA synchronous = OFF')
+    db.execute('PRAGMA cache_size = -262144')
+    # Secondary indexes and the guest search index are cheaper to build once at the end
+    db.execute('DROP INDEX IF EXISTS idx_sales_employee_date')
+    db.execute('DROP INDEX IF EXISTS idx_sales_date')
+    db.execute('DROP TRIGGER IF EXISTS check_ins_fts_insert')
+    return db
+
+def _finish(db, path, label, log):
+    """Rollups, indexes, migrations and statistics once a database is loaded"""
+    began = time.perf_counter()
+    db.execute('BEGIN')
+    rebuild_summaries(db)
+    db.execute('COMMIT')
+    # Recreates the sales indexes and search trigger dropped by _open; migrations run after
+    # the load, so the change-feed triggers they add do not fire for generated rows
+    apply_schema(db)
+    db.execute("INSERT INTO check_ins_fts(check_ins_fts) VALUES ('rebuild')")
+    migrations.upgrade(path, log=lambda message: None)
+    db.execute('ANALYZE')
+    log(f'{label:<20}{"":>12} {"":>4} {time.perf_counter() - began:>8.2f}s (indexes and rollups)')
+
+def generate(path, users=200, rooms=1000, days=365, sales_per_day=5000,
+             start_date=None, seed=42, reset=False, log=print, properties=None):
+    """Generate a dataset into the database at path; returns row counts
+
+    properties (default: PROPERTIES) are the codes of the property
+    databases to generate beside path. Without any, path gets everything;
+    with some, path gets the accounts and each property database its
+    share of rooms, stays and sales.
+    """
+    properties = list(database.PROPERTIES if properties is None else properties)
+    paths = [database.property_path(code, path) for code in [None] + properties]
+    if reset:
+        for target in paths:
+            if os.path.exists(target):
+                os.remove(target)
+
+    rng = random.Random(seed)
+    today = date.today()
+    start = date.fromisoformat(start_date) if start_date else today - timedelta(days=days - 1)
+    counts = {}
+
+    def timed(db, name, label, step, *args):
+        began = time.perf_counter()
+        db.execute('BEGIN')
+        result = step(db, rng, *args)
+        db.execute('COMMIT')
+        count = len(result) if isinstance(result, list) else result
+        counts[name] = counts.get(name, 0) + count
+        elapsed = time.perf_counter() - began
+        log(f'{label:<20}{count:>12,} rows {elapsed:>8.2f}s {count / elapsed:>12,.0f} rows/s')
+        return result
+
+    def load_property(db, employees, room_count, daily_sales, prefix=''):
+        room_list = timed(db, 'rooms', f'{prefix}rooms', generate_rooms, room_count)
+        timed(db, 'check_ins', f'{prefix}check_ins', generate_check_ins, room_list, employees, start, days, today)
+        timed(db, 'sales', f'{prefix}sales', generate_sales, employees, start, days, daily_sales)
+
+    db = _open(path)
+    try:
+        employees = timed(db, 'users', 'users', generate_users, users, properties)
+        if not properties:
+            load_property(db, employees, rooms, sales_per_day)
+        _finish(db, path, 'summaries', log)
+    finally:
+        db.close()
+
+    for code, property_path in zip(properties, paths[1:]):
+        db = _open(property_path)
+        try:
+            copy_users(db, path)
+            # Home staff and group-wide staff work here
+            employees = [row[0] for row in db.execute(
+                "SELECT user_id FROM users WHERE role = 'Employee' AND (property = ? OR property IS NULL)",
+                (code,))]
+            load_property(db, employees, -(-rooms // len(properties)),
+                          max(1, sales_per_day // len(properties)), f'{code} ')
+            _finish(db, property_path, f'{code} summaries', log)
+        finally:
+            db.close()
+    return counts
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default=DATABASE_PATH, help='database file to write (default: the app database)')
+    parser.add_argument('--users', type=int, default=200, help='generated staff on top of the demo accounts')
+    parser.add_argument('--rooms', type=int, default=1000, help='generated rooms on top of the demo rooms')
+    parser.add_argument('--days', type=int, default=365, help='days of history')
+    parser.add_argument('--sales-per-day', type=int, default=5000, help='average sales per day across all staff')
+    parser.add_argument('--start-date', help='first day of history, YYYY-MM-DD (default: so history ends today)')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--reset', action='store_true', help='delete the database file first')
+    args = parser.parse_args(argv)
+
+    if args.users < 1 or args.days < 1:
+        parser.error('--users and --days must be at least 1')
+
+    began = time.perf_counter()
+    try:
+        counts = generate(args.db, args.users, args.rooms, args.days, args.sales_per_day,
+                          args.start_date, args.seed, args.reset)
+    except ValueError as e:
+        sys.exit(str(e))
+
+    total = sum(counts.values())
+    elapsed = time.perf_counter() - began
+    print(f'{total:,} rows in {elapsed:.2f}s ({total / elapsed:,.0f} rows/s) -> {args.db}'
+          + (f' and {len(database.PROPERTIES)} property databases' if database.PROPERTIES else ''))
+    print(f'Generated staff log in with password "{GENERATED_PASSWORD}"')
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,21 @@
-"""Export utilities for Excel and PDF generation"""
+"""Export utilities for Excel, PDF and CSV generation"""
+import csv
+import io
 import os
 import json
+import multiprocessing
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
+import zlib
+from itertools import chain, islice
+from app.utils.server import Lazy
 try:
     import openpyxl
+    from openpyxl.cell import WriteOnlyCell
     from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
+    from openpyxl.utils import get_column_letter
     OPENPYXL_AVAILABLE = True
 except ImportError:
     OPENPYXL_AVAILABLE = False
@@ -15,111 +26,327 @@ try:
     from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
     from reportlab.lib.styles import getSampleStyleSheet
     from reportlab.lib import colors
+    from reportlab.pdfbase.pdfmetrics import stringWidth
     REPORTLAB_AVAILABLE = True
 except ImportError:
     REPORTLAB_AVAILABLE = False
 
-def export_to_excel(data, filename, title="Report"):
-    """Export data to Excel file"""
-    if not OPENPYXL_AVAILABLE:
-        return None, "openpyxl not installed"
+try:
+    from pypdf import PdfWriter
+    PYPDF_AVAILABLE = True
+except ImportError:
+    PYPDF_AVAILABLE = False
+
+EXCEL_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+WIDTH_SAMPLE_ROWS = 200  # rows inspected to size columns
+STREAM_CHUNK_SIZE = 64 * 1024
+CSV_BATCH_ROWS = 2000  # rows serialized per yielded chunk
+GZIP_LEVEL = 6
+
+STREAM_MIMETYPES = {
+    'excel': EXCEL_MIMETYPE,
+    'csv': 'text/csv',
+    'csv.gz': 'application/gzip'
+}
+
+PDF_ROWS_PER_TABLE = 40  # roughly one letter page; keeps table layout linear
+PDF_PARALLEL_MIN_ROWS = 5000  # below this, process start-up outweighs the gain
+PDF_WORKERS = int(os.environ.get('PDF_WORKERS', os.cpu_count() or 1))
+PDF_FONT_SIZE = 10
+PDF_CELL_PADDING = 12
+
+# Render workers start from a clean process, not a fork of a threaded server
+PDF_START_METHOD = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+
+_pdf_pool = Lazy(lambda: ProcessPoolExecutor(max_workers=PDF_WORKERS,
+                                             mp_context=multiprocessing.get_context(PDF_START_METHOD)))
+
+def _headers_for(row):
+    """Derive column headers from a dict, sqlite3.Row or plain sequence"""
+    if hasattr(row, 'keys'):
+        return list(row.keys())
+    return list(range(len(row)))
+
+def _row_values(row, headers):
+    """Return row values in header order"""
+    if isinstance(row, dict):
+        return [row.get(header) for header in headers]
+    return list(row)
+
+def _column_widths(headers, sample):
+    """Estimate column widths from the headers and a sample of rows"""
+    widths = [len(str(header)) for header in headers]
+    for row in sample:
+        for idx, value in enumerate(_row_values(row, headers)[:len(widths)]):
+            if value is not None:
+                widths[idx] = max(widths[idx], len(str(value)))
+    return [width + 2 for width in widths]
+
+def write_excel(rows, fileobj, headers=None, title="Report"):
+    """Write rows to a file path or file object as XLSX in a single pass
     
-    wb = openpyxl.Workbook()
-    ws = wb.active
-    ws.title = "Report"
+    Uses a write-only workbook, so rows are serialized as they are consumed
+    and memory stays bounded no matter how many rows ``rows`` yields.
+    """
+    rows = iter(rows)
+    sample = list(islice(rows, WIDTH_SAMPLE_ROWS))
+    if headers is None:
+        headers = _headers_for(sample[0]) if sample else []
     
-    # Add title
-    ws['A1'] = title
-    title_font = Font(bold=True, size=14)
-    ws['A1'].font = title_font
+    wb = openpyxl.Workbook(write_only=True)
+    ws = wb.create_sheet("Report")
+    
+    # Column widths must be set before the first row in write-only mode
+    for idx, width in enumerate(_column_widths(headers, sample), start=1):
+        ws.column_dimensions[get_column_letter(idx)].width = width
     
-    # Add timestamp
-    ws['A2'] = f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+    # Add title and timestamp
+    title_cell = WriteOnlyCell(ws, value=title)
+    title_cell.font = Font(bold=True, size=14)
+    ws.append([title_cell])
+    ws.append([f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"])
+    ws.append([])
     
     # Add headers
-    if data and len(data) > 0:
-        headers = data[0].keys() if isinstance(data[0], dict) else list(range(len(data[0])))
-        for col, header in enumerate(headers, start=1):
-            cell = ws.cell(row=4, column=col, value=header)
+    if headers:
+        header_cells = []
+        for header in headers:
+            cell = WriteOnlyCell(ws, value=header)
             cell.font = Font(bold=True)
             cell.fill = PatternFill(start_color="CCCCCC", end_color="CCCCCC", fill_type="solid")
-        
-        # Add data
-        for row_idx, row_data in enumerate(data, start=5):
-            if isinstance(row_data, dict):
-                for col_idx, (key, value) in enumerate(row_data.items(), start=1):
-                    ws.cell(row=row_idx, column=col_idx, value=value)
-            else:
-                for col_idx, value in enumerate(row_data, start=1):
-                    ws.cell(row=row_idx, column=col_idx, value=value)
-    
-    # Adjust column widths
-    for column in ws.columns:
-        max_length = 0
-        column_letter = column[0].column_letter
-        for cell in column:
-            try:
-                if len(str(cell.value)) > max_length:
-                    max_length = len(str(cell.value))
-            except:
-                pass
-        adjusted_width = (max_length + 2)
-        ws.column_dimensions[column_letter].width = adjusted_width
+            header_cells.append(cell)
+        ws.append(header_cells)
+    
+    # Add data
+    for row in chain(sample, rows):
+        ws.append(_row_values(row, headers))
+    
+    wb.save(fileobj)
+
+def stream_excel(rows, headers=None, title="Report"):
+    """Generate an XLSX document and yield it in chunks
+    
+    The workbook is assembled in a private anonymous temporary file, so
+    concurrent exports never share a path and nothing is left on disk.
+    """
+    with tempfile.TemporaryFile() as buffer:
+        write_excel(rows, buffer, headers, title)
+        buffer.seek(0)
+        for chunk in iter(lambda: buffer.read(STREAM_CHUNK_SIZE), b''):
+            yield chunk
+
+def export_to_excel(data, filename, title="Report"):
+    """Export data to Excel file"""
+    if not OPENPYXL_AVAILABLE:
+        return None, "openpyxl not installed"
     
     # Save file
     try:
-        wb.save(filename)
+        write_excel(data, filename, title=title)
         return filename, "Success"
     except Exception as e:
         return None, str(e)
 
-def export_to_pdf(data, filename, title="Report"):
-    """Export data to PDF file"""
+def stream_csv(rows, headers=None):
+    """Serialize rows to UTF-8 CSV, yielding one chunk per batch of rows
+    
+    Only a single batch is held in memory, so rows can come straight from
+    a database cursor of any size.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if headers is None and first is not None:
+        headers = _headers_for(first)
+    if first is not None:
+        rows = chain([first], rows)
+    
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if headers:
+        writer.writerow(headers)
+    
+    as_dicts = isinstance(first, dict)
+    while True:
+        batch = list(islice(rows, CSV_BATCH_ROWS))
+        if not batch:
+            break
+        if as_dicts:
+            batch = [_row_values(row, headers) for row in batch]
+        writer.writerows(batch)
+        yield buffer.getvalue().encode('utf-8')
+        buffer.seek(0)
+        buffer.truncate()
+    
+    tail = buffer.getvalue()
+    if tail:
+        yield tail.encode('utf-8')
+
+def gzip_stream(chunks, level=GZIP_LEVEL):
+    """Compress a stream of byte chunks incrementally into gzip format"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+def stream_export(rows, headers=None, title="Report", export_format='excel'):
+    """Stream rows in one of the STREAM_MIMETYPES formats"""
+    if export_format == 'excel':
+        return stream_excel(rows, headers, title)
+    if export_format == 'csv':
+        return stream_csv(rows, headers)
+    if export_format == 'csv.gz':
+        return gzip_stream(stream_csv(rows, headers))
+    raise ValueError(f'Format cannot be streamed: {export_format}')
+
+def _pdf_table_style():
+    """Shared style for every table chunk"""
+    return TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, -1), PDF_FONT_SIZE),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
+    ])
+
+def _pdf_table_data(data):
+    """Split data into a header row and string body rows"""
+    if not data:
+        return [], []
+    if isinstance(data[0], dict):
+        headers = list(data[0].keys())
+        rows = [[str(row.get(key, '')) for key in headers] for row in data]
+        return headers, rows
+    rows = [[str(value) for value in row] for row in data]
+    return rows[0], rows[1:]
+
+def _pdf_column_widths(headers, rows, available_width):
+    """Fixed column widths from a sample, scaled to fit the page"""
+    widths = [stringWidth(str(header), 'Helvetica-Bold', PDF_FONT_SIZE) for header in headers]
+    for row in rows[:WIDTH_SAMPLE_ROWS]:
+        for idx, value in enumerate(row[:len(widths)]):
+            widths[idx] = max(widths[idx], stringWidth(value, 'Helvetica', PDF_FONT_SIZE))
+    widths = [width + PDF_CELL_PADDING for width in widths]
+    
+    total = sum(widths)
+    if total > available_width:
+        widths = [width * available_width / total for width in widths]
+    return widths
+
+def _pdf_sections(data, section_by):
+    """Group data into (heading, headers, rows) sections, keeping row order"""
+    headers, rows = _pdf_table_data(data)
+    if not section_by or section_by not in headers:
+        return [(None, headers, rows)]
+    
+    column = headers.index(section_by)
+    groups = {}
+    for row in rows:
+        groups.setdefault(row[column], []).append(row)
+    return [(heading, headers, group) for heading, group in groups.items()]
+
+def _render_pdf(target, title, sections, col_widths, footer=True):
+    """Render sections into target as chunked tables with repeating headers"""
+    doc = SimpleDocTemplate(target, pagesize=letter)
+    elements = []
+    styles = getSampleStyleSheet()
+    table_style = _pdf_table_style()
+    
+    # Add title
+    if title:
+        elements.append(Paragraph(title, styles['Heading1']))
+        elements.append(Spacer(1, 0.3*inch))
+    
+    # Page-sized tables avoid reportlab re-laying-out one huge table per page
+    for heading, headers, rows in sections:
+        if heading is not None:
+            elements.append(Paragraph(str(heading), styles['Heading2']))
+        for start in range(0, len(rows), PDF_ROWS_PER_TABLE):
+            table = Table([headers] + rows[start:start + PDF_ROWS_PER_TABLE],
+                          colWidths=col_widths, repeatRows=1)
+            table.setStyle(table_style)
+            elements.append(table)
+        if not rows and headers:
+            table = Table([headers], colWidths=col_widths)
+            table.setStyle(table_style)
+            elements.append(table)
+        elements.append(Spacer(1, 0.2*inch))
+    
+    # Add generation timestamp
+    if footer:
+        elements.append(Spacer(1, 0.1*inch))
+        timestamp = f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
+        elements.append(Paragraph(timestamp, styles['Normal']))
+    
+    doc.build(elements)
+
+def _render_pdf_part(args):
+    """Process pool entry point: render one batch of sections to bytes"""
+    title, sections, col_widths, footer = args
+    buffer = io.BytesIO()
+    _render_pdf(buffer, title, sections, col_widths, footer)
+    return buffer.getvalue()
+
+def _batch_sections(sections, batches):
+    """Split sections into contiguous batches of roughly equal row counts"""
+    total = sum(len(rows) for _, _, rows in sections)
+    target = max(total // batches, 1)
+    result, current, size = [], [], 0
+    for section in sections:
+        current.append(section)
+        size += len(section[2])
+        if size >= target and len(result) < batches - 1:
+            result.append(current)
+            current, size = [], 0
+    if current:
+        result.append(current)
+    return result
+
+def export_to_pdf(data, filename, title="Report", section_by=None):
+    """Export data to PDF file
+    
+    With ``section_by`` set to a column name, rows are grouped into one
+    section per value. Large sectioned reports are rendered in a process
+    pool and the parts merged when pypdf is installed.
+    """
     if not REPORTLAB_AVAILABLE:
         return None, "reportlab not installed"
     
     try:
-        doc = SimpleDocTemplate(filename, pagesize=letter)
-        elements = []
-        styles = getSampleStyleSheet()
+        sections = _pdf_sections(data, section_by)
+        headers = sections[0][1]
+        available_width = letter[0] - 2 * inch  # SimpleDocTemplate default margins
+        col_widths = _pdf_column_widths(headers, [row for _, _, rows in sections for row in rows],
+                                        available_width) if headers else None
         
-        # Add title
-        title_style = styles['Heading1']
-        elements.append(Paragraph(title, title_style))
-        elements.append(Spacer(1, 0.3*inch))
+        total_rows = sum(len(rows) for _, _, rows in sections)
+        batches = _batch_sections(sections, PDF_WORKERS)
         
-        # Convert data to table format
-        if data:
-            if isinstance(data[0], dict):
-                headers = list(data[0].keys())
-                table_data = [headers]
-                for row in data:
-                    table_data.append([str(row.get(key, '')) for key in headers])
-            else:
-                table_data = [list(row) for row in data]
-            
-            # Create table
-            table = Table(table_data)
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey])
-            ]))
+        if len(batches) > 1 and PYPDF_AVAILABLE and total_rows >= PDF_PARALLEL_MIN_ROWS:
+            parts = [(title if idx == 0 else None, batch, col_widths, idx == len(batches) - 1)
+                     for idx, batch in enumerate(batches)]
+            pool = _pdf_pool.get()
+            try:
+                rendered = list(pool.map(_render_pdf_part, parts))
+            except BrokenProcessPool:
+                # Workers died; the next export starts a new pool
+                _pdf_pool.discard(pool)
+                pool.shutdown(wait=False)
+                raise
             
-            elements.append(table)
-        
-        # Add generation timestamp
-        elements.append(Spacer(1, 0.3*inch))
-        timestamp = f"Generated: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}"
-        elements.append(Paragraph(timestamp, styles['Normal']))
+            writer = PdfWriter()
+            for part in rendered:
+                writer.append(io.BytesIO(part))
+            with open(filename, 'wb') as f:
+                writer.write(f)
+        else:
+            _render_pdf(filename, title, sections, col_widths)
         
-        doc.build(elements)
         return filename, "Success"
     except Exception as e:
         return None, str(e)
@@ -0,0 +1,245 @@
+"""Background export jobs with a worker pool and a shared artifact cache
+
+Exports are registered by name with a builder that returns the rows to
+render and a watermark function whose value changes whenever the
+underlying data does. Finished artifacts are stored under a key derived
+from (report type, params, format, watermark), so exporting a closed
+period a second time is served straight from the cache.
+
+Job state lives in the ``export_jobs`` table rather than in memory, so
+any server worker can answer a status poll for a job another worker ran.
+Exports, their jobs and their cache keys belong to the property the
+request selects (app.utils.database).
+"""
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from app.utils.database import connect_db, current_property, use_property
+from app.utils.server import Lazy
+from app.utils.export import write_excel, export_to_pdf, stream_export, OPENPYXL_AVAILABLE, REPORTLAB_AVAILABLE
+
+EXPORT_WORKERS = int(os.environ.get('EXPORT_WORKERS', 2))
+EXPORT_CACHE_DIR = os.environ.get('EXPORT_CACHE_DIR', os.path.join(tempfile.gettempdir(), 'hotel_exports'))
+EXPORT_CACHE_MAX_FILES = int(os.environ.get('EXPORT_CACHE_MAX_FILES', 200))
+
+FORMAT_EXTENSIONS = {'excel': 'xlsx', 'pdf': 'pdf', 'csv': 'csv', 'csv.gz': 'csv.gz'}
+PROGRESS_STEP = 10  # percent between progress writes
+
+_reports = {}
+_executor = Lazy(lambda: ThreadPoolExecutor(max_workers=EXPORT_WORKERS, thread_name_prefix='export'))
+
+class ExportError(Exception):
+    """Raised for invalid export requests"""
+
+def register_report(name, params, build, watermark, filename, pdf_section=None):
+    """Register an exportable report
+    
+    params: mapping of parameter name to a converter such as int or str
+    build(**params) -> (rows, headers, title); headers may be None for dict rows
+    watermark(**params) -> value that changes whenever the report data changes
+    filename(**params) -> download name without extension
+    pdf_section: optional column to split PDF output into sections by
+    """
+    _reports[name] = {
+        'params': params,
+        'build': build,
+        'watermark': watermark,
+        'filename': filename,
+        'pdf_section': pdf_section
+    }
+
+def _validate(report_type, params, export_format):
+    """Check the report, coerce its params and check the format is available"""
+    report = _reports.get(report_type)
+    if report is None:
+        raise ExportError('Unknown report type')
+    
+    if export_format not in FORMAT_EXTENSIONS:
+        raise ExportError('Unsupported export format')
+    if export_format == 'excel' and not OPENPYXL_AVAILABLE:
+        raise ExportError('openpyxl not installed')
+    if export_format == 'pdf' and not REPORTLAB_AVAILABLE:
+        raise ExportError('reportlab not installed')
+    
+    params = params or {}
+    try:
+        clean = {name: convert(params[name]) for name, convert in report['params'].items()}
+    except KeyError as e:
+        raise ExportError(f'Missing parameter: {e.args[0]}')
+    except (TypeError, ValueError):
+        raise ExportError('Invalid parameters')
+    
+    return report, clean
+
+def _cache_key(report_type, params, export_format, watermark):
+    """Hash everything that determines the artifact's content"""
+    code = current_property()
+    raw = json.dumps([report_type, params, export_format, str(watermark)] + ([code] if code else []), sort_keys=True)
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def artifact_path(cache_key, export_format):
+    """Location of a cached artifact"""
+    return os.path.join(EXPORT_CACHE_DIR, f'{cache_key}.{FORMAT_EXTENSIONS[export_format]}')
+
+def download_name(report_type, params, export_format):
+    """Client-facing file name for an export"""
+    stem = _reports[report_type]['filename'](**params)
+    return f'{stem}.{FORMAT_EXTENSIONS[export_format]}'
+
+def _prune_cache():
+    """Drop the least recently written artifacts beyond the cache limit"""
+    try:
+        entries = [os.path.join(EXPORT_CACHE_DIR, name) for name in os.listdir(EXPORT_CACHE_DIR)
+                   if not name.startswith('.')]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for path in entries[EXPORT_CACHE_MAX_FILES:]:
+            os.remove(path)
+    except OSError:
+        pass
+
+def _render(report, params, export_format, target, on_progress=None):
+    """Build the report and write it atomically to target"""
+    rows, headers, title = report['build'](**params)
+    
+    os.makedirs(EXPORT_CACHE_DIR, exist_ok=True)
+    fd, partial = tempfile.mkstemp(dir=EXPORT_CACHE_DIR, prefix='.partial-')
+    os.close(fd)
+    
+    try:
+        if export_format == 'excel':
+            if on_progress and isinstance(rows, list):
+                rows = _track_progress(rows, on_progress)
+            write_excel(rows, partial, headers, title)
+        elif export_format in ('csv', 'csv.gz'):
+            with open(partial, 'wb') as f:
+                for chunk in stream_export(rows, headers, title, export_format):
+                    f.write(chunk)
+        else:
+            data = list(rows)
+            if headers:
+                data = [headers] + [list(row) for row in data]
+            result_file, status = export_to_pdf(data, partial, title, section_by=report['pdf_section'])
+            if not result_file:
+                raise RuntimeError(status)
+        os.replace(partial, target)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    
+    _prune_cache()
+
+def _track_progress(rows, on_progress):
+    """Yield rows, reporting percentage progress at PROGRESS_STEP intervals"""
+    total = len(rows) or 1
+    reported = 0
+    for idx, row in enumerate(rows, start=1):
+        yield row
+        percent = idx * 100 // total
+        if percent - reported >= PROGRESS_STEP:
+            reported = percent
+            on_progress(min(percent, 99))
+
+def build_export(report_type, params, export_format):
+    """Validate an export and build its rows without rendering
+    
+    Must be called inside an app context. Returns (rows, headers, title, download name).
+    """
+    report, params = _validate(report_type, params, export_format)
+    rows, headers, title = report['build'](**params)
+    return rows, headers, title, download_name(report_type, params, export_format)
+
+def render_cached(report_type, params, export_format):
+    """Render an export synchronously, reusing a cached artifact if present
+    
+    Must be called inside an app context. Returns (path, download name).
+    """
+    report, params = _validate(report_type, params, export_format)
+    cache_key = _cache_key(report_type, params, export_format, report['watermark'](**params))
+    path = artifact_path(cache_key, export_format)
+    
+    if not os.path.exists(path):
+        _render(report, params, export_format, path)
+    
+    return path, download_name(report_type, params, export_format)
+
+def _update_job(job_id, **fields):
+    """Persist job state changes"""
+    set_clause = ', '.join(f'{key} = ?' for key in fields)
+    db = connect_db()
+    try:
+        db.execute(f'UPDATE export_jobs SET {set_clause} WHERE job_id = ?',
+                   list(fields.values()) + [job_id])
+        db.commit()
+    finally:
+        db.close()
+
+def _run_job(app, code, job_id, report_type, params, export_format, path):
+    """Worker entry point, for the property the job was submitted in"""
+    report = _reports[report_type]
+    with use_property(code):
+        try:
+            _update_job(job_id, status='Running')
+            with app.app_context():
+                _render(report, params, export_format, path,
+                        on_progress=lambda percent: _update_job(job_id, progress=percent))
+            _update_job(job_id, status='Completed', progress=100, finished_at=_now())
+        except Exception as e:
+            _update_job(job_id, status='Failed', error=str(e), finished_at=_now())
+
+def _now():
+    """Timestamp in the format SQLite's CURRENT_TIMESTAMP uses"""
+    return datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+
+def submit_job(app, report_type, params, export_format, user_id=None):
+    """Queue an export, completing it immediately on a cache hit
+    
+    Must be called inside an app context. Returns the job record.
+    """
+    report, params = _validate(report_type, params, export_format)
+    cache_key = _cache_key(report_type, params, export_format, report['watermark'](**params))
+    path = artifact_path(cache_key, export_format)
+    
+    job_id = uuid.uuid4().hex
+    cached = os.path.exists(path)
+    
+    db = connect_db()
+    try:
+        db.execute('''
+            INSERT INTO export_jobs
+            (job_id, report_type, params, export_format, status, progress, cache_key, cached, created_by, finished_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (job_id, report_type, json.dumps(params, sort_keys=True), export_format,
+              'Completed' if cached else 'Queued', 100 if cached else 0,
+              cache_key, int(cached), user_id, _now() if cached else None))
+        db.commit()
+    finally:
+        db.close()
+    
+    if not cached:
+        _executor.get().submit(_run_job, app, current_property(), job_id, report_type, params, export_format, path)
+    
+    return get_job(job_id)
+
+def get_job(job_id):
+    """Fetch a job record as a dict, or None"""
+    db = connect_db()
+    try:
+        row = db.execute('''
+            SELECT job_id, report_type, params, export_format, status, progress,
+                   cache_key, cached, error, created_by, created_at, finished_at
+            FROM export_jobs WHERE job_id = ?
+        ''', (job_id,)).fetchone()
+    finally:
+        db.close()
+    
+    if row is None:
+        return None
+    
+    job = dict(row)
+    job['params'] = json.loads(job['params'])
+    job['cached'] = bool(job['cached'])
+    return job
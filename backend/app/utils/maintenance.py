@@ -0,0 +1,249 @@
+"""
+Routine SQLite maintenance
+
+Run by the scheduler (app.utils.scheduler), on the group database and
+on every property database:
+
+- ``analyze`` (weekly): full ``ANALYZE``, so the planner can tell apart
+  indexes such as idx_sales_employee_date and idx_sales_date. A
+  database that has never been analyzed gets a quick, sampled ANALYZE on
+  startup (``ensure_statistics``).
+- ``maintenance`` (nightly): ``PRAGMA optimize``, which re-analyzes only
+  tables whose contents have shifted, then bounded incremental vacuum
+  steps and a truncating WAL checkpoint.
+- ``wal_checkpoint`` (every 5 minutes): in WAL mode, a PASSIVE checkpoint
+  once the WAL passes WAL_CHECKPOINT_BYTES and a TRUNCATE checkpoint once
+  it passes WAL_TRUNCATE_BYTES. SQLite's own checkpoints never shrink
+  the file and are starved by long reads, so the WAL can otherwise grow
+  without bound.
+
+Incremental vacuum returns free pages to the file system in steps of
+VACUUM_STEP_PAGES, each its own short transaction with a VACUUM_SLEEP
+pause between, and at most VACUUM_MAX_STEPS per run, so writers are
+never locked out for long. It needs ``auto_vacuum = INCREMENTAL``, which
+the schema sets for new databases. An existing database has to be
+rebuilt once to switch; ``--enable-incremental-vacuum`` does that with a
+full VACUUM, which locks the database for its duration.
+
+Settings (environment):
+    WAL_CHECKPOINT_BYTES   WAL size that triggers a passive checkpoint (4 MB)
+    WAL_TRUNCATE_BYTES     WAL size that triggers a truncating checkpoint (64 MB)
+    VACUUM_STEP_PAGES      free pages released per step (1000)
+    VACUUM_MAX_STEPS       steps per nightly run (100)
+    VACUUM_SLEEP           seconds to pause between steps (0.05)
+
+Usage (from the backend directory):
+    python -m app.utils.maintenance                  nightly steps
+    python -m app.utils.maintenance --analyze
+    python -m app.utils.maintenance --checkpoint
+    python -m app.utils.maintenance --stats
+    python -m app.utils.maintenance --enable-incremental-vacuum
+    python -m app.utils.maintenance --property north    with PROPERTIES set
+"""
+import logging
+import os
+import sqlite3
+import time
+from app.utils import archive, cli, database
+
+WAL_CHECKPOINT_BYTES = int(os.environ.get('WAL_CHECKPOINT_BYTES', 4 * 1024 * 1024))
+WAL_TRUNCATE_BYTES = int(os.environ.get('WAL_TRUNCATE_BYTES', 64 * 1024 * 1024))
+VACUUM_STEP_PAGES = int(os.environ.get('VACUUM_STEP_PAGES', 1000))
+VACUUM_MAX_STEPS = int(os.environ.get('VACUUM_MAX_STEPS', 100))
+VACUUM_SLEEP = float(os.environ.get('VACUUM_SLEEP', 0.05))
+
+# Rows sampled per index by the startup ANALYZE of a never-analyzed database
+BOOTSTRAP_ANALYSIS_LIMIT = 1000
+
+AUTO_VACUUM_MODES = {0: 'none', 1: 'full', 2: 'incremental'}
+
+logger = logging.getLogger('app.maintenance')
+
+def _connect(path=None):
+    # Autocommit, so every maintenance statement is its own short transaction
+    return sqlite3.connect(path or database.current_path(), timeout=database.BUSY_TIMEOUT, isolation_level=None)
+
+def _wal_bytes(path=None):
+    try:
+        return os.path.getsize((path or database.current_path()) + '-wal')
+    except OSError:
+        return 0
+
+def ensure_statistics(db):
+    """Run a sampled ANALYZE if the database has never been analyzed"""
+    analyzed = db.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'").fetchone()
+    if analyzed and db.execute('SELECT 1 FROM sqlite_stat1 LIMIT 1').fetchone():
+        return False
+    began = time.perf_counter()
+    db.execute(f'PRAGMA analysis_limit = {BOOTSTRAP_ANALYSIS_LIMIT}')
+    db.execute('ANALYZE')
+    db.execute('PRAGMA analysis_limit = 0')
+    db.commit()
+    logger.info('Collected initial planner statistics in %.2fs', time.perf_counter() - began)
+    return True
+
+def analyze():
+    """Full ANALYZE of the main database; returns seconds taken"""
+    began = time.perf_counter()
+    db = _connect()
+    try:
+        db.execute('ANALYZE main')
+    finally:
+        db.close()
+    return round(time.perf_counter() - began, 3)
+
+def checkpoint(mode=None):
+    """Checkpoint the WAL according to its size (or in mode); returns the result or None
+
+    The result is (mode, busy, WAL frames, frames checkpointed) as
+    reported by ``PRAGMA wal_checkpoint``. busy is 1 when readers or a
+    writer kept the checkpoint from completing; the next run retries.
+    """
+    wal = _wal_bytes()
+    if mode is None:
+        if wal >= WAL_TRUNCATE_BYTES:
+            mode = 'TRUNCATE'
+        elif wal >= WAL_CHECKPOINT_BYTES:
+            mode = 'PASSIVE'
+        else:
+            return None
+    db = _connect()
+    try:
+        if db.execute('PRAGMA journal_mode').fetchone()[0] != 'wal':
+            return None
+        busy, frames, done = db.execute(f'PRAGMA wal_checkpoint({mode})').fetchone()
+    finally:
+        db.close()
+    if busy:
+        logger.warning('%s checkpoint of a %d byte WAL was blocked (%d of %d frames)', mode, wal, done, frames)
+    return mode, busy, frames, done
+
+def incremental_vacuum(max_steps=None):
+    """Release free pages in bounded steps; returns the number of pages released"""
+    max_steps = VACUUM_MAX_STEPS if max_steps is None else max_steps
+    db = _connect()
+    try:
+        if db.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            return 0
+        released = 0
+        for step in range(max_steps):
+            free = db.execute('PRAGMA freelist_count').fetchone()[0]
+            if not free:
+                break
+            if step:
+                time.sleep(VACUUM_SLEEP)
+            # The pragma frees one page per step of the statement; execute()
+            # steps a row-less statement only once, executescript() to the end
+            db.executescript(f'PRAGMA incremental_vacuum({min(free, VACUUM_STEP_PAGES)});')
+            released += free - db.execute('PRAGMA freelist_count').fetchone()[0]
+        return released
+    finally:
+        db.close()
+
+def enable_incremental_vacuum():
+    """Switch an existing database to auto_vacuum=INCREMENTAL with a full VACUUM"""
+    db = _connect()
+    try:
+        db.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        db.execute('VACUUM')
+        return AUTO_VACUUM_MODES[db.execute('PRAGMA auto_vacuum').fetchone()[0]]
+    finally:
+        db.close()
+
+def run_maintenance():
+    """The nightly steps on the current database; returns what was done"""
+    began = time.perf_counter()
+    db = _connect()
+    try:
+        db.execute('PRAGMA optimize')
+    finally:
+        db.close()
+    result = {
+        'optimize': True,
+        'vacuumed_pages': incremental_vacuum(),
+        'checkpoint': checkpoint('TRUNCATE'),
+        'seconds': round(time.perf_counter() - began, 3),
+    }
+    logger.info('Maintenance finished in %.2fs (%d pages released)', result['seconds'], result['vacuumed_pages'])
+    return result
+
+def stats(path=None):
+    """Sizes of a database (default: the current one), its WAL, free pages and archives"""
+    path = path or database.current_path()
+    db = _connect(path)
+    try:
+        page_size, page_count, freelist, journal_mode, auto_vacuum = (
+            db.execute(f'PRAGMA {name}').fetchone()[0]
+            for name in ('page_size', 'page_count', 'freelist_count', 'journal_mode', 'auto_vacuum')
+        )
+    finally:
+        db.close()
+    return {
+        'file_bytes': os.path.getsize(path),
+        'wal_bytes': _wal_bytes(path),
+        'page_size': page_size,
+        'pages': page_count,
+        'freelist_pages': freelist,
+        'freelist_bytes': freelist * page_size,
+        'journal_mode': journal_mode,
+        'auto_vacuum': AUTO_VACUUM_MODES.get(auto_vacuum, auto_vacuum),
+        'archive_bytes': sum(os.path.getsize(archive.archive_path(year, path)) for year in archive.archived_years(path)),
+    }
+
+def metric_lines():
+    """Prometheus lines for database, WAL, freelist and archive sizes, per property database"""
+    current = {}
+    for code, path in database.database_paths():
+        try:
+            current[code] = stats(path)
+        except (sqlite3.Error, OSError):
+            continue
+    lines = []
+    for name, help_text, key in (
+        ('database_size_bytes', 'Size of the main database file', 'file_bytes'),
+        ('database_wal_bytes', 'Size of the write-ahead log (0 outside WAL mode)', 'wal_bytes'),
+        ('database_freelist_bytes', 'Unused pages inside the database file', 'freelist_bytes'),
+        ('database_archive_size_bytes', 'Total size of the archive files', 'archive_bytes'),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge']
+        for code, values in current.items():
+            labels = f'{{property="{code or "group"}"}}' if database.PROPERTIES else ''
+            lines.append(f'{name}{labels} {values[key]}')
+    return lines
+
+def init_maintenance(app):
+    """Report database file sizes on /metrics when METRICS_ENABLED is set"""
+    if not app.config.get('METRICS_ENABLED'):
+        return
+
+    from app.utils import metrics
+    metrics.register_collector(metric_lines)
+
+def main(argv=None):
+    parser = cli.parser(__doc__, 'database to maintain')
+    parser.add_argument('--analyze', action='store_true', help='run a full ANALYZE')
+    parser.add_argument('--checkpoint', action='store_true', help='truncate the WAL (WAL mode only)')
+    parser.add_argument('--stats', action='store_true', help='print file, WAL and freelist sizes')
+    parser.add_argument('--enable-incremental-vacuum', action='store_true',
+                        help='rebuild the database with auto_vacuum=INCREMENTAL (stop the backend first)')
+    parser.add_argument('--property', help='property whose database to maintain (default: the group database)')
+    args = cli.parse(parser, argv)
+
+    with database.use_property(args.property):
+        _main(args)
+
+def _main(args):
+    if args.stats:
+        for key, value in stats().items():
+            print(f'{key:<16} {value:>14,}' if isinstance(value, int) else f'{key:<16} {value:>14}')
+    elif args.analyze:
+        print(f'ANALYZE took {analyze():.2f}s')
+    elif args.checkpoint:
+        print(checkpoint('TRUNCATE') or 'Not in WAL mode')
+    elif args.enable_incremental_vacuum:
+        print(f'auto_vacuum is now {enable_incremental_vacuum()}')
+    else:
+        print(run_maintenance())
+
+if __name__ == '__main__':
+    main()
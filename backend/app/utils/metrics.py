@@ -0,0 +1,293 @@
+"""Request and SQL instrumentation exported in Prometheus text format
+
+When enabled, every request records its endpoint, status and latency, and
+every statement run through a connection from ``get_db``/``connect_db``
+is counted and timed against the request that issued it, including
+statements that group-wide requests run on the fan-out threads. A
+statement's time covers fetching its rows, since SQLite computes rows as
+they are fetched. Statements slower than ``SLOW_QUERY_MS`` are logged.
+When disabled (the default) no hooks are installed, so requests and
+queries run exactly as before, and ``/metrics`` answers 404.
+
+``/metrics`` shows query timings, database sizes and job state, so with
+``METRICS_TOKEN`` set it answers only scrapes that send it as a bearer
+token.
+"""
+import hmac
+import logging
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from flask import Response, current_app, jsonify, request
+from app.utils import database
+
+SLOW_QUERY_MS = float(os.environ.get('SLOW_QUERY_MS', 100))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 250, 500)
+
+logger = logging.getLogger('app.sql')
+
+_lock = threading.Lock()
+_request_stats = threading.local()
+
+class Histogram:
+    """Cumulative-bucket histogram in the Prometheus sense"""
+    __slots__ = ('bounds', 'counts', 'total', 'count')
+    
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * len(bounds)
+        self.total = 0.0
+        self.count = 0
+    
+    def observe(self, value):
+        for idx, bound in enumerate(self.bounds):
+            if value <= bound:
+                self.counts[idx] += 1
+                break
+        self.total += value
+        self.count += 1
+    
+    def lines(self, name, labels):
+        """Prometheus exposition lines for this histogram"""
+        cumulative = 0
+        for bound, count in zip(self.bounds, self.counts):
+            cumulative += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+        yield f'{name}_bucket{{{labels},le="+Inf"}} {self.count}'
+        yield f'{name}_sum{{{labels}}} {self.total}'
+        yield f'{name}_count{{{labels}}} {self.count}'
+
+# (endpoint, method, status) -> Histogram of request seconds
+_latency = {}
+# endpoint -> Histogram of queries per request
+_queries_per_request = {}
+# endpoint -> [query count, sql seconds, slow query count]
+_sql_totals = {}
+# Functions returning extra exposition lines, called on every scrape
+_collectors = []
+
+def register_collector(collect):
+    """Add metrics computed at scrape time, e.g. from files or the database"""
+    if collect not in _collectors:
+        _collectors.append(collect)
+
+def request_stats():
+    """Statement counters of the request running on this thread, or None"""
+    return getattr(_request_stats, 'current', None)
+
+@contextmanager
+def counted_in(stats):
+    """Count the statements run in this block toward a request's stats
+
+    For work a request hands to another thread, which has no stats of
+    its own. The block's counts are added to stats when it ends.
+    """
+    if stats is None:
+        yield
+        return
+    previous = request_stats()
+    local = _request_stats.current = [0, 0.0, 0]
+    try:
+        yield
+    finally:
+        _request_stats.current = previous
+        with _lock:
+            for idx, value in enumerate(local):
+                stats[idx] += value
+
+def _record_query(elapsed, statement=False):
+    """Attribute time spent on a statement (and, when it starts, the statement) to the current request"""
+    stats = request_stats()
+    if stats is not None:
+        if statement:
+            stats[0] += 1
+        stats[1] += elapsed
+
+def _record_slow(sql, elapsed):
+    stats = request_stats()
+    if stats is not None:
+        stats[2] += 1
+    logger.warning('Slow query (%.1f ms): %s', elapsed * 1000, ' '.join(str(sql).split()))
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor that times every statement, from execute() until its rows are fetched
+    
+    A statement is checked against SLOW_QUERY_MS when its rows run out,
+    the cursor runs another statement, or the cursor is closed.
+    """
+    _sql = None
+    _elapsed = 0.0
+    
+    def _run(self, method, sql, *args):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return method(sql, *args)
+        finally:
+            elapsed = time.perf_counter() - start
+            _record_query(elapsed, statement=True)
+            self._sql, self._elapsed = sql, elapsed
+    
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            elapsed = time.perf_counter() - start
+            _record_query(elapsed)
+            self._elapsed += elapsed
+    
+    def _finish(self):
+        sql, self._sql = self._sql, None
+        if sql is not None and self._elapsed * 1000 >= SLOW_QUERY_MS:
+            _record_slow(sql, self._elapsed)
+    
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters)
+    
+    def executescript(self, sql_script):
+        return self._run(super().executescript, sql_script)
+    
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        if row is None:
+            self._finish()
+        return row
+    
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        rows = self._fetch(super().fetchmany, size)
+        if len(rows) < size:
+            self._finish()
+        return rows
+    
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        self._finish()
+        return rows
+    
+    def __next__(self):
+        try:
+            return self._fetch(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+    
+    def close(self):
+        self._finish()
+        super().close()
+    
+    def __del__(self):
+        self._finish()
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including execute shortcuts) are timed"""
+    
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+    
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+    
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+    
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+def _endpoint_label():
+    """Low-cardinality endpoint name: the matched URL rule"""
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+def _before_request():
+    _request_stats.current = [0, 0.0, 0]
+    _request_stats.started = time.perf_counter()
+
+def _after_request(response):
+    stats = getattr(_request_stats, 'current', None)
+    if stats is None:
+        return response
+    elapsed = time.perf_counter() - _request_stats.started
+    _request_stats.current = None
+    
+    endpoint = _endpoint_label()
+    key = (endpoint, request.method, response.status_code)
+    with _lock:
+        histogram = _latency.get(key)
+        if histogram is None:
+            histogram = _latency[key] = Histogram(LATENCY_BUCKETS)
+        histogram.observe(elapsed)
+        
+        per_request = _queries_per_request.get(endpoint)
+        if per_request is None:
+            per_request = _queries_per_request[endpoint] = Histogram(QUERY_COUNT_BUCKETS)
+        per_request.observe(stats[0])
+        
+        totals = _sql_totals.setdefault(endpoint, [0, 0.0, 0])
+        totals[0] += stats[0]
+        totals[1] += stats[1]
+        totals[2] += stats[2]
+    return response
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"')
+
+def render_metrics():
+    """All collected metrics in Prometheus text exposition format"""
+    lines = []
+    with _lock:
+        lines.append('# HELP http_request_duration_seconds Request latency by endpoint, method and status')
+        lines.append('# TYPE http_request_duration_seconds histogram')
+        for (endpoint, method, status), histogram in sorted(_latency.items()):
+            labels = f'endpoint="{_escape(endpoint)}",method="{method}",status="{status}"'
+            lines.extend(histogram.lines('http_request_duration_seconds', labels))
+        
+        lines.append('# HELP db_queries_per_request SQL statements issued per request')
+        lines.append('# TYPE db_queries_per_request histogram')
+        for endpoint, histogram in sorted(_queries_per_request.items()):
+            lines.extend(histogram.lines('db_queries_per_request', f'endpoint="{_escape(endpoint)}"'))
+        
+        counters = (
+            ('db_queries_total', 'SQL statements executed', 0),
+            ('db_query_duration_seconds_total', 'Time spent executing SQL', 1),
+            ('db_slow_queries_total', f'SQL statements slower than {SLOW_QUERY_MS:g} ms', 2),
+        )
+        for name, help_text, idx in counters:
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} counter')
+            for endpoint, totals in sorted(_sql_totals.items()):
+                lines.append(f'{name}{{endpoint="{_escape(endpoint)}"}} {totals[idx]}')
+    
+    for collect in _collectors:
+        lines.extend(collect())
+    
+    return '\n'.join(lines) + '\n'
+
+def metrics_view():
+    """Prometheus scrape endpoint"""
+    if not current_app.config.get('METRICS_ENABLED'):
+        return jsonify({'success': False, 'error': 'Metrics are disabled'}), 404
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get('Authorization', ''),
+                                                 f'Bearer {METRICS_TOKEN}'):
+        return jsonify({'success': False, 'error': 'Invalid or missing metrics token'}), 401
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+def init_metrics(app):
+    """Enable instrumentation on the app when METRICS_ENABLED is set"""
+    # Always routed, so that when disabled it is a 404 rather than the frontend page
+    app.add_url_rule('/metrics', 'metrics', metrics_view)
+    if not app.config.get('METRICS_ENABLED'):
+        return
+    
+    database.set_connection_factory(InstrumentedConnection)
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -0,0 +1,392 @@
+"""
+Versioned schema migrations
+
+``database/schema.sql`` is the baseline every database starts from; it is
+applied on each start and only ever creates what is missing. Changes to
+existing tables and anything expensive on a large database (new
+indexes, columns, backfills) are numbered migrations in
+``database/migrations/``:
+
+    NNN_name.sql   run in one transaction
+    NNN_name.py    upgrade(m) called with a Migration helper
+
+Applied versions are recorded in ``schema_version``, and pending ones run
+in order on startup (unless MIGRATE_ON_STARTUP=0) or from the CLI, on
+the group database and every property database. New databases run every
+migration; on an empty database they are instant.
+
+A Python migration runs in one transaction too, unless it sets
+``TRANSACTIONAL = False``. Then each helper commits on its own, so a
+backfill over millions of rows never holds the write lock for longer
+than one chunk, and its version is only recorded once all of it has
+run. Such a migration must be safe to rerun after an interruption,
+which the helpers are (IF NOT EXISTS, and backfills select only rows
+still to do).
+
+SQLite builds an index in a single statement, so ``create_index`` cannot
+split the build itself. It shortens the time the write lock is held by
+reading the table into the cache before taking the lock and sorting in
+a large cache, then ANALYZEs the new index so the planner uses it.
+
+Settings (environment):
+    MIGRATE_ON_STARTUP     0 to leave pending migrations to the CLI (default on)
+    MIGRATION_CHUNK_SIZE   rows per backfill transaction (5000)
+    MIGRATION_CHUNK_SLEEP  seconds to pause between backfill chunks (0.01)
+
+Usage (from the backend directory):
+    python -m app.utils.migrations              apply pending migrations
+    python -m app.utils.migrations --dry-run    show what would run
+    python -m app.utils.migrations --status
+
+--dry-run and --status open the databases read-only. Baseline schema
+objects a database is missing are listed rather than created.
+"""
+import importlib.util
+import logging
+import os
+import re
+import sqlite3
+import sys
+import time
+import urllib.parse
+from app.utils import cli, database
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:  # Windows
+    FCNTL_AVAILABLE = False
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(database.SCHEMA_PATH), 'migrations')
+MIGRATION_CHUNK_SIZE = int(os.environ.get('MIGRATION_CHUNK_SIZE', 5000))
+MIGRATION_CHUNK_SLEEP = float(os.environ.get('MIGRATION_CHUNK_SLEEP', 0.01))
+
+# Page cache for the migration connection, in KiB, so index sorts stay in memory
+MIGRATION_CACHE_KB = 262144
+
+logger = logging.getLogger('app.migrations')
+
+class MigrationError(Exception):
+    """A migration failed or the migrations directory is inconsistent"""
+
+class MigrationFile:
+    __slots__ = ('version', 'name', 'path')
+
+    def __init__(self, version, name, path):
+        self.version = version
+        self.name = name
+        self.path = path
+
+    def __repr__(self):
+        return f'{self.version:03d}_{self.name}'
+
+def discover(directory=None):
+    """Migration files in version order"""
+    directory = directory or MIGRATIONS_DIR
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        return []
+    found = {}
+    for filename in names:
+        match = re.fullmatch(r'(\d+)_(\w+)\.(sql|py)', filename)
+        if not match:
+            continue
+        version = int(match.group(1))
+        if version in found:
+            raise MigrationError(f'Two migrations numbered {version}: {found[version].path} and {filename}')
+        found[version] = MigrationFile(version, match.group(2), os.path.join(directory, filename))
+    return [found[version] for version in sorted(found)]
+
+def applied_versions(db):
+    if not database._table_exists(db, 'schema_version'):
+        return set()
+    return {row[0] for row in db.execute('SELECT version FROM schema_version')}
+
+def pending(db, directory=None):
+    done = applied_versions(db)
+    return [migration for migration in discover(directory) if migration.version not in done]
+
+def _load(migration):
+    spec = importlib.util.spec_from_file_location(f'migration_{migration!r}', migration.path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    if not hasattr(module, 'upgrade'):
+        raise MigrationError(f'{migration.path} defines no upgrade(m)')
+    return module
+
+class Migration:
+    """Helpers handed to a Python migration's upgrade(m)
+
+    db is an autocommit connection. Inside a transactional migration the
+    runner has already begun the transaction, and the helpers just run
+    their statements in it.
+    """
+
+    def __init__(self, db, transactional, dry_run=False, log=logger.info):
+        self.db = db
+        self.transactional = transactional
+        self.dry_run = dry_run
+        self.log = log
+
+    def execute(self, sql, params=()):
+        """Run one statement (in its own transaction unless the migration is transactional)"""
+        if self.dry_run:
+            self.log(f'    would run: {" ".join(sql.split())}')
+            return None
+        if self.transactional:
+            return self.db.execute(sql, params)
+        self.db.execute('BEGIN IMMEDIATE')
+        try:
+            cursor = self.db.execute(sql, params)
+            self.db.execute('COMMIT')
+            return cursor
+        except BaseException:
+            self.db.execute('ROLLBACK')
+            raise
+
+    def columns(self, table):
+        return [row[1] for row in self.db.execute(f'PRAGMA table_info({table})')]
+
+    def add_column(self, table, column, definition):
+        """ALTER TABLE ... ADD COLUMN unless the column exists"""
+        if column in self.columns(table):
+            return False
+        self.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+        return True
+
+    def create_index(self, name, table, columns, where=None, unique=False):
+        """Build an index unless it exists, holding the write lock as briefly as SQLite allows"""
+        exists = self.db.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (name,)).fetchone()
+        if exists:
+            return False
+        sql = (f"CREATE {'UNIQUE ' if unique else ''}INDEX IF NOT EXISTS {name} ON {table}({columns})"
+               + (f' WHERE {where}' if where else ''))
+        if self.dry_run:
+            rows = self.db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+            self.log(f'    would build over {rows:,} rows: {sql}')
+            return True
+        began = time.perf_counter()
+        if not self.transactional:
+            # A full scan outside the lock leaves the table's pages cached for the build
+            self.db.execute(f'SELECT COUNT(*) FROM {table} NOT INDEXED').fetchone()
+        warmed = time.perf_counter()
+        self.execute(sql)
+        built = time.perf_counter()
+        self.execute(f'ANALYZE {name}')
+        self.log(f'    {name}: warm {warmed - began:.2f}s, build {built - warmed:.2f}s (write lock), '
+                 f'analyze {time.perf_counter() - built:.2f}s')
+        return True
+
+    def backfill(self, table, assignments, where, params=(), chunk_size=None):
+        """UPDATE table SET assignments WHERE where, one rowid range per transaction
+
+        where must stop matching a row once it has been updated (e.g.
+        ``new_column IS NULL``), so an interrupted backfill resumes where
+        it stopped. Returns the number of rows updated.
+        """
+        chunk_size = chunk_size or MIGRATION_CHUNK_SIZE
+        sql = f'UPDATE {table} SET {assignments} WHERE ({where})'
+        if self.dry_run:
+            try:
+                rows = f"{self.db.execute(f'SELECT COUNT(*) FROM {table} WHERE ({where})', params).fetchone()[0]:,}"
+            except sqlite3.OperationalError:
+                # The condition may use a column an earlier step would add
+                rows = f"up to {self.db.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]:,}"
+            self.log(f'    would update {rows} rows in chunks of {chunk_size:,}: {sql}')
+            return 0
+        if self.transactional:
+            return self.db.execute(sql, params).rowcount
+
+        low, high = self.db.execute(f'SELECT MIN(rowid), MAX(rowid) FROM {table} WHERE ({where})', params).fetchone()
+        if low is None:
+            return 0
+        updated, chunks, began = 0, 0, time.perf_counter()
+        for start in range(low, high + 1, chunk_size):
+            updated += self.execute(f'{sql} AND rowid >= ? AND rowid < ?',
+                                    tuple(params) + (start, start + chunk_size)).rowcount
+            chunks += 1
+            if chunks % 100 == 0:
+                self.log(f'    {table}: {updated:,} rows in {chunks} chunks, {time.perf_counter() - began:.1f}s')
+            time.sleep(MIGRATION_CHUNK_SLEEP)
+        self.log(f'    {table}: {updated:,} rows backfilled in {chunks} chunks, {time.perf_counter() - began:.2f}s')
+        return updated
+
+def _apply(db, migration, dry_run, log):
+    """Run one migration; returns its duration"""
+    began = time.perf_counter()
+    if migration.path.endswith('.sql'):
+        with open(migration.path) as f:
+            script = f.read()
+        if dry_run:
+            log(f'    would run {migration.path} in one transaction')
+            return 0.0
+        # executescript runs the statements inside the transaction begun here
+        try:
+            db.executescript(f'BEGIN IMMEDIATE;\n{script}\n;')
+        except BaseException:
+            if db.in_transaction:
+                db.execute('ROLLBACK')
+            raise
+    else:
+        module = _load(migration)
+        if module.__doc__:
+            log(f'    {module.__doc__.strip().splitlines()[0]}')
+        transactional = getattr(module, 'TRANSACTIONAL', True)
+        if transactional and not dry_run:
+            db.execute('BEGIN IMMEDIATE')
+        try:
+            module.upgrade(Migration(db, transactional, dry_run, log))
+        except BaseException:
+            if transactional and not dry_run:
+                db.execute('ROLLBACK')
+            raise
+        if dry_run:
+            return 0.0
+        if not transactional:
+            db.execute('BEGIN IMMEDIATE')
+
+    duration = round(time.perf_counter() - began, 3)
+    try:
+        db.execute('INSERT INTO schema_version (version, name, duration_seconds) VALUES (?, ?, ?)',
+                   (migration.version, migration.name, duration))
+        db.execute('COMMIT')
+    except BaseException:
+        db.execute('ROLLBACK')
+        raise
+    return duration
+
+def _connect_read_only(path):
+    """Open a database without writing to it; a missing file reads as an empty database"""
+    if not os.path.exists(path):
+        return sqlite3.connect(':memory:', isolation_level=None)
+    uri = f'file:{urllib.parse.quote(os.path.abspath(path))}?mode=ro'
+    return sqlite3.connect(uri, uri=True, timeout=database.BUSY_TIMEOUT, isolation_level=None)
+
+class _Lock:
+    """Exclusive lock file beside the database, so only one process migrates at a time"""
+
+    def __init__(self, path):
+        self.path = path + '.migrate.lock'
+        self.file = None
+
+    def __enter__(self):
+        if FCNTL_AVAILABLE:
+            self.file = open(self.path, 'w')
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+
+def upgrade(path=None, dry_run=False, directory=None, log=logger.info):
+    """Apply every pending migration in order; returns [(migration, seconds)]
+
+    A dry run opens the database read-only and reports the baseline
+    schema objects it would create before the migrations.
+    """
+    path = path or database.DATABASE_PATH
+    if dry_run:
+        db = _connect_read_only(path)
+        try:
+            missing = database.missing_schema(db)
+            for kind, name in missing:
+                log(f'Would create {kind} {name} from the baseline schema')
+            return _run(db, pending(db, directory), True, log, baseline_missing=bool(missing))
+        finally:
+            db.close()
+
+    with _Lock(path):
+        db = sqlite3.connect(path, timeout=database.BUSY_TIMEOUT, isolation_level=None)
+        try:
+            db.execute(f'PRAGMA cache_size = -{MIGRATION_CACHE_KB}')
+            if not database._table_exists(db, 'schema_version'):
+                # Migrations build on the baseline schema
+                database.apply_schema(db)
+            # Pending is read under the lock, so a process that waited sees what the other applied
+            return _run(db, pending(db, directory), False, log)
+        finally:
+            db.close()
+
+def _run(db, todo, dry_run, log, baseline_missing=False):
+    results = []
+    for migration in todo:
+        log(f'{"Checking" if dry_run else "Applying"} migration {migration!r}')
+        try:
+            duration = _apply(db, migration, dry_run, log)
+        except sqlite3.OperationalError as e:
+            if not baseline_missing:
+                raise MigrationError(f'Migration {migration!r} failed: {e}') from e
+            # Its tables only exist once the baseline schema has been applied
+            log(f'    would run after the baseline schema ({e})')
+            duration = 0.0
+        except sqlite3.Error as e:
+            raise MigrationError(f'Migration {migration!r} failed: {e}') from e
+        if not dry_run:
+            log(f'Applied migration {migration!r} in {duration:.2f}s')
+        results.append((migration, duration))
+    return results
+
+def status(path=None, directory=None):
+    """(version, name, applied_at or None, duration) for every known migration"""
+    db = _connect_read_only(path or database.DATABASE_PATH)
+    try:
+        applied = {}
+        if database._table_exists(db, 'schema_version'):
+            applied = {row[0]: row for row in db.execute(
+                'SELECT version, name, applied_at, duration_seconds FROM schema_version')}
+    finally:
+        db.close()
+    rows = [applied.get(m.version, (m.version, m.name, None, None)) for m in discover(directory)]
+    known = {m.version for m in discover(directory)}
+    # Versions recorded by a newer release whose files are missing here
+    rows += [row for version, row in applied.items() if version not in known]
+    return sorted(rows)
+
+def main(argv=None):
+    parser = cli.parser(__doc__, 'database to migrate')
+    parser.add_argument('--dry-run', action='store_true', help='show pending migrations and what they would do')
+    parser.add_argument('--status', action='store_true', help='list migrations and when they were applied')
+    args = cli.parse(parser, argv)
+
+    # With PROPERTIES set, the group database and every property database
+    for code, path in database.database_paths():
+        if database.PROPERTIES:
+            print(f'== {code or "group"} ({os.path.basename(path)})')
+        _migrate(path, args)
+
+def _migrate(path, args):
+    if args.status:
+        db = _connect_read_only(path)
+        try:
+            missing = database.missing_schema(db)
+        finally:
+            db.close()
+        if missing:
+            print(f'Baseline schema: {len(missing)} object(s) to create: '
+                  + ', '.join(f'{kind} {name}' for kind, name in missing))
+        for version, name, applied_at, duration in status(path):
+            when = f'applied {applied_at} in {duration:.2f}s' if applied_at else 'pending'
+            print(f'{version:03d}_{name:<40} {when}')
+        return
+
+    if not args.dry_run:
+        # The baseline schema first, exactly as on startup
+        db = sqlite3.connect(path)
+        database.apply_schema(db)
+        db.close()
+
+    began = time.perf_counter()
+    try:
+        results = upgrade(path, dry_run=args.dry_run, log=print)
+    except MigrationError as e:
+        sys.exit(str(e))
+    if not results:
+        print('No pending migrations')
+    elif not args.dry_run:
+        print(f'{len(results)} migration(s) applied in {time.perf_counter() - began:.2f}s')
+
+if __name__ == '__main__':
+    main()
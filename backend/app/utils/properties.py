@@ -0,0 +1,106 @@
+"""Group-level queries over per-property databases
+
+With PROPERTIES set, each property's rooms, stays and sales are in a
+database of their own (app.utils.database). A report for the whole group
+runs its per-property part once per property on a small thread pool,
+each call inside its own app context with that property selected, and
+merges the partial aggregates: sums per employee, say, are added up
+across properties. Queries that need a single property, or run where
+one is selected, call the function once inline, so without PROPERTIES
+nothing changes.
+
+Accounts live in the group database. Each property database keeps a
+mirror of ``users`` so its queries can join employee names;
+``sync_users()`` brings the mirrors up to date after every account
+change and at startup.
+
+Settings (environment):
+    FANOUT_WORKERS   threads querying property databases in parallel (4)
+"""
+import copy
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app, jsonify
+from app.utils import database, metrics
+from app.utils.server import Lazy
+
+FANOUT_WORKERS = int(os.environ.get('FANOUT_WORKERS', 4))
+
+_executor = Lazy(lambda: ThreadPoolExecutor(max_workers=FANOUT_WORKERS, thread_name_prefix='fanout'))
+
+def _call(app, code, stats, func, args, kwargs):
+    # stats: the request's metrics counters, so its queries on this thread still count
+    with app.app_context(), database.use_property(code), metrics.counted_in(stats):
+        return func(*args, **kwargs)
+
+def group_scope():
+    """Whether the current code runs for the whole group rather than one property"""
+    return bool(database.PROPERTIES) and database.current_property() is None
+
+def fan_out(func, *args, **kwargs):
+    """Run func for the current property, or for every property in group scope
+
+    Returns {property code: result}; the code is None without PROPERTIES.
+    """
+    if not group_scope():
+        return {database.current_property(): func(*args, **kwargs)}
+    app = current_app._get_current_object()
+    stats = metrics.request_stats()
+    futures = {code: _executor.get().submit(_call, app, code, stats, func, args, kwargs)
+               for code in database.PROPERTIES}
+    return {code: future.result() for code, future in futures.items()}
+
+def merge(partials, key, totals):
+    """Combine per-property lists of records, adding up totals for rows with the same key
+
+    The first row seen for a key supplies the other fields.
+    """
+    merged = {}
+    for rows in partials:
+        for row in rows:
+            current = merged.get(getattr(row, key))
+            if current is None:
+                merged[getattr(row, key)] = copy.copy(row)
+                continue
+            for field in totals:
+                setattr(current, field, (getattr(current, field) or 0) + (getattr(row, field) or 0))
+    return list(merged.values())
+
+def _user_columns(db):
+    return [row[1] for row in db.execute('PRAGMA group_db.table_info(users)')]
+
+def sync_users():
+    """Copy accounts from the group database into every property database"""
+    for code in database.PROPERTIES:
+        db = sqlite3.connect(database.property_path(code), timeout=database.BUSY_TIMEOUT, isolation_level=None)
+        try:
+            db.execute('ATTACH DATABASE ? AS group_db', (database.DATABASE_PATH,))
+            columns = _user_columns(db)
+            names = ', '.join(columns)
+            updates = ', '.join(f'{column} = excluded.{column}' for column in columns if column != 'user_id')
+            changed = ' OR '.join(f'users.{column} IS NOT excluded.{column}'
+                                  for column in columns if column != 'user_id')
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                # Only rows that differ are written, so an idle sync costs no page writes
+                db.execute(f'''
+                    INSERT INTO main.users ({names}) SELECT {names} FROM group_db.users WHERE true
+                    ON CONFLICT(user_id) DO UPDATE SET {updates} WHERE {changed}
+                ''')
+                db.execute('DELETE FROM main.users WHERE user_id NOT IN (SELECT user_id FROM group_db.users)')
+                db.execute('COMMIT')
+            except BaseException:
+                db.execute('ROLLBACK')
+                raise
+        finally:
+            db.close()
+
+def _property_required(error):
+    return jsonify({'success': False, 'error': str(error)}), 400
+
+def init_properties(app):
+    """Answer requests without a usable property with 400 and refresh the account mirrors"""
+    app.register_error_handler(database.PropertyError, _property_required)
+    if database.PROPERTIES:
+        sync_users()
@@ -0,0 +1,88 @@
+"""Typed, slot-based records for query results
+
+Each query declares the record type it returns: field names, types and,
+where the field is not a plain column, the SQL expression behind it.
+The SELECT list is generated from that declaration, so callers read
+fields by name instead of depending on the column order of ``SELECT *``,
+and the cursor builds each row straight into a ``__slots__`` instance.
+
+Records are dataclasses, so the JSON provider (app.utils.serialization)
+writes them out as objects keyed by field name, in declaration order.
+
+``project(fields)`` narrows a record type to some of its fields, for
+sparse fieldsets (``?fields=room_id,status``): only those columns are
+selected.
+"""
+from dataclasses import make_dataclass
+
+class UnknownFieldError(ValueError):
+    """Requested fields that the record type does not declare"""
+
+    def __init__(self, unknown, allowed):
+        self.unknown = unknown
+        self.allowed = allowed
+        super().__init__(f"Unknown field(s): {', '.join(unknown)}. Allowed: {', '.join(allowed)}")
+
+def record(name, columns):
+    """Declare a record type
+
+    columns: (field, type) or (field, type, sql expression) tuples, in
+    the order they are selected. The type gets ``COLUMNS``, the SELECT
+    list for the declaration, and ``row_factory`` for sqlite3 cursors.
+    """
+    fields = tuple(column[0] for column in columns)
+    select = []
+    for column in columns:
+        expression = column[2] if len(column) > 2 else column[0]
+        select.append(expression if expression == column[0] else f'{expression} AS {column[0]}')
+
+    cls = make_dataclass(name, [column[:2] for column in columns],
+                         namespace={'__slots__': fields}, eq=False)
+    cls.FIELDS = fields
+    cls.COLUMNS = ', '.join(select)
+    cls.row_factory = staticmethod(lambda cursor, row: cls(*row))
+    cls.to_dict = lambda self: {field: getattr(self, field) for field in fields}
+    cls.project = classmethod(_project)
+    cls._declaration = tuple(columns)
+    cls._projections = {}
+    return cls
+
+def _project(cls, fields):
+    """Record type with only the given fields (in declaration order)
+
+    None or no fields means all of them. Projections are cached per set
+    of fields; raises UnknownFieldError for fields not declared.
+    """
+    if not fields:
+        return cls
+    key = frozenset(fields)
+    projected = cls._projections.get(key)
+    if projected is None:
+        unknown = sorted(key.difference(cls.FIELDS))
+        if unknown:
+            raise UnknownFieldError(unknown, cls.FIELDS)
+        if len(key) == len(cls.FIELDS):
+            return cls
+        projected = record(cls.__name__, [column for column in cls._declaration if column[0] in key])
+        cls._projections[key] = projected
+    return projected
+
+def split_fields(text):
+    """Field names from a comma-separated ?fields= value, or None for all"""
+    if not text:
+        return None
+    return [field.strip() for field in text.split(',') if field.strip()] or None
+
+def fetch_all(db, record_type, sql, params=()):
+    """Run a query and return its rows as record_type instances"""
+    cursor = db.cursor()
+    cursor.row_factory = record_type.row_factory
+    cursor.execute(sql, params)
+    return cursor.fetchall()
+
+def fetch_one(db, record_type, sql, params=()):
+    """Run a query and return the first row as a record_type instance, or None"""
+    cursor = db.cursor()
+    cursor.row_factory = record_type.row_factory
+    cursor.execute(sql, params)
+    return cursor.fetchone()
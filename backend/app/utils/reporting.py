@@ -0,0 +1,251 @@
+"""Report engine for period breakdowns, comparisons and employee performance
+
+Period views are assembled in Python from a single grouped scan of the
+``daily_sales_summary`` rollup, so adding quarters or extra comparison
+years never costs another query. Performance figures (rolling averages,
+deltas and ranks) are computed inside SQLite with window functions.
+
+In group scope (app.utils.properties) the monthly totals of every
+property are added up before growth is computed. Ranks depend on every
+employee's merged figures, so performance then reads the plain daily
+summaries of each property and computes the same figures in Python.
+"""
+from datetime import date, timedelta
+from app.models.sales import Sales
+from app.utils import properties
+
+# Days covered by each named performance period, ending on the report date
+PERFORMANCE_PERIODS = {
+    'daily': 1,
+    'weekly': 7,
+    'monthly': 30,
+    'quarterly': 91,
+    'yearly': 365
+}
+
+CATEGORIES = ['room', 'food', 'beverage', 'services', 'other']
+
+def _empty_totals():
+    """Zeroed totals for one period"""
+    totals = {'total_sales': 0.0, 'transactions': 0}
+    totals['categories'] = {category: 0.0 for category in CATEGORIES}
+    return totals
+
+def _add(target, source):
+    """Accumulate one period's totals into another"""
+    target['total_sales'] += source['total_sales']
+    target['transactions'] += source['transactions']
+    for category in CATEGORIES:
+        target['categories'][category] += source['categories'][category]
+
+def _rounded(totals):
+    """Round money values for the response"""
+    return {
+        'total_sales': round(totals['total_sales'], 2),
+        'transactions': int(totals['transactions']),
+        'categories': {k: round(v, 2) for k, v in totals['categories'].items()}
+    }
+
+def growth_pct(current, previous):
+    """Percentage change, or None when there is no base to compare with"""
+    if not previous:
+        return None
+    return round((current - previous) / previous * 100, 2)
+
+def _growth(current, previous):
+    """Growth of a period's total and of each category"""
+    return {
+        'total_sales': growth_pct(current['total_sales'], previous['total_sales']),
+        'transactions': growth_pct(current['transactions'], previous['transactions']),
+        'categories': {
+            category: growth_pct(current['categories'][category], previous['categories'][category])
+            for category in CATEGORIES
+        }
+    }
+
+def build_period_report(years):
+    """Yearly, quarterly and monthly breakdowns plus year-over-year growth
+    
+    Returns a dict with a ``years`` mapping (year -> totals, categories,
+    quarterly and monthly breakdowns) and a ``comparisons`` list comparing
+    each requested year with the previous requested year.
+    """
+    years = sorted(set(years))
+    months = {(year, month): _empty_totals() for year in years for month in range(1, 13)}
+    
+    # One partial per property in group scope, added up month by month
+    for rows in properties.fan_out(Sales.get_monthly_totals, years).values():
+        for row in rows:
+            year, month, total, room, food, beverage, services, transactions = row
+            _add(months[(year, month)], {
+                'total_sales': total,
+                'transactions': transactions,
+                'categories': {
+                    'room': room,
+                    'food': food,
+                    'beverage': beverage,
+                    'services': services,
+                    'other': total - room - food - beverage - services
+                }
+            })
+    
+    report = {}
+    for year in years:
+        yearly = _empty_totals()
+        quarters = [_empty_totals() for _ in range(4)]
+        for month in range(1, 13):
+            _add(yearly, months[(year, month)])
+            _add(quarters[(month - 1) // 3], months[(year, month)])
+        report[year] = {
+            'totals': yearly,
+            'quarterly': quarters,
+            'monthly': [months[(year, month)] for month in range(1, 13)]
+        }
+    
+    comparisons = []
+    for previous, current in zip(years, years[1:]):
+        cur, prev = report[current], report[previous]
+        comparisons.append({
+            'year': current,
+            'compared_to': previous,
+            'totals': _growth(cur['totals'], prev['totals']),
+            'quarterly': [{'quarter': idx + 1, **_growth(c, p)}
+                          for idx, (c, p) in enumerate(zip(cur['quarterly'], prev['quarterly']))],
+            'monthly': [{'month': idx + 1, **_growth(c, p)}
+                        for idx, (c, p) in enumerate(zip(cur['monthly'], prev['monthly']))]
+        })
+    
+    return {
+        'years': {
+            year: {
+                **_rounded(data['totals']),
+                'quarterly': [{'quarter': idx + 1, **_rounded(q)} for idx, q in enumerate(data['quarterly'])],
+                'monthly': [{'month': idx + 1, **_rounded(m)} for idx, m in enumerate(data['monthly'])]
+            }
+            for year, data in report.items()
+        },
+        'comparisons': comparisons
+    }
+
+def period_range(period, date_from=None, date_to=None):
+    """Resolve a named period or explicit dates to (start, end) ISO dates
+    
+    Raises ValueError for unknown periods or malformed dates.
+    """
+    end = date.fromisoformat(date_to) if date_to else date.today()
+    if date_from:
+        start = date.fromisoformat(date_from)
+    elif period in PERFORMANCE_PERIODS:
+        start = end - timedelta(days=PERFORMANCE_PERIODS[period] - 1)
+    else:
+        raise ValueError(f'Unknown period: {period}')
+    
+    if start > end:
+        raise ValueError('Start date is after end date')
+    return start.isoformat(), end.isoformat()
+
+def build_performance_report(start_date, end_date, employee_id=None):
+    """Per-employee performance for a date range
+    
+    Returns one entry per employee (only the given one when employee_id is
+    set) with period totals, rank among all peers and a daily series of
+    sales, rolling 7/30-day averages, day-over-day change and daily rank.
+    """
+    days = (date.fromisoformat(end_date) - date.fromisoformat(start_date)).days + 1
+    
+    if properties.group_scope():
+        series_rows, total_rows = _group_performance(start_date, end_date, employee_id)
+    else:
+        series_rows = Sales.get_performance_series(start_date, end_date, employee_id)
+        total_rows = Sales.get_performance_totals(start_date, end_date, employee_id)
+    
+    series = {}
+    for row in series_rows:
+        series.setdefault(row[0], []).append({
+            'date': row[1],
+            'total_sales': row[2],
+            'room_sales': row[3],
+            'food_sales': row[4],
+            'beverage_sales': row[5],
+            'service_sales': row[6],
+            'transactions': row[7],
+            'avg_7d': round(row[8], 2),
+            'avg_30d': round(row[9], 2),
+            'day_over_day': round(row[10], 2),
+            'daily_rank': row[11],
+            'peers': row[12]
+        })
+    
+    return [{
+        'employee_id': row[0],
+        'employee_name': row[1],
+        'total_sales': round(row[2], 2),
+        'transactions': row[3],
+        'active_days': row[4],
+        'avg_daily_sales': round(row[2] / days, 2),
+        'rank': row[5],
+        'peers': row[6],
+        'daily_performance': series.get(row[0], [])
+    } for row in total_rows]
+
+def _rank(value, values):
+    """SQL RANK() of value among values, highest first"""
+    return 1 + sum(1 for other in values if other > value)
+
+def _group_performance(start_date, end_date, employee_id=None):
+    """Rows shaped like Sales.get_performance_series and get_performance_totals, for the whole group
+    
+    Each employee's daily summaries are added up across properties first,
+    so rolling averages and ranks cover everything an employee sold.
+    """
+    window_start = (date.fromisoformat(start_date) - timedelta(days=29)).isoformat()
+    fields = ('total_sales', 'room_sales', 'food_sales', 'beverage_sales', 'service_sales', 'transaction_count')
+    
+    merged = {}
+    for rows in properties.fan_out(Sales.get_daily_summaries, window_start, end_date).values():
+        for row in rows:
+            key = (row.employee_id, row.sale_date)
+            if key in merged:
+                for field in fields:
+                    merged[key][field] += getattr(row, field) or 0
+            else:
+                merged[key] = {'employee_name': row.employee_name,
+                               **{field: getattr(row, field) or 0 for field in fields}}
+    
+    by_day = {}
+    by_date = {}
+    for (employee, sale_date), day in merged.items():
+        by_day.setdefault(employee, {})[date.fromisoformat(sale_date).toordinal()] = day['total_sales']
+        by_date.setdefault(sale_date, []).append(day['total_sales'])
+    
+    # Same windows as get_performance_series: calendar days, missing days count as zero
+    series_rows = []
+    for (employee, sale_date), day in sorted(merged.items()):
+        if sale_date < start_date or (employee_id and employee != employee_id):
+            continue
+        totals = by_day[employee]
+        ordinal = date.fromisoformat(sale_date).toordinal()
+        window = [totals.get(ordinal - offset, 0) for offset in range(30)]
+        series_rows.append((
+            employee, sale_date, *(day[field] for field in fields),
+            sum(window[:7]) / 7.0, sum(window) / 30.0, window[0] - window[1],
+            _rank(day['total_sales'], by_date[sale_date]), len(by_date[sale_date])
+        ))
+    
+    period = {}
+    for (employee, sale_date), day in merged.items():
+        if sale_date < start_date or day['employee_name'] is None:
+            continue
+        entry = period.setdefault(employee, [day['employee_name'], 0.0, 0, 0])
+        entry[1] += day['total_sales']
+        entry[2] += day['transaction_count']
+        entry[3] += 1
+    
+    sums = [entry[1] for entry in period.values()]
+    total_rows = sorted(
+        ((employee, name, total, transactions, active_days, _rank(total, sums), len(sums))
+         for employee, (name, total, transactions, active_days) in period.items()
+         if not employee_id or employee == employee_id),
+        key=lambda row: (row[5], row[0])
+    )
+    return series_rows, total_rows
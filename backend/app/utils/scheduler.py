@@ -0,0 +1,367 @@
+"""
+In-process scheduler for periodic jobs
+
+Jobs are registered with a cron-style schedule (minute hour day month
+weekday; ``*``, ``*/n``, ``a-b``, ``a-b/n`` and comma lists) and run on a
+background thread in every server process. Each run of a job belongs to
+a slot, the minute it was scheduled for. Before running, a process takes
+the job's lease row in ``job_leases``; the conditional upsert only
+succeeds for a slot newer than the last one taken and once any previous
+lease has expired, so across all workers (and hosts sharing the
+database) each slot runs once and runs of the same job never overlap.
+A run that dies holding its lease blocks the job until ``lease_seconds``
+have passed. Slots missed while no process was running are skipped, not
+caught up.
+
+With PROPERTIES set, a job's scope says which databases it runs on:
+``group`` (the group database), ``properties`` (each property database in
+turn) or ``all`` (both). Every property has its own lease row,
+``<job>@<property>``, so the properties of one job are run independently.
+Lease and run tables always live in the group database.
+
+Every run is kept in ``job_runs`` (the newest SCHEDULER_HISTORY per job)
+and the lease row carries cumulative run and failure counts and the last
+duration, which /metrics reports.
+
+The scheduler starts with the first request a process serves, so forked
+server workers each start their own after fork (reset() runs in
+``_init_worker``) and one-off scripts that import the app never run jobs.
+
+Settings (environment):
+    SCHEDULER_ENABLED     0 to run no jobs in this process (default on)
+    SCHEDULER_HISTORY     runs kept per job in job_runs (100)
+    SCHEDULE_<JOB>        override a job's schedule, or "off" to disable it,
+                          e.g. SCHEDULE_BACKUP="0 3 * * *"
+
+Usage (from the backend directory):
+    python -m app.utils.scheduler --list
+    python -m app.utils.scheduler --history backup
+    python -m app.utils.scheduler --run rollups
+"""
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+import traceback
+from datetime import datetime, timedelta
+from app.utils import cli, database
+from app.utils.server import lazy_thread
+
+SCHEDULER_HISTORY = int(os.environ.get('SCHEDULER_HISTORY', 100))
+
+logger = logging.getLogger('app.scheduler')
+
+class CronSchedule:
+    """Five-field cron expression evaluated in local time"""
+
+    FIELDS = (('minute', 0, 59), ('hour', 0, 23), ('day', 1, 31), ('month', 1, 12), ('weekday', 0, 7))
+
+    def __init__(self, expression):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f'Cron expression needs 5 fields: {expression!r}')
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, self.weekdays = (
+            self._parse(part, low, high, name) for part, (name, low, high) in zip(parts, self.FIELDS)
+        )
+        # Cron matches either day field when both are restricted
+        self.any_day = parts[2] == '*'
+        self.any_weekday = parts[4] == '*'
+
+    @staticmethod
+    def _parse(part, low, high, name):
+        values = set()
+        for item in part.split(','):
+            spec, _, step = item.partition('/')
+            if spec == '*':
+                first, last = low, high
+            elif '-' in spec:
+                first, last = (int(value) for value in spec.split('-', 1))
+            else:
+                first = last = int(spec)
+            if not (low <= first <= high and low <= last <= high) or first > last:
+                raise ValueError(f'{name} out of range in cron field {part!r}')
+            values.update(range(first, last + 1, int(step) if step else 1))
+        if name == 'weekday' and 7 in values:
+            # Sunday may be written 0 or 7
+            values = (values - {7}) | {0}
+        return frozenset(values)
+
+    def _day_matches(self, moment):
+        day = moment.day in self.days
+        weekday = (moment.isoweekday() % 7) in self.weekdays
+        if self.any_day or self.any_weekday:
+            return day and weekday
+        return day or weekday
+
+    def next_after(self, moment):
+        """First matching minute strictly after moment"""
+        moment = moment.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Four years covers every satisfiable day/month combination (e.g. Feb 29)
+        limit = moment + timedelta(days=366 * 4 + 1)
+        while moment < limit:
+            if moment.month not in self.months:
+                moment = (moment.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(moment):
+                moment = moment.replace(hour=0, minute=0) + timedelta(days=1)
+            elif moment.hour not in self.hours:
+                moment = moment.replace(minute=0) + timedelta(hours=1)
+            elif moment.minute not in self.minutes:
+                moment += timedelta(minutes=1)
+            else:
+                return moment
+        raise ValueError(f'Cron expression never matches: {self.expression!r}')
+
+class Job:
+    __slots__ = ('name', 'schedule', 'func', 'lease_seconds', 'scope')
+
+    SCOPES = ('group', 'properties', 'all')
+
+    def __init__(self, name, schedule, func, lease_seconds, scope):
+        if scope not in self.SCOPES:
+            raise ValueError(f'Unknown job scope {scope!r}')
+        self.name = name
+        self.schedule = schedule
+        self.func = func
+        self.lease_seconds = lease_seconds
+        self.scope = scope
+
+    def targets(self):
+        """Property codes to run for, None standing for the group database"""
+        if not database.PROPERTIES or self.scope == 'group':
+            return [None]
+        return ([None] if self.scope == 'all' else []) + list(database.PROPERTIES)
+
+    def lease(self, code):
+        return self.name if code is None else f'{self.name}@{code}'
+
+# name -> Job, in registration order
+_jobs = {}
+_app = None
+_stop = threading.Event()
+
+def register_job(name, schedule, func, lease_seconds=600, scope='group'):
+    """Run func() on a cron schedule; SCHEDULE_<NAME> overrides it, "off" disables it
+
+    func runs inside an app context, with the database of the property it
+    runs for selected (see scope). lease_seconds should comfortably
+    exceed its longest run: another process may start the job once the
+    lease has expired.
+    """
+    schedule = os.environ.get(f'SCHEDULE_{name.upper()}', schedule)
+    if schedule.strip().lower() == 'off':
+        _jobs.pop(name, None)
+        return None
+    job = _jobs[name] = Job(name, CronSchedule(schedule), func, lease_seconds, scope)
+    return job
+
+def jobs():
+    return list(_jobs.values())
+
+def _owner():
+    return f'{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}'
+
+def _acquire(db, job, lease, slot, owner):
+    now = time.time()
+    cursor = db.execute('''
+        INSERT INTO job_leases (job_name, owner, slot, expires_at)
+        VALUES (?, ?, ?, ?)
+        ON CONFLICT(job_name) DO UPDATE SET
+            owner = excluded.owner, slot = excluded.slot, expires_at = excluded.expires_at
+        WHERE job_leases.slot < excluded.slot AND job_leases.expires_at <= ?
+    ''', (lease, owner, slot, now + job.lease_seconds, now))
+    db.commit()
+    return cursor.rowcount == 1
+
+def _finish(db, lease, owner, started, duration, error):
+    status = 'Failed' if error else 'Completed'
+    db.execute('''
+        INSERT INTO job_runs (job_name, owner, started_at, duration_seconds, status, error)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', (lease, owner, started, duration, status, error))
+    db.execute('''
+        DELETE FROM job_runs WHERE job_name = ? AND run_id <= (
+            SELECT run_id FROM job_runs WHERE job_name = ? ORDER BY run_id DESC LIMIT 1 OFFSET ?
+        )
+    ''', (lease, lease, SCHEDULER_HISTORY))
+    db.execute('''
+        UPDATE job_leases SET
+            expires_at = 0, runs = runs + 1, failures = failures + ?, last_duration = ?,
+            last_success_at = CASE WHEN ? THEN ? ELSE last_success_at END
+        WHERE job_name = ? AND owner = ?
+    ''', (1 if error else 0, duration, error is None, started, lease, owner))
+    db.commit()
+
+def run_job(job, slot=None, code=None):
+    """Run a job now for a property (None: the group database) if its lease
+    for slot can be taken; returns the run status or None"""
+    slot = slot if slot is not None else time.time()
+    owner = _owner()
+    lease = job.lease(code)
+    db = database.connect_group_db()
+    try:
+        if not _acquire(db, job, lease, slot, owner):
+            return None
+        started = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+        began = time.perf_counter()
+        error = None
+        try:
+            with database.use_property(code):
+                if _app is not None:
+                    with _app.app_context():
+                        job.func()
+                else:
+                    job.func()
+        except Exception:
+            error = traceback.format_exc(limit=5)
+            logger.exception('Job %s failed', lease)
+        duration = time.perf_counter() - began
+        _finish(db, lease, owner, started, round(duration, 3), error)
+        logger.info('Job %s %s in %.2fs', lease, 'failed' if error else 'completed', duration)
+        return 'Failed' if error else 'Completed'
+    finally:
+        db.close()
+
+def _run():
+    due = {job.name: job.schedule.next_after(datetime.now()) for job in jobs()}
+    while not _stop.is_set():
+        if not due:
+            return
+        wait = (min(due.values()) - datetime.now()).total_seconds()
+        if wait > 0:
+            _stop.wait(min(wait, 60))
+            continue
+        now = datetime.now()
+        for job in jobs():
+            if due.get(job.name, now) > now:
+                continue
+            for code in job.targets():
+                try:
+                    run_job(job, slot=due[job.name].timestamp(), code=code)
+                except Exception:
+                    # Lease bookkeeping failed (e.g. database locked); the next slot retries
+                    logger.exception('Could not run job %s', job.lease(code))
+            due[job.name] = job.schedule.next_after(max(datetime.now(), due[job.name]))
+
+def _reset():
+    global _stop
+    _stop = threading.Event()
+
+_scheduler = lazy_thread(_run, 'scheduler', on_reset=_reset)
+
+def stop(timeout=None):
+    """Stop scheduling and wait up to timeout seconds for a running job"""
+    _stop.set()
+    if _scheduler.current is not None:
+        _scheduler.current.join(timeout)
+
+def history(job_name=None, limit=20):
+    """Newest runs first, optionally for one job (all of its properties)"""
+    db = database.connect_group_db()
+    try:
+        where, params = ('', [])
+        if job_name:
+            where, params = "WHERE job_name = ? OR job_name GLOB ? || '@*'", [job_name, job_name]
+        return [dict(row) for row in db.execute(f'''
+            SELECT run_id, job_name, owner, started_at, duration_seconds, status, error
+            FROM job_runs {where} ORDER BY run_id DESC LIMIT ?
+        ''', params + [limit])]
+    finally:
+        db.close()
+
+def metric_lines():
+    """Prometheus lines for every job that has run"""
+    db = database.connect_group_db()
+    try:
+        rows = db.execute('''
+            SELECT job_name, runs, failures, last_duration, CAST(strftime('%s', last_success_at) AS INTEGER)
+            FROM job_leases ORDER BY job_name
+        ''').fetchall()
+    finally:
+        db.close()
+    lines = []
+    for name, help_text, kind, idx in (
+        ('scheduler_job_runs_total', 'Job runs across all processes', 'counter', 1),
+        ('scheduler_job_failures_total', 'Job runs that raised', 'counter', 2),
+        ('scheduler_job_last_duration_seconds', 'Duration of the latest run', 'gauge', 3),
+        ('scheduler_job_last_success_timestamp_seconds', 'Start of the latest successful run', 'gauge', 4),
+    ):
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} {kind}']
+        lines += [f'{name}{{job="{row[0]}"}} {row[idx]}' for row in rows if row[idx] is not None]
+    return lines
+
+def _register_default_jobs():
+    from app.utils import analytics, backup, changes, maintenance
+    from app.models.sales import Sales
+
+    def rollups():
+        today = datetime.now().date()
+        # Yesterday too, so sales recorded late in the day are settled after midnight
+        Sales.rebuild_daily_summaries((today - timedelta(days=1)).isoformat(), today.isoformat())
+        previous = today.replace(day=1) - timedelta(days=1)
+        for moment in (previous, today):
+            Sales.rebuild_monthly_summary(moment.year, moment.month)
+
+    def end_of_day():
+        database.generate_occupancy_report()
+        rollups()
+
+    register_job('occupancy_snapshot', '*/15 * * * *', database.generate_occupancy_report, scope='properties')
+    register_job('rollups', '5 * * * *', rollups, scope='properties')
+    register_job('end_of_day', '55 23 * * *', end_of_day, scope='properties')
+    register_job('backup', '0 2 * * *', backup.run_backup, lease_seconds=6 * 3600)
+    register_job('maintenance', '30 3 * * *', maintenance.run_maintenance, lease_seconds=3600, scope='all')
+    register_job('analyze', '0 4 * * 0', maintenance.analyze, lease_seconds=3600, scope='all')
+    register_job('wal_checkpoint', '*/5 * * * *', maintenance.checkpoint, scope='all')
+    register_job('changes_prune', '*/10 * * * *', changes.prune, scope='all')
+    if analytics.ANALYTICS_REPLICA:
+        register_job('analytics_refresh', '* * * * *', analytics.refresh, scope='properties')
+
+def init_scheduler(app):
+    """Register the built-in jobs and start them with the first request"""
+    global _app
+    _app = app
+    _register_default_jobs()
+    if app.config.get('METRICS_ENABLED'):
+        from app.utils import metrics
+        metrics.register_collector(metric_lines)
+    if app.config.get('SCHEDULER_ENABLED'):
+        app.before_request(_scheduler.start)
+
+def main(argv=None):
+    parser = cli.parser(__doc__, 'database holding the job tables')
+    parser.add_argument('--list', action='store_true', help='list jobs, schedules and next run times')
+    parser.add_argument('--history', nargs='?', const='', metavar='JOB', help='show recent runs (of one job)')
+    parser.add_argument('--run', metavar='JOB', help='run a job now, unless another process holds its lease')
+    args = cli.parse(parser, argv)
+
+    from flask import Flask
+    global _app
+    _app = Flask(__name__)
+    _app.teardown_appcontext(database.close_db)
+    _register_default_jobs()
+
+    if args.run:
+        if args.run not in _jobs:
+            sys.exit(f'Unknown job {args.run!r}; known: {", ".join(_jobs)}')
+        job = _jobs[args.run]
+        statuses = {job.lease(code): run_job(job, code=code) for code in job.targets()}
+        busy = [lease for lease, status in statuses.items() if status is None]
+        if busy:
+            sys.exit(f'{", ".join(busy)} running elsewhere (lease held)')
+        if 'Failed' in statuses.values():
+            sys.exit(1)
+    elif args.history is not None:
+        for run in history(args.history or None):
+            print(f"{run['run_id']:>6}  {run['started_at']}  {run['job_name']:<20} {run['status']:<10}"
+                  f" {run['duration_seconds']:>8.2f}s  {run['owner']}")
+    else:
+        now = datetime.now()
+        for job in jobs():
+            print(f'{job.name:<20} {job.schedule.expression:<18} {job.scope:<11}'
+                  f' next {job.schedule.next_after(now):%Y-%m-%d %H:%M}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Pluggable JSON providers for API responses
+
+``jsonify`` goes through ``app.json``. By default Flask serializes with
+the stdlib encoder and turns dataclasses into dicts with a deep copy
+(``dataclasses.asdict``). These providers avoid that for records
+(app.utils.records):
+
+    orjson   orjson encodes records natively, in C (when installed)
+    stdlib   the stdlib encoder with a shallow record-to-dict conversion
+
+``JSON_PROVIDER`` selects one (``auto`` picks orjson when available).
+Both keep Flask's handling of dates, UUIDs and ``__html__`` objects, and
+pretty-print in debug mode. Keys keep their declaration order with
+orjson; the stdlib provider sorts them as Flask does.
+
+Clients that send ``Accept: application/vnd.hotel.columnar+json`` (or
+``+msgpack``) get the columnar encoding of app.utils.columnar instead.
+"""
+from flask import has_request_context, request
+from flask.json.provider import DefaultJSONProvider
+from app.utils import columnar
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def _default(o):
+    to_dict = getattr(o, 'to_dict', None)
+    if to_dict is not None:
+        return to_dict()
+    return DefaultJSONProvider.default(o)
+
+def _offered_mimetypes(provider):
+    offered = [provider.mimetype, columnar.COLUMNAR_JSON_MIMETYPE]
+    if columnar.MSGPACK_AVAILABLE:
+        offered.append(columnar.COLUMNAR_MSGPACK_MIMETYPE)
+    return offered
+
+class NegotiatingProvider(DefaultJSONProvider):
+    """Base for the providers: plain JSON unless the client asks for columnar"""
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        mimetype = self.mimetype
+        if has_request_context() and request.accept_mimetypes:
+            mimetype = request.accept_mimetypes.best_match(_offered_mimetypes(self), self.mimetype)
+
+        if mimetype == columnar.COLUMNAR_JSON_MIMETYPE:
+            response = self._app.response_class(self.dumps(columnar.to_columnar(obj)), mimetype=mimetype)
+        elif mimetype == columnar.COLUMNAR_MSGPACK_MIMETYPE:
+            response = self._app.response_class(columnar.packb(columnar.to_columnar(obj), default=_default),
+                                                mimetype=mimetype)
+        else:
+            response = self.json_response(obj)
+        response.vary.add('Accept')
+        return response
+
+    def json_response(self, obj):
+        return DefaultJSONProvider.response(self, obj)
+
+class RecordJSONProvider(NegotiatingProvider):
+    """Stdlib encoder that serializes records without a deep copy"""
+    default = staticmethod(_default)
+
+if ORJSON_AVAILABLE:
+    class OrjsonProvider(NegotiatingProvider):
+        """orjson-backed provider; falls back to Flask's rules for other types"""
+        # Dates go through Flask's default so they keep the HTTP date format
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+        def dumps(self, obj, **kwargs):
+            return orjson.dumps(obj, default=_default, option=self.option).decode('utf-8')
+
+        def loads(self, s, **kwargs):
+            return orjson.loads(s)
+
+        def json_response(self, obj):
+            option = self.option
+            if self.compact is False or (self.compact is None and self._app.debug):
+                option |= orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE
+            return self._app.response_class(orjson.dumps(obj, default=_default, option=option),
+                                            mimetype=self.mimetype)
+
+PROVIDERS = {'stdlib': RecordJSONProvider}
+if ORJSON_AVAILABLE:
+    PROVIDERS['orjson'] = OrjsonProvider
+
+def get_provider_class(name='auto'):
+    """Provider class for a JSON_PROVIDER name"""
+    if name == 'auto':
+        name = 'orjson' if ORJSON_AVAILABLE else 'stdlib'
+    if name not in PROVIDERS:
+        raise ValueError(f'Unknown or unavailable JSON provider: {name}')
+    return PROVIDERS[name]
+
+def init_json(app):
+    """Install the configured JSON provider on the app"""
+    app.json = get_provider_class(app.config['JSON_PROVIDER'])(app)
@@ -0,0 +1,327 @@
+"""Preforking multi-process WSGI server for production
+
+The master process binds the listening socket, optionally imports the
+app once (preload) and forks workers that share the socket. Each worker
+serves connections on a fixed-size thread pool. Workers are replaced
+when they exit, and after max_requests requests they retire themselves.
+
+Signals to the master:
+    TERM, INT  graceful stop: workers finish in-flight requests, then exit
+    QUIT       immediate stop
+    HUP        graceful reload: start fresh workers, then drain the old ones
+    TTIN/TTOU  one worker more / fewer
+
+Without os.fork (Windows) a single threaded worker is run instead.
+"""
+import logging
+import os
+import random
+import signal
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+logger = logging.getLogger('app.server')
+
+class RequestHandler(WSGIRequestHandler):
+    """Keep-alive HTTP/1.1 handler with optional access logging"""
+    protocol_version = 'HTTP/1.1'
+    access_log = False
+
+    def log_request(self, code='-', size='-'):
+        if self.access_log:
+            super().log_request(code, size)
+
+class PoolWSGIServer(BaseWSGIServer):
+    """Werkzeug server that handles connections on a bounded thread pool
+
+    The accept loop blocks while every thread is busy, leaving further
+    connections in the shared listen backlog for idle workers to take.
+    """
+    multithread = True
+    multiprocess = True
+
+    def __init__(self, host, port, app, threads, fd=None, handler=RequestHandler):
+        super().__init__(host, port, app, handler=handler, fd=fd)
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+        self.slots = threading.BoundedSemaphore(threads)
+
+    def process_request(self, request, client_address):
+        self.slots.acquire()
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+            self.slots.release()
+
+    def drain(self, timeout):
+        """Wait up to timeout seconds for in-flight connections to finish"""
+        self.pool.shutdown(wait=False)
+        deadline = time.monotonic() + timeout
+        for thread in list(self.pool._threads):
+            thread.join(max(0, deadline - time.monotonic()))
+
+# Every Lazy created in this process, reset in forked workers
+_lazy = []
+
+class Lazy:
+    """A background thread or pool, started on first use
+
+    Threads do not survive fork and a lock may be copied while another
+    thread holds it, so _init_worker resets every instance and each
+    worker starts its own. on_reset clears the owner's other
+    per-process state (locks, events, buffers) at the same time.
+    """
+
+    def __init__(self, start, on_reset=None):
+        self._start = start
+        self._on_reset = on_reset
+        self._lock = threading.Lock()
+        self.current = None
+        _lazy.append(self)
+
+    def get(self):
+        """The running thread or pool, started if there is none yet"""
+        current = self.current
+        if current is None:
+            with self._lock:
+                if self.current is None:
+                    self.current = self._start()
+                current = self.current
+        return current
+
+    def start(self):
+        """Start it unless it is running (usable as a before_request hook)"""
+        self.get()
+
+    def discard(self, current):
+        """Forget current (e.g. a broken pool), so the next get() starts a new one"""
+        with self._lock:
+            if self.current is current:
+                self.current = None
+
+    def reset(self):
+        """Forget what the parent process started"""
+        self._lock = threading.Lock()
+        self.current = None
+        if self._on_reset is not None:
+            self._on_reset()
+
+def lazy_thread(target, name, on_reset=None):
+    """Lazy daemon thread running target"""
+    def start():
+        thread = threading.Thread(target=target, name=name, daemon=True)
+        thread.start()
+        return thread
+    return Lazy(start, on_reset)
+
+def _init_worker():
+    """Per-process setup after fork
+
+    Database connections are per app context and none are open in the
+    master, but anything created lazily must be recreated in the child.
+    """
+    from app.utils import database
+    random.seed()
+    for lazy in _lazy:
+        lazy.reset()
+    db = database.connect_group_db()
+    try:
+        db.execute('SELECT 1').fetchone()
+    finally:
+        db.close()
+
+class PreforkServer:
+    """Master process managing a pool of forked WSGI workers
+
+    app: the WSGI app (preloaded), or a zero-argument factory called in
+    each worker after fork so that reloads pick up new code.
+    """
+
+    def __init__(self, app, host='0.0.0.0', port=5000, workers=2, threads=8, max_requests=0,
+                 max_requests_jitter=0, graceful_timeout=30, keepalive=5, access_log=False):
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.max_requests = max_requests
+        self.max_requests_jitter = max_requests_jitter
+        self.graceful_timeout = graceful_timeout
+        self.keepalive = keepalive
+        self.access_log = access_log
+        self.children = {}  # pid -> generation
+        self.generation = 0
+        self.stopping = False
+        self.sock = None
+
+    # Master
+
+    def run(self):
+        """Serve until stopped; returns the process exit status"""
+        if not hasattr(os, 'fork'):
+            logger.warning('os.fork is unavailable; running a single worker')
+            self.sock = self._bind()
+            self._serve(self._load_app())
+            return 0
+
+        self.sock = self._bind()
+        # Non-blocking accept so idle workers that lose the race for a connection don't hang
+        self.sock.setblocking(False)
+        logger.info('Listening on http://%s:%d with %d workers x %d threads (pid %d)',
+                    self.host, self.sock.getsockname()[1], self.workers, self.threads, os.getpid())
+
+        self._signal_queue = []
+        for sig in (signal.SIGTERM, signal.SIGINT, signal.SIGQUIT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, lambda signum, frame: self._signal_queue.append(signum))
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+
+        self._spawn_missing()
+        while self.children or not self.stopping:
+            self._reap()
+            while self._signal_queue:
+                self._handle_signal(self._signal_queue.pop(0))
+            if not self.stopping:
+                self._spawn_missing()
+            time.sleep(0.2)
+
+        self.sock.close()
+        logger.info('Shut down')
+        return 0
+
+    def _bind(self):
+        family = socket.AF_INET6 if ':' in self.host else socket.AF_INET
+        sock = socket.socket(family, socket.SOCK_STREAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((self.host, self.port))
+        sock.listen(2048)
+        sock.set_inheritable(True)
+        return sock
+
+    def _handle_signal(self, signum):
+        if signum in (signal.SIGTERM, signal.SIGINT):
+            logger.info('Graceful stop, draining workers')
+            self.stopping = True
+            self._kill_all(signal.SIGTERM)
+        elif signum == signal.SIGQUIT:
+            logger.info('Immediate stop')
+            self.stopping = True
+            self._kill_all(signal.SIGKILL)
+        elif signum == signal.SIGHUP:
+            logger.info('Reloading workers')
+            old = [pid for pid, generation in self.children.items() if generation == self.generation]
+            self.generation += 1
+            self._spawn_missing()
+            for pid in old:
+                self._kill(pid, signal.SIGTERM)
+        elif signum == signal.SIGTTIN:
+            self.workers += 1
+        elif signum == signal.SIGTTOU and self.workers > 1:
+            self.workers -= 1
+            current = [pid for pid, generation in self.children.items() if generation == self.generation]
+            # Right after a reload the new generation may not have started yet; _spawn_missing then starts fewer
+            if current:
+                self._kill(current[0], signal.SIGTERM)
+
+    def _spawn_missing(self):
+        current = sum(1 for generation in self.children.values() if generation == self.generation)
+        for _ in range(self.workers - current):
+            pid = os.fork()
+            if pid == 0:
+                code = 1
+                try:
+                    code = self._worker()
+                finally:
+                    os._exit(code)
+            self.children[pid] = self.generation
+
+    def _reap(self):
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            generation = self.children.pop(pid, None)
+            code = os.waitstatus_to_exitcode(status)
+            if code and not self.stopping and generation == self.generation:
+                logger.warning('Worker %d exited with status %d', pid, code)
+                # Avoid a tight respawn loop when the app cannot start
+                time.sleep(1)
+
+    def _kill(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            self.children.pop(pid, None)
+
+    def _kill_all(self, signum):
+        for pid in list(self.children):
+            self._kill(pid, signum)
+        if signum == signal.SIGTERM:
+            timer = threading.Timer(self.graceful_timeout + 1, self._kill_all, (signal.SIGKILL,))
+            timer.daemon = True
+            timer.start()
+
+    # Worker
+
+    def _load_app(self):
+        app = self.app if hasattr(self.app, 'wsgi_app') else self.app()
+        _init_worker()
+        return app
+
+    def _worker(self):
+        # Ctrl-C reaches the whole process group; only the master acts on it
+        for sig in (signal.SIGINT, signal.SIGQUIT, signal.SIGHUP, signal.SIGTTIN, signal.SIGTTOU):
+            signal.signal(sig, signal.SIG_IGN)
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        try:
+            app = self._load_app()
+        except Exception:
+            logger.exception('Worker failed to load the app')
+            return 1
+        self._serve(app)
+        return 0
+
+    def _serve(self, app):
+        limit = 0
+        if self.max_requests:
+            limit = self.max_requests + random.randint(0, self.max_requests_jitter)
+        served = [0]
+        lock = threading.Lock()
+
+        handler = type('Handler', (RequestHandler,), {'timeout': self.keepalive, 'access_log': self.access_log})
+        server = PoolWSGIServer(self.host, self.port, None, self.threads, fd=self.sock.fileno(), handler=handler)
+
+        def stop():
+            threading.Thread(target=server.shutdown, daemon=True).start()
+
+        def counted(environ, start_response):
+            if limit:
+                with lock:
+                    served[0] += 1
+                    if served[0] == limit:
+                        logger.info('Worker %d reached max requests (%d), retiring', os.getpid(), limit)
+                        stop()
+            return app(environ, start_response)
+
+        server.app = counted
+        if hasattr(signal, 'SIGTERM') and threading.current_thread() is threading.main_thread():
+            signal.signal(signal.SIGTERM, lambda signum, frame: stop())
+        try:
+            server.serve_forever()
+        finally:
+            server.drain(self.graceful_timeout)
+            # Workers leave through os._exit, which skips atexit handlers
+            from app.utils import audit, scheduler
+            scheduler.stop(self.graceful_timeout)
+            audit.shutdown()
@@ -0,0 +1,80 @@
+"""
+Benchmark streaming CSV and gzipped CSV exports straight from SQLite
+
+Builds a throwaway database with synthetic sales, then streams it through
+the same code path as GET /api/sales/export and reports rows per second.
+
+Usage (from the backend directory):
+    python benchmarks/csv_export.py
+    python benchmarks/csv_export.py --rows 1000000 --memory
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils import database
+from app.utils.export import stream_export
+from app.models.sales import Sales
+
+SCHEMA_PATH = os.path.join(os.path.dirname(__file__), '../../database/schema.sql')
+CATEGORIES = ['Room', 'Food', 'Beverage', 'Services', 'Other']
+PAYMENT_METHODS = ['Cash', 'Card', 'Mobile', 'Check', 'Online']
+
+def build_database(path, count, seed=42):
+    """Create a database holding count synthetic sales"""
+    rng = random.Random(seed)
+    db = sqlite3.connect(path)
+    with open(SCHEMA_PATH) as f:
+        db.executescript(f.read())
+    db.execute('''
+        INSERT INTO users (username, password, email, full_name, role)
+        VALUES ('bench', 'x', 'bench@hotel.com', 'Bench User', 'Employee')
+    ''')
+    db.executemany('''
+        INSERT INTO sales (employee_id, sale_date, category, amount, payment_method, description)
+        VALUES (1, ?, ?, ?, ?, ?)
+    ''', ((f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}", rng.choice(CATEGORIES),
+           round(rng.uniform(5, 500), 2), rng.choice(PAYMENT_METHODS), f"Item {idx}")
+          for idx in range(count)))
+    db.commit()
+    db.close()
+
+def run(export_format, count, memory):
+    """Stream every row once and return (seconds, bytes, peak traced bytes)"""
+    if memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    rows = Sales.iter_raw_sales('2024-01-01', '2024-12-31')
+    size = sum(len(chunk) for chunk in stream_export(rows, export_format=export_format))
+    elapsed = time.perf_counter() - start
+    peak = 0
+    if memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return elapsed, size, peak
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, default=200000)
+    parser.add_argument('--memory', action='store_true', help='trace peak Python memory (slower)')
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as tmpdir:
+        database.configure(os.path.join(tmpdir, 'bench.db'))
+        build_database(database.DATABASE_PATH, args.rows)
+        
+        print(f"{'format':<8}{'rows':>10}{'seconds':>9}{'rows/s':>11}{'MB out':>8}{'peak MB':>9}")
+        for export_format in ('csv', 'csv.gz'):
+            elapsed, size, peak = run(export_format, args.rows, args.memory)
+            print(f"{export_format:<8}{args.rows:>10}{elapsed:>9.2f}{args.rows / elapsed:>11.0f}"
+                  f"{size / 1e6:>8.1f}{(peak / 1e6 if args.memory else float('nan')):>9.1f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,598 @@
+"""
+HTTP benchmark suite for the API blueprints
+
+Boots create_app against a generated dataset (see app.utils.datagen) and
+drives every route in the auth, sales, rooms, employees, reports,
+dashboard and audit blueprints. Two modes:
+
+    sweep  every route in turn, --repeat times, from a single client
+    mix    concurrent clients running front desk, POS and manager
+           workloads for --duration seconds
+
+Requests go through the Flask test client (--transport inproc) or over
+real HTTP (--transport http) to a threaded server started here, or to an
+already running server with --url (which must be serving --db).
+
+Throughput and p50/p95/p99 latency are reported per route. Save a run
+with --save and check a later one against it with --compare; regressions
+beyond --threshold are listed and the exit status is 1.
+
+Usage (from the backend directory):
+    python benchmarks/http_suite.py sweep --save baselines/sweep.json
+    python benchmarks/http_suite.py mix --transport http --concurrency 16 --compare baselines/mix.json
+"""
+import argparse
+import http.client
+import itertools
+import json
+import os
+import platform
+import queue
+import random
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from urllib.parse import urlsplit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils import database, datagen, export_jobs
+
+BLUEPRINTS = ('auth', 'sales', 'rooms', 'employees', 'reports', 'dashboard', 'audit')
+
+SCALES = {
+    'small': dict(users=50, rooms=200, days=120, sales_per_day=1000),
+    'medium': dict(users=200, rooms=1000, days=365, sales_per_day=5000),
+    'large': dict(users=500, rooms=3000, days=730, sales_per_day=40000),
+}
+
+# Accounts from SAMPLE_USERS the suite logs in as
+CREDENTIALS = {
+    'admin': ('admin', 'admin123'),
+    'manager': ('manager1', 'manager123'),
+    'employee': ('waiter1', 'waiter123'),
+}
+
+class Endpoint:
+    """One request template
+
+    path(ctx) and body(ctx) build the request from the run context;
+    capture(ctx, payload) stores values later requests depend on;
+    requires names a context key that must be set for the request to run.
+    """
+    __slots__ = ('label', 'method', 'path', 'role', 'body', 'capture', 'requires', 'prepare')
+
+    def __init__(self, label, method, path, role=None, body=None, capture=None, requires=None, prepare=None):
+        self.label = label
+        self.method = method
+        self.path = path
+        self.role = role
+        self.body = body
+        self.capture = capture
+        self.requires = requires
+        self.prepare = prepare
+
+def _take_room(ctx):
+    try:
+        ctx['room_id'] = ctx['room_pool'].get_nowait()
+    except queue.Empty:
+        ctx.pop('room_id', None)
+
+def _return_room(ctx):
+    """Put a borrowed room back for the next check-in"""
+    room_id = ctx.pop('room_id', None)
+    ctx.pop('check_in_id', None)
+    if room_id is not None:
+        ctx['room_pool'].put(room_id)
+
+def _set(key, field):
+    def capture(ctx, payload):
+        if payload and field in payload:
+            ctx[key] = payload[field]
+    return capture
+
+def _wait_for_job(client, ctx):
+    """Poll (untimed) until the captured export job has finished"""
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        status, payload = client.send('GET', f"/api/reports/export-jobs/{ctx['job_id']}", 'manager')
+        if status != 200 or payload['job']['status'] in ('Completed', 'Failed'):
+            return
+        time.sleep(0.05)
+
+def _sale(ctx):
+    rng = ctx['rng']
+    return {
+        'sale_date': ctx['today'],
+        'category': rng.choice(['Food', 'Beverage', 'Room', 'Services', 'Other']),
+        'amount': round(rng.uniform(3, 150), 2),
+        'payment_method': rng.choice(['Card', 'Cash', 'Mobile']),
+        'description': 'Benchmark sale'
+    }
+
+def _staff(ctx):
+    seq = next(ctx['seq'])
+    return {
+        'username': f'bench{seq}', 'password': 'bench123', 'email': f'bench{seq}@hotel.com',
+        'full_name': f'Bench User {seq}', 'role': 'Employee', 'department': 'Dining'
+    }
+
+ENDPOINTS = {ep.label: ep for ep in [
+    # auth
+    Endpoint('auth.login', 'POST', lambda c: '/api/auth/login',
+             body=lambda c: {'username': 'waiter1', 'password': 'waiter123'}),
+    Endpoint('auth.register', 'POST', lambda c: '/api/auth/register', 'admin', body=_staff),
+    Endpoint('auth.verify_token', 'POST', lambda c: '/api/auth/verify-token', 'employee'),
+    Endpoint('auth.profile', 'GET', lambda c: '/api/auth/profile', 'employee'),
+    Endpoint('auth.logout', 'POST', lambda c: '/api/auth/logout', 'employee'),
+    # sales
+    Endpoint('sales.record', 'POST', lambda c: '/api/sales/record', 'employee', body=_sale),
+    Endpoint('sales.daily', 'GET', lambda c: f"/api/sales/daily/{c['employee_id']}/{c['today']}", 'employee'),
+    Endpoint('sales.monthly', 'GET', lambda c: f"/api/sales/monthly/{c['year']}/{c['month']}", 'manager'),
+    Endpoint('sales.daily_summary', 'GET', lambda c: f"/api/sales/daily-summary/{c['past']}", 'manager'),
+    Endpoint('sales.employee_performance', 'GET',
+             lambda c: f"/api/sales/employee-performance/{c['employee_id']}", 'employee'),
+    Endpoint('sales.export', 'GET', lambda c: f"/api/sales/export?from={c['week_ago']}&to={c['today']}", 'manager'),
+    Endpoint('sales.categories', 'GET', lambda c: '/api/sales/categories', 'employee'),
+    Endpoint('sales.payment_methods', 'GET', lambda c: '/api/sales/payment-methods', 'employee'),
+    # rooms
+    Endpoint('rooms.list', 'GET', lambda c: '/api/rooms/', 'employee'),
+    Endpoint('rooms.available', 'GET', lambda c: '/api/rooms/available', 'employee'),
+    Endpoint('rooms.create', 'POST', lambda c: '/api/rooms/', 'admin',
+             body=lambda c: {'room_number': f"B-{next(c['seq'])}", 'room_type': 'Double',
+                             'capacity': 2, 'price_per_night': 80.0}),
+    Endpoint('rooms.check_in', 'POST', lambda c: f"/api/rooms/{c['room_id']}/check-in", 'employee',
+             body=lambda c: {'guest_name': f"{c['rng'].choice(datagen.FIRST_NAMES)} Bench",
+                             'guest_email': 'guest@example.com', 'check_in_date': c['today'],
+                             'check_out_date': c['tomorrow'], 'number_of_guests': 1},
+             capture=_set('check_in_id', 'check_in_id'), requires='room_id', prepare=_take_room),
+    Endpoint('rooms.check_out', 'POST', lambda c: f"/api/rooms/{c['room_id']}/check-out", 'employee',
+             body=lambda c: {'check_in_id': c['check_in_id']}, requires='check_in_id'),
+    Endpoint('rooms.active_check_ins', 'GET', lambda c: '/api/rooms/active-check-ins', 'employee'),
+    Endpoint('rooms.guest_search', 'GET',
+             lambda c: f"/api/rooms/guests/search?q={c['rng'].choice(datagen.LAST_NAMES)}", 'employee'),
+    Endpoint('rooms.occupancy_report', 'GET', lambda c: '/api/rooms/occupancy-report', 'manager'),
+    # employees
+    Endpoint('employees.list', 'GET', lambda c: '/api/employees/', 'manager'),
+    Endpoint('employees.get', 'GET', lambda c: f"/api/employees/{c['employee_id']}", 'manager'),
+    Endpoint('employees.create', 'POST', lambda c: '/api/employees/', 'admin', body=_staff,
+             capture=_set('new_employee_id', 'user_id')),
+    Endpoint('employees.update', 'PUT', lambda c: f"/api/employees/{c['new_employee_id']}", 'manager',
+             body=lambda c: {'phone': '+15550000000'}, requires='new_employee_id'),
+    Endpoint('employees.deactivate', 'PUT', lambda c: f"/api/employees/{c['new_employee_id']}/deactivate",
+             'admin', requires='new_employee_id'),
+    Endpoint('employees.by_department', 'GET', lambda c: '/api/employees/by-department/Dining', 'manager'),
+    # reports
+    Endpoint('reports.daily', 'GET', lambda c: f"/api/reports/daily/{c['past']}", 'manager'),
+    Endpoint('reports.monthly', 'GET', lambda c: f"/api/reports/monthly/{c['year']}/{c['month']}", 'manager'),
+    Endpoint('reports.stays', 'GET', lambda c: f"/api/reports/stays?from={c['past']}&to={c['today']}", 'manager'),
+    Endpoint('reports.yearly', 'GET', lambda c: f"/api/reports/yearly/{c['year']}", 'manager'),
+    Endpoint('reports.comparison', 'GET',
+             lambda c: f"/api/reports/comparison?years={c['year'] - 2},{c['year'] - 1},{c['year']}", 'manager'),
+    Endpoint('reports.employee_performance', 'GET',
+             lambda c: f"/api/reports/employee-performance/{c['employee_id']}/monthly", 'manager'),
+    Endpoint('reports.export_daily', 'GET', lambda c: f"/api/reports/export/daily/{c['past']}?format=csv", 'manager'),
+    Endpoint('reports.export_monthly', 'GET',
+             lambda c: f"/api/reports/export/monthly/{c['year']}/{c['month']}", 'manager'),
+    Endpoint('reports.export_sales', 'GET',
+             lambda c: f"/api/reports/export/sales?from={c['past']}&to={c['past']}&format=csv.gz", 'manager'),
+    Endpoint('reports.export_job_create', 'POST', lambda c: '/api/reports/export-jobs', 'manager',
+             body=lambda c: {'report': 'daily', 'params': {'date': c['past']}, 'format': 'pdf'},
+             capture=lambda c, p: c.__setitem__('job_id', p['job']['job_id']) if p and 'job' in p else None),
+    Endpoint('reports.export_job_status', 'GET', lambda c: f"/api/reports/export-jobs/{c['job_id']}", 'manager',
+             requires='job_id'),
+    Endpoint('reports.export_job_download', 'GET', lambda c: f"/api/reports/export-jobs/{c['job_id']}/download",
+             'manager', requires='job_id', prepare=lambda c: _wait_for_job(c['client'], c)),
+    # dashboard
+    Endpoint('dashboard.overview', 'GET', lambda c: '/api/dashboard/overview', 'employee'),
+    Endpoint('dashboard.sales_trend', 'GET', lambda c: '/api/dashboard/sales-trend/30', 'manager'),
+    Endpoint('dashboard.employee_leaderboard', 'GET', lambda c: '/api/dashboard/employee-leaderboard', 'manager'),
+    Endpoint('dashboard.category_breakdown', 'GET',
+             lambda c: f"/api/dashboard/category-breakdown/{c['today']}", 'manager'),
+    Endpoint('dashboard.payment_method_breakdown', 'GET',
+             lambda c: f"/api/dashboard/payment-method-breakdown/{c['today']}", 'manager'),
+    # audit
+    Endpoint('audit.list', 'GET', lambda c: '/api/audit/', 'manager'),
+    # change feed
+    Endpoint('changes.feed', 'GET', lambda c: '/api/changes?since=0&wait=0&limit=100', 'manager'),
+    Endpoint('changes.ack', 'POST', lambda c: '/api/changes/ack', 'manager',
+             body=lambda c: {'consumer': 'bench', 'seq': 1}),
+    Endpoint('changes.consumers', 'GET', lambda c: '/api/changes/consumers', 'admin'),
+    Endpoint('changes.delete_consumer', 'DELETE', lambda c: '/api/changes/consumers/bench', 'admin'),
+]}
+
+# Workloads as weighted flows; a flow is a sequence of endpoint labels run in order
+PROFILES = {
+    'frontdesk': [
+        (4, ('rooms.available',)),
+        (3, ('rooms.active_check_ins',)),
+        (3, ('rooms.guest_search',)),
+        (2, ('rooms.check_in', 'rooms.check_out')),
+        (1, ('rooms.list',)),
+        (1, ('dashboard.overview',)),
+    ],
+    'pos': [
+        (8, ('sales.record',)),
+        (2, ('sales.daily',)),
+        (1, ('sales.categories', 'sales.payment_methods')),
+        (1, ('auth.verify_token',)),
+    ],
+    'manager': [
+        (3, ('dashboard.overview',)),
+        (2, ('dashboard.employee_leaderboard',)),
+        (2, ('dashboard.sales_trend',)),
+        (2, ('reports.daily',)),
+        (1, ('reports.monthly',)),
+        (1, ('reports.yearly',)),
+        (1, ('reports.employee_performance',)),
+        (1, ('dashboard.category_breakdown', 'dashboard.payment_method_breakdown')),
+        (1, ('employees.list',)),
+    ],
+}
+DEFAULT_MIX = 'frontdesk=3,pos=5,manager=2'
+
+class Recorder:
+    """Per-worker latency samples and error counts"""
+
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+
+    def add(self, label, seconds, ok):
+        self.samples.setdefault(label, []).append(seconds)
+        if not ok:
+            self.errors[label] = self.errors.get(label, 0) + 1
+
+    def merge(self, other):
+        for label, values in other.samples.items():
+            self.samples.setdefault(label, []).extend(values)
+        for label, count in other.errors.items():
+            self.errors[label] = self.errors.get(label, 0) + count
+
+class BaseClient:
+    """Sends requests with role tokens and records timed calls"""
+
+    def __init__(self, tokens, recorder):
+        self.tokens = tokens
+        self.recorder = recorder
+
+    def headers(self, role):
+        headers = {'Content-Type': 'application/json'}
+        if role:
+            headers['Authorization'] = f'Bearer {self.tokens[role]}'
+        return headers
+
+    def call(self, endpoint, ctx):
+        """Run one endpoint; returns False if it was skipped"""
+        ctx['client'] = self
+        if endpoint.prepare:
+            endpoint.prepare(ctx)
+        if endpoint.requires and ctx.get(endpoint.requires) is None:
+            return False
+        path = endpoint.path(ctx)
+        body = endpoint.body(ctx) if endpoint.body else None
+
+        start = time.perf_counter()
+        status, payload = self.send(endpoint.method, path, endpoint.role, body)
+        self.recorder.add(endpoint.label, time.perf_counter() - start, 200 <= status < 300)
+
+        if endpoint.capture:
+            endpoint.capture(ctx, payload)
+        return True
+
+class InProcessClient(BaseClient):
+    def __init__(self, app, tokens, recorder):
+        super().__init__(tokens, recorder)
+        self.client = app.test_client()
+
+    def send(self, method, path, role=None, body=None):
+        response = self.client.open(path, method=method, headers=self.headers(role),
+                                    data=json.dumps(body) if body is not None else None)
+        try:
+            data = response.get_data()
+            payload = json.loads(data) if response.mimetype == 'application/json' else None
+            return response.status_code, payload
+        finally:
+            response.close()
+
+class HttpClient(BaseClient):
+    """Keep-alive HTTP/1.1 connection, reopened after errors"""
+
+    def __init__(self, url, tokens, recorder):
+        super().__init__(tokens, recorder)
+        parts = urlsplit(url)
+        self.host, self.port = parts.hostname, parts.port or 80
+        self.conn = None
+
+    def send(self, method, path, role=None, body=None):
+        for attempt in (1, 2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            try:
+                self.conn.request(method, path, body=json.dumps(body) if body is not None else None,
+                                  headers=self.headers(role))
+                response = self.conn.getresponse()
+                data = response.read()
+                if response.getheader('Connection', '').lower() == 'close':
+                    self.conn.close()
+                    self.conn = None
+                payload = json.loads(data) if response.getheader('Content-Type', '').startswith('application/json') else None
+                return response.status, payload
+            except (OSError, http.client.HTTPException):
+                self.conn.close()
+                self.conn = None
+                if attempt == 2:
+                    return 599, None
+
+def percentile(values, pct):
+    """Nearest-rank percentile of pre-sorted values"""
+    if not values:
+        return 0.0
+    rank = max(1, -(-len(values) * pct // 100))
+    return values[int(rank) - 1]
+
+def summarize(recorder, elapsed):
+    """Per-endpoint stats in milliseconds plus overall throughput"""
+    endpoints = {}
+    total = 0
+    for label, values in sorted(recorder.samples.items()):
+        values.sort()
+        total += len(values)
+        endpoints[label] = {
+            'count': len(values),
+            'errors': recorder.errors.get(label, 0),
+            'rps': round(len(values) / elapsed, 2),
+            'mean_ms': round(sum(values) / len(values) * 1000, 3),
+            'p50_ms': round(percentile(values, 50) * 1000, 3),
+            'p95_ms': round(percentile(values, 95) * 1000, 3),
+            'p99_ms': round(percentile(values, 99) * 1000, 3),
+        }
+    return {
+        'requests': total,
+        'errors': sum(recorder.errors.values()),
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(total / elapsed, 2) if elapsed else 0,
+        'endpoints': endpoints
+    }
+
+def print_summary(result):
+    print(f"\n{'endpoint':<36}{'count':>7}{'err':>5}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    for label, stats in result['endpoints'].items():
+        print(f"{label:<36}{stats['count']:>7}{stats['errors']:>5}{stats['rps']:>9.1f}"
+              f"{stats['p50_ms']:>9.2f}{stats['p95_ms']:>9.2f}{stats['p99_ms']:>9.2f}")
+    print(f"\n{result['requests']} requests, {result['errors']} errors in {result['seconds']:.1f}s "
+          f"-> {result['throughput_rps']:.1f} req/s")
+
+def compare(result, baseline, threshold, min_ms):
+    """Regressions of this run against a saved baseline, as readable lines"""
+    regressions = []
+    base_rps = baseline.get('throughput_rps', 0)
+    if base_rps and result['throughput_rps'] < base_rps * (1 - threshold):
+        regressions.append(f"throughput {result['throughput_rps']:.1f} req/s vs baseline {base_rps:.1f}")
+
+    for label, stats in result['endpoints'].items():
+        base = baseline.get('endpoints', {}).get(label)
+        if not base:
+            continue
+        for key in ('p50_ms', 'p95_ms', 'p99_ms'):
+            # Small absolute differences are noise, whatever the ratio
+            if stats[key] > base[key] * (1 + threshold) and stats[key] - base[key] >= min_ms:
+                regressions.append(f"{label} {key} {stats[key]:.2f} vs baseline {base[key]:.2f}")
+        if stats['errors'] > base['errors']:
+            regressions.append(f"{label} errors {stats['errors']} vs baseline {base['errors']}")
+    return regressions
+
+def load_context(db_path):
+    """Ids and dates the request templates need, read from the dataset"""
+    db = sqlite3.connect(db_path)
+    try:
+        employee_id = db.execute("SELECT user_id FROM users WHERE username = 'waiter1'").fetchone()[0]
+        rooms = [row[0] for row in db.execute("SELECT room_id FROM rooms WHERE status = 'Available'")]
+        last_sale = db.execute('SELECT MAX(sale_date) FROM sales').fetchone()[0]
+    finally:
+        db.close()
+
+    today = date.today()
+    past = date.fromisoformat(last_sale) - timedelta(days=1) if last_sale else today
+    pool = queue.Queue()
+    for room_id in rooms:
+        pool.put(room_id)
+    return {
+        'employee_id': employee_id,
+        'room_pool': pool,
+        'today': today.isoformat(),
+        'tomorrow': (today + timedelta(days=1)).isoformat(),
+        'week_ago': (today - timedelta(days=7)).isoformat(),
+        'past': past.isoformat(),
+        'year': past.year,
+        'month': past.month,
+        'seq': itertools.count(int(time.time())),
+    }
+
+def login_all(send):
+    """Tokens for every benchmark role"""
+    tokens = {}
+    for role, (username, password) in CREDENTIALS.items():
+        status, payload = send('POST', '/api/auth/login', None, {'username': username, 'password': password})
+        if status != 200:
+            raise SystemExit(f'Login as {username} failed ({status}); is the server using --db?')
+        tokens[role] = payload['token']
+    return tokens
+
+def coverage_gaps(app, executed):
+    """Blueprint view functions no executed request reached"""
+    adapter = app.url_map.bind('localhost')
+    reached = set()
+    for method, path in executed:
+        try:
+            endpoint, _ = adapter.match(urlsplit(path).path, method=method)
+            reached.add(endpoint)
+        except Exception:
+            pass
+    views = {rule.endpoint for rule in app.url_map.iter_rules() if rule.endpoint.split('.')[0] in BLUEPRINTS}
+    return sorted(views - reached)
+
+def run_sweep(make_client, ctx, repeat):
+    recorder = Recorder()
+    client = make_client(recorder)
+    ctx = dict(ctx, rng=random.Random(0))
+    executed = []
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for endpoint in ENDPOINTS.values():
+            if client.call(endpoint, ctx):
+                executed.append((endpoint.method, endpoint.path(ctx)))
+        _return_room(ctx)
+        ctx.pop('new_employee_id', None)
+        ctx.pop('job_id', None)
+    return recorder, time.perf_counter() - start, executed
+
+def parse_mix(text):
+    weights = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in PROFILES:
+            raise SystemExit(f'Unknown profile {name!r}; choose from {", ".join(PROFILES)}')
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+def run_mix(make_client, ctx, concurrency, duration, mix, seed):
+    profiles = list(mix)
+    profile_weights = [mix[name] for name in profiles]
+    recorders = []
+    deadline = time.perf_counter() + duration
+    barrier = threading.Barrier(concurrency + 1)
+
+    def worker(index):
+        recorder = Recorder()
+        recorders.append(recorder)
+        client = make_client(recorder)
+        rng = random.Random(seed + index)
+        local = dict(ctx, rng=rng)
+        barrier.wait()
+        while time.perf_counter() < deadline:
+            flows = PROFILES[rng.choices(profiles, profile_weights)[0]]
+            flow = rng.choices([f[1] for f in flows], [f[0] for f in flows])[0]
+            try:
+                for label in flow:
+                    client.call(ENDPOINTS[label], local)
+            finally:
+                _return_room(local)
+
+    threads = [threading.Thread(target=worker, args=(idx,), daemon=True) for idx in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    merged = Recorder()
+    for recorder in recorders:
+        merged.merge(recorder)
+    return merged, elapsed
+
+def start_server(app):
+    """Threaded werkzeug server on a free port; returns its base URL"""
+    import logging
+    from werkzeug.serving import make_server
+    logging.getLogger('werkzeug').setLevel(logging.WARNING)
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f'http://127.0.0.1:{server.server_port}'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('mode', choices=['sweep', 'mix'])
+    parser.add_argument('--transport', choices=['inproc', 'http'], default='inproc')
+    parser.add_argument('--url', help='benchmark an already running server (implies --transport http)')
+    parser.add_argument('--db', help='dataset to use; generated there if missing (default: a fresh temp file)')
+    parser.add_argument('--scale', choices=SCALES, default='small', help='size of a generated dataset')
+    parser.add_argument('--repeat', type=int, default=20, help='sweep: passes over every route')
+    parser.add_argument('--concurrency', type=int, default=8, help='mix: concurrent clients')
+    parser.add_argument('--duration', type=float, default=30, help='mix: seconds to run')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'mix: profile weights (default {DEFAULT_MIX})')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help='write results to this JSON file')
+    parser.add_argument('--compare', help='flag regressions against this saved JSON result')
+    parser.add_argument('--threshold', type=float, default=0.25, help='relative slowdown that counts as a regression')
+    parser.add_argument('--min-ms', type=float, default=1.0, help='ignore latency regressions smaller than this')
+    args = parser.parse_args()
+
+    if args.url:
+        args.transport = 'http'
+    mix = parse_mix(args.mix)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = args.db or os.path.join(tmpdir, 'bench.db')
+        if not os.path.exists(db_path):
+            print(f'Generating {args.scale} dataset in {db_path}')
+            datagen.generate(db_path, seed=args.seed, log=lambda line: print('  ' + line), **SCALES[args.scale])
+
+        database.configure(db_path)
+        export_jobs.EXPORT_CACHE_DIR = os.path.join(tmpdir, 'exports')
+        os.environ.setdefault('METRICS_ENABLED', '0')
+
+        from app import create_app
+        app = create_app('production')
+
+        if args.transport == 'http':
+            url = args.url or start_server(app)
+            make_client = lambda recorder, tokens=None: HttpClient(url, tokens, recorder)
+        else:
+            make_client = lambda recorder, tokens=None: InProcessClient(app, tokens, recorder)
+
+        tokens = login_all(make_client(Recorder()).send)
+        client_factory = lambda recorder: make_client(recorder, tokens)
+        ctx = load_context(db_path)
+
+        if args.mode == 'sweep':
+            recorder, elapsed, executed = run_sweep(client_factory, ctx, args.repeat)
+            gaps = coverage_gaps(app, executed)
+        else:
+            recorder, elapsed = run_mix(client_factory, ctx, args.concurrency, args.duration, mix, args.seed)
+            gaps = []
+
+        result = summarize(recorder, elapsed)
+        result['meta'] = {
+            'mode': args.mode,
+            'transport': args.transport,
+            'scale': None if args.db else args.scale,
+            'repeat': args.repeat if args.mode == 'sweep' else None,
+            'concurrency': args.concurrency if args.mode == 'mix' else 1,
+            'duration': args.duration if args.mode == 'mix' else None,
+            'mix': mix if args.mode == 'mix' else None,
+            'python': platform.python_version(),
+            'cpus': os.cpu_count(),
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        }
+        print_summary(result)
+        if gaps:
+            print(f"\nRoutes not exercised: {', '.join(gaps)}")
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump(result, f, indent=2, sort_keys=True)
+        print(f'Saved results to {args.save}')
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        base_meta = baseline.get('meta', {})
+        if (base_meta.get('mode'), base_meta.get('transport')) != (args.mode, args.transport):
+            print('Warning: baseline was recorded with a different mode or transport')
+        regressions = compare(result, baseline, args.threshold, args.min_ms)
+        if regressions:
+            print(f'\n{len(regressions)} regression(s) beyond {args.threshold:.0%}:')
+            for line in regressions:
+                print(f'  {line}')
+            sys.exit(1)
+        print(f'\nNo regressions beyond {args.threshold:.0%} against {args.compare}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""
+Benchmark JSON serialization cost per API endpoint
+
+Calls every JSON GET route once against a generated dataset and keeps
+the object each one hands to ``jsonify``. Each payload is then encoded
+repeatedly by every JSON provider (app.utils.serialization) and, for
+reference, by Flask's stock provider:
+
+    flask    flask.json.provider.DefaultJSONProvider
+    stdlib   RecordJSONProvider
+    orjson   OrjsonProvider (if orjson is installed)
+
+Times are per ``jsonify``-equivalent call: encoding plus building the
+response object, without routing or SQL.
+
+Usage (from the backend directory):
+    python benchmarks/json_encoding.py
+    python benchmarks/json_encoding.py --scale medium --min-time 0.5 --save baselines/json.json
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask.json.provider import DefaultJSONProvider
+from app.utils import database, datagen, serialization
+from http_suite import ENDPOINTS, SCALES, InProcessClient, Recorder, load_context, login_all
+
+def capture_payloads(app, ctx):
+    """{endpoint label: object passed to jsonify} for every JSON GET route"""
+    captured = []
+    respond = app.json.response
+
+    def recording_response(*args, **kwargs):
+        captured.append(args[0] if len(args) == 1 else (args or kwargs))
+        return respond(*args, **kwargs)
+
+    app.json.response = recording_response
+    client = InProcessClient(app, None, Recorder())
+    client.tokens = login_all(client.send)
+    payloads = {}
+    try:
+        for label, endpoint in ENDPOINTS.items():
+            if endpoint.method != 'GET' or endpoint.requires:
+                continue
+            del captured[:]
+            status, _ = client.send('GET', endpoint.path(ctx), endpoint.role)
+            if status == 200 and captured:
+                payloads[label] = captured[-1]
+    finally:
+        app.json.response = respond
+    return payloads
+
+def time_call(fn, min_time):
+    """Seconds per call, timing batches until min_time has passed"""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / number
+        number *= 2
+
+def run(app, payloads, min_time):
+    providers = {'flask': DefaultJSONProvider(app)}
+    for name, cls in serialization.PROVIDERS.items():
+        providers[name] = cls(app)
+
+    results = {}
+    for label, obj in payloads.items():
+        row = {'bytes': len(providers['flask'].response(obj).get_data())}
+        for name, provider in providers.items():
+            row[name] = time_call(lambda: provider.response(obj), min_time) * 1e6
+        results[label] = row
+    return results, list(providers)
+
+def print_results(results, names):
+    header = f"{'endpoint':<36}{'bytes':>9}" + ''.join(f'{name + " us":>12}' for name in names)
+    header += ''.join(f'{name + " x":>10}' for name in names[1:])
+    print(header)
+    print('-' * len(header))
+    for label, row in sorted(results.items(), key=lambda item: -item[1]['flask']):
+        line = f"{label:<36}{row['bytes']:>9}" + ''.join(f'{row[name]:>12.1f}' for name in names)
+        line += ''.join(f"{row['flask'] / row[name]:>10.1f}" for name in names[1:])
+        print(line)
+    totals = {name: sum(row[name] for row in results.values()) for name in names}
+    print('-' * len(header))
+    line = f"{'all endpoints':<36}{sum(row['bytes'] for row in results.values()):>9}"
+    line += ''.join(f'{totals[name]:>12.1f}' for name in names)
+    line += ''.join(f"{totals['flask'] / totals[name]:>10.1f}" for name in names[1:])
+    print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='dataset to use; generated there if missing (default: a fresh temp file)')
+    parser.add_argument('--scale', choices=SCALES, default='small', help='size of a generated dataset')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds to time each endpoint and provider')
+    parser.add_argument('--save', help='write results to this JSON file')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = args.db or os.path.join(tmpdir, 'bench.db')
+        if not os.path.exists(db_path):
+            print(f'Generating {args.scale} dataset in {db_path}')
+            datagen.generate(db_path, seed=args.seed, log=lambda line: print('  ' + line), **SCALES[args.scale])
+
+        database.configure(db_path)
+        os.environ.setdefault('METRICS_ENABLED', '0')
+
+        from app import create_app
+        app = create_app('production')
+
+        ctx = load_context(db_path)
+        ctx['rng'] = random.Random(args.seed)
+        payloads = capture_payloads(app, ctx)
+        results, names = run(app, payloads, args.min_time)
+
+    print_results(results, names)
+
+    if args.save:
+        os.makedirs(os.path.dirname(os.path.abspath(args.save)), exist_ok=True)
+        with open(args.save, 'w') as f:
+            json.dump({'endpoints': results, 'meta': {
+                'scale': None if args.db else args.scale,
+                'python': platform.python_version(),
+                'orjson': serialization.ORJSON_AVAILABLE,
+                'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            }}, f, indent=2)
+        print(f'Saved to {args.save}')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+"""
+Benchmark PDF report rendering for growing row counts
+
+Usage (from the backend directory):
+    python benchmarks/pdf_export.py
+    python benchmarks/pdf_export.py --rows 1000 10000 --sections 30 --workers 4
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils import export
+
+CATEGORIES = ['Room', 'Food', 'Beverage', 'Services', 'Other']
+PAYMENT_METHODS = ['Cash', 'Card', 'Mobile', 'Check', 'Online']
+
+def make_rows(count, sections, seed=42):
+    """Synthetic sales rows shaped like the sales export"""
+    rng = random.Random(seed)
+    return [{
+        'Sale ID': idx,
+        'Date': f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}",
+        'Employee': f"Employee {idx % sections:03d}",
+        'Category': rng.choice(CATEGORIES),
+        'Amount': round(rng.uniform(5, 500), 2),
+        'Payment Method': rng.choice(PAYMENT_METHODS)
+    } for idx in range(count)]
+
+def time_render(rows, section_by, workers):
+    """Render once and return (seconds, output bytes)"""
+    export.PDF_WORKERS = workers
+    fd, path = tempfile.mkstemp(suffix='.pdf')
+    os.close(fd)
+    try:
+        start = time.perf_counter()
+        result, status = export.export_to_pdf(rows, path, "Benchmark Report", section_by=section_by)
+        elapsed = time.perf_counter() - start
+        if not result:
+            raise RuntimeError(status)
+        return elapsed, os.path.getsize(path)
+    finally:
+        os.remove(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--rows', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--sections', type=int, default=20, help='distinct employees to section by')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+    
+    if not export.REPORTLAB_AVAILABLE:
+        sys.exit('reportlab not installed')
+    
+    print(f"cpus={os.cpu_count()} workers={args.workers} pypdf={export.PYPDF_AVAILABLE}")
+    print(f"{'rows':>8}  {'mode':<22}{'seconds':>9}  {'rows/s':>9}  {'size KB':>8}")
+    
+    modes = [
+        ('chunked', None, 1),
+        ('sectioned', 'Employee', 1),
+        (f'sectioned x{args.workers}', 'Employee', args.workers),
+    ]
+    for count in args.rows:
+        rows = make_rows(count, args.sections)
+        for label, section_by, workers in modes:
+            elapsed, size = time_render(rows, section_by, workers)
+            print(f"{count:>8}  {label:<22}{elapsed:>9.2f}  {count / elapsed:>9.0f}  {size / 1024:>8.0f}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+"""
+Compare response encodings for time-series and report endpoints
+
+Requests each endpoint through the Flask test client in every encoding
+the server offers: plain JSON, columnar JSON and (when msgpack is
+installed) columnar MessagePack, each with and without gzip. Reports the
+response bytes and median latency per variant, and checks that every
+columnar payload decodes back to the plain JSON one.
+
+Usage (from the backend directory):
+    python benchmarks/response_encoding.py
+    python benchmarks/response_encoding.py --scale medium --repeat 50
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils import columnar, database, datagen
+from http_suite import ENDPOINTS, SCALES, InProcessClient, Recorder, load_context, login_all, percentile
+
+ENCODINGS = {
+    'json': 'application/json',
+    'columnar': columnar.COLUMNAR_JSON_MIMETYPE,
+}
+if columnar.MSGPACK_AVAILABLE:
+    import msgpack
+    ENCODINGS['msgpack'] = columnar.COLUMNAR_MSGPACK_MIMETYPE
+
+# Endpoint label -> path override (None keeps the http_suite path)
+TARGETS = {
+    'dashboard.sales_trend': lambda c: '/api/dashboard/sales-trend/365',
+    'reports.daily': None,
+    'reports.yearly': None,
+    'reports.comparison': None,
+    'reports.employee_performance': lambda c: '/api/reports/employee-performance/all/monthly',
+    'sales.employee_performance': None,
+    'sales.daily_summary': None,
+    'sales.monthly': None,
+}
+
+def request(client, path, role, mimetype, gzipped):
+    headers = client.headers(role)
+    headers['Accept'] = mimetype
+    if gzipped:
+        headers['Accept-Encoding'] = 'gzip'
+    start = time.perf_counter()
+    response = client.client.get(path, headers=headers)
+    body = response.get_data()
+    elapsed = (time.perf_counter() - start) * 1000
+    if response.status_code != 200 or response.mimetype != mimetype:
+        raise SystemExit(f'{path} as {mimetype}: {response.status_code} {response.mimetype}')
+    if gzipped != (response.headers.get('Content-Encoding') == 'gzip') and len(body) >= 500:
+        raise SystemExit(f'{path} as {mimetype}: unexpected Content-Encoding')
+    return body, response.headers.get('Content-Encoding'), elapsed
+
+def decode(body, encoding, name):
+    if encoding == 'gzip':
+        body = gzip.decompress(body)
+    if name == 'msgpack':
+        return columnar.from_columnar(msgpack.unpackb(body, raw=False))
+    payload = json.loads(body)
+    return columnar.from_columnar(payload) if name == 'columnar' else payload
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='dataset to use; generated there if missing (default: a fresh temp file)')
+    parser.add_argument('--scale', choices=SCALES, default='small', help='size of a generated dataset')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20, help='requests per endpoint and variant')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = args.db or os.path.join(tmpdir, 'bench.db')
+        if not os.path.exists(db_path):
+            print(f'Generating {args.scale} dataset in {db_path}')
+            datagen.generate(db_path, seed=args.seed, log=lambda line: print('  ' + line), **SCALES[args.scale])
+
+        database.configure(db_path)
+        os.environ.setdefault('METRICS_ENABLED', '0')
+        os.environ['COMPRESS_ENABLED'] = '1'
+
+        from app import create_app
+        app = create_app('production')
+
+        ctx = load_context(db_path)
+        ctx['rng'] = random.Random(args.seed)
+        client = InProcessClient(app, None, Recorder())
+        client.tokens = login_all(client.send)
+
+        variants = [(name, gzipped) for name in ENCODINGS for gzipped in (False, True)]
+        header = f"{'endpoint':<30}" + ''.join(f"{name + ('+gz' if gzipped else ''):>14}"
+                                               for name, gzipped in variants)
+        print(header + '\n' + '-' * len(header))
+        for label, path_override in TARGETS.items():
+            endpoint = ENDPOINTS[label]
+            path = (path_override or endpoint.path)(ctx)
+            sizes, latencies = [], []
+            expected = None
+            for name, gzipped in variants:
+                timings = []
+                for _ in range(args.repeat):
+                    body, encoding, elapsed = request(client, path, endpoint.role, ENCODINGS[name], gzipped)
+                    timings.append(elapsed)
+                payload = decode(body, encoding, name)
+                if expected is None:
+                    expected = payload
+                elif payload != expected:
+                    raise SystemExit(f'{label}: {name} payload does not decode to the JSON payload')
+                sizes.append(len(body))
+                latencies.append(percentile(sorted(timings), 50))
+            print(f'{label:<30}' + ''.join(f'{size:>13}B' for size in sizes))
+            print(f"{'  p50 ms':<30}" + ''.join(f'{ms:>14.2f}' for ms in latencies))
+
+if __name__ == '__main__':
+    main()
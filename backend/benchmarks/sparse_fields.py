@@ -0,0 +1,89 @@
+"""
+Measure payload size and latency saved by sparse fieldsets (?fields=)
+
+Requests each list endpoint that supports ``?fields=`` with every field
+and with a typical terminal projection (ids and statuses), through the
+Flask test client against a generated dataset, and reports response
+bytes and median / p95 latency for both.
+
+Usage (from the backend directory):
+    python benchmarks/sparse_fields.py
+    python benchmarks/sparse_fields.py --scale medium --repeat 50
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.utils import database, datagen
+from http_suite import ENDPOINTS, SCALES, InProcessClient, Recorder, load_context, login_all, percentile
+
+# Endpoint label -> projection a front desk or POS terminal would ask for
+PROJECTIONS = {
+    'rooms.list': 'room_id,status',
+    'rooms.available': 'room_id,room_number',
+    'rooms.active_check_ins': 'check_in_id,room_id,room_number',
+    'employees.list': 'user_id,full_name',
+    'sales.daily': 'sale_id,amount',
+    'sales.monthly': 'sale_id,amount',
+    'sales.daily_summary': 'user_id,total_sales',
+    'sales.employee_performance': 'sale_date,total_sales',
+}
+
+def measure(client, path, role, repeat):
+    """(response bytes, latencies in ms) for repeat requests"""
+    size = 0
+    latencies = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        response = client.client.get(path, headers=client.headers(role))
+        body = response.get_data()
+        latencies.append((time.perf_counter() - start) * 1000)
+        if response.status_code != 200:
+            raise SystemExit(f'{path} returned {response.status_code}: {body[:200]!r}')
+        size = len(body)
+    return size, sorted(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', help='dataset to use; generated there if missing (default: a fresh temp file)')
+    parser.add_argument('--scale', choices=SCALES, default='small', help='size of a generated dataset')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=20, help='requests per endpoint and variant')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db_path = args.db or os.path.join(tmpdir, 'bench.db')
+        if not os.path.exists(db_path):
+            print(f'Generating {args.scale} dataset in {db_path}')
+            datagen.generate(db_path, seed=args.seed, log=lambda line: print('  ' + line), **SCALES[args.scale])
+
+        database.configure(db_path)
+        os.environ.setdefault('METRICS_ENABLED', '0')
+
+        from app import create_app
+        app = create_app('production')
+
+        ctx = load_context(db_path)
+        ctx['rng'] = random.Random(args.seed)
+        client = InProcessClient(app, None, Recorder())
+        client.tokens = login_all(client.send)
+
+        print(f"{'endpoint':<28}{'fields':<34}{'bytes':>10}{'saved':>8}{'p50 ms':>9}{'p95 ms':>9}{'saved':>8}")
+        for label, fields in PROJECTIONS.items():
+            endpoint = ENDPOINTS[label]
+            path = endpoint.path(ctx)
+            sparse_path = f"{path}{'&' if '?' in path else '?'}fields={fields}"
+            full_size, full = measure(client, path, endpoint.role, args.repeat)
+            size, sparse = measure(client, sparse_path, endpoint.role, args.repeat)
+            full_p50, p50 = percentile(full, 50), percentile(sparse, 50)
+            print(f"{label:<28}{'(all)':<34}{full_size:>10}{'':>8}{full_p50:>9.2f}{percentile(full, 95):>9.2f}")
+            print(f"{'':<28}{fields:<34}{size:>10}{1 - size / full_size:>8.0%}"
+                  f"{p50:>9.2f}{percentile(sparse, 95):>9.2f}{1 - p50 / full_p50:>8.0%}")
+
+if __name__ == '__main__':
+    main()
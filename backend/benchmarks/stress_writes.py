@@ -0,0 +1,396 @@
+"""
+Concurrency stress test for check-in, check-out and sale writes
+
+Runs Room.check_in, Room.check_out and Sales.record_sale concurrently
+from several processes with several threads each. Every write goes
+through the normal model code against a copy of a generated dataset. A
+write that fails with "database is locked" is retried with jittered
+backoff, the way a desk or POS client would retry it.
+
+For each configuration the report gives committed writes per second,
+the SQLITE_BUSY and retry rates, the time spent waiting on locks and
+the write latency. Invariants are then checked against the final
+database:
+
+    double_occupied      rooms with more than one Active check-in
+    room_status          rooms whose status disagrees with their check-ins
+    daily_summary        daily_sales_summary rows that differ from the
+                         aggregate of sales
+    unacknowledged_sales sales rows committed without a successful
+                         record_sale (or acknowledged but missing)
+
+Pass several --journal-mode / --connection values to run every
+combination on identical data and compare them side by side. The exit
+status is 1 if any invariant is violated.
+
+Usage (from the backend directory):
+    python benchmarks/stress_writes.py
+    python benchmarks/stress_writes.py --processes 4 --threads 8 --journal-mode delete wal \\
+        --connection per-request per-worker --busy-timeout 0.5 5 --save stress.json
+"""
+import argparse
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from flask import Flask
+from app.utils import database, datagen
+
+DATASET = dict(users=20, rooms=100, days=30, sales_per_day=500)
+DEFAULT_MIX = 'checkin=2,checkout=2,sale=6'
+MAX_STAYS_PER_WORKER = 3
+BACKOFF_BASE = 0.005  # seconds; doubled on every retry
+
+def connection_factory(journal_mode, synchronous):
+    """Connection class applying per-connection pragmas on open
+
+    WAL is a persistent property of the file and is set once up front,
+    so only the rollback journal modes are applied here.
+    """
+    class StressConnection(sqlite3.Connection):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            if journal_mode != 'wal':
+                self.execute(f'PRAGMA journal_mode = {journal_mode}')
+            self.execute(f'PRAGMA synchronous = {synchronous}')
+    return StressConnection
+
+def _is_busy(error):
+    text = str(error).lower()
+    return 'locked' in text or 'busy' in text
+
+def _new_stats():
+    return {op: {'attempts': 0, 'committed': 0, 'busy': 0, 'retries': 0, 'failed': 0, 'skipped': 0,
+                 'lock_wait': 0.0, 'latencies': [], 'errors': {}}
+            for op in ('checkin', 'checkout', 'sale')}
+
+def _merge_stats(target, source):
+    for op, stats in source.items():
+        for key, value in stats.items():
+            if key == 'errors':
+                for error, count in value.items():
+                    target[op]['errors'][error] = target[op]['errors'].get(error, 0) + count
+            else:
+                target[op][key] += value
+
+def _worker_thread(app, config, seed, stats, acked, start_at):
+    """One desk or terminal issuing writes until the deadline"""
+    from app.models.room import Room
+    from app.models.sales import Sales
+
+    rng = random.Random(seed)
+    employee_id = rng.choice(config['employees'])
+    today = date.today()
+    stay_dates = (today.isoformat(), (today + timedelta(days=1)).isoformat())
+    ops = list(config['mix'])
+    weights = [config['mix'][op] for op in ops]
+    stays = []
+
+    def checkin():
+        rooms = Room.get_available_rooms()
+        if not rooms:
+            return None
+        room_id = rng.choice(rooms).room_id
+        result = Room.check_in(room_id, f'{rng.choice(datagen.FIRST_NAMES)} Stress', employee_id, *stay_dates)
+        if result['success']:
+            stays.append((room_id, result['check_in_id']))
+        return result
+
+    def checkout():
+        room_id, check_in_id = stays[-1]
+        result = Room.check_out(room_id, check_in_id)
+        if result['success']:
+            stays.pop()
+        return result
+
+    def sale():
+        category, description, amount = rng.choice(config['items'])
+        result = Sales.record_sale(employee_id, stay_dates[0], category, amount, description,
+                                   payment_method=rng.choice(['Card', 'Cash', 'Mobile']))
+        if result['success']:
+            acked[0] += 1
+        return result
+
+    actions = {'checkin': checkin, 'checkout': checkout, 'sale': sale}
+
+    def run(action):
+        """Call an action in the configured connection scope"""
+        if config['connection'] == 'per-request':
+            with app.app_context():
+                return action()
+        try:
+            return action()
+        except Exception:
+            database.get_db().rollback()
+            raise
+
+    persistent = None
+    if config['connection'] == 'per-worker':
+        persistent = app.app_context()
+        persistent.push()
+
+    while time.time() < start_at:
+        time.sleep(0.001)
+    deadline = start_at + config['duration']
+    try:
+        while time.time() < deadline:
+            op = rng.choices(ops, weights)[0]
+            if op == 'checkout' and not stays:
+                op = 'checkin'
+            if op == 'checkin' and len(stays) >= MAX_STAYS_PER_WORKER:
+                op = 'checkout'
+            op_stats = stats[op]
+            began = time.perf_counter()
+
+            for attempt in range(config['retries'] + 1):
+                op_stats['attempts'] += 1
+                attempt_began = time.perf_counter()
+                try:
+                    result = run(actions[op])
+                except sqlite3.Error as e:
+                    result = {'success': False, 'error': str(e)}
+                if result is None:
+                    op_stats['skipped'] += 1
+                    break
+                if result['success']:
+                    op_stats['committed'] += 1
+                    op_stats['latencies'].append(time.perf_counter() - began)
+                    break
+                if not _is_busy(result['error']):
+                    # Model methods roll nothing back on error, so drop a half-done transaction
+                    if persistent is not None:
+                        database.get_db().rollback()
+                    op_stats['failed'] += 1
+                    op_stats['errors'][result['error']] = op_stats['errors'].get(result['error'], 0) + 1
+                    break
+                if persistent is not None:
+                    database.get_db().rollback()
+                op_stats['busy'] += 1
+                op_stats['lock_wait'] += time.perf_counter() - attempt_began
+                if attempt == config['retries']:
+                    op_stats['failed'] += 1
+                    op_stats['errors']['retries exhausted'] = op_stats['errors'].get('retries exhausted', 0) + 1
+                    break
+                op_stats['retries'] += 1
+                pause = rng.uniform(0, BACKOFF_BASE * 2 ** attempt)
+                time.sleep(pause)
+                op_stats['lock_wait'] += pause
+    finally:
+        if persistent is not None:
+            persistent.pop()
+
+def worker_process(config, index, results):
+    """Process entry point: run config['threads'] writers and report stats"""
+    database.configure(config['db'])
+    database.BUSY_TIMEOUT = config['busy_timeout']
+    database.set_connection_factory(connection_factory(config['journal_mode'], config['synchronous']))
+
+    app = Flask('stress')
+    app.teardown_appcontext(database.close_db)
+
+    per_thread = [(_new_stats(), [0]) for _ in range(config['threads'])]
+    threads = [threading.Thread(target=_worker_thread,
+                                args=(app, config, config['seed'] + index * 1000 + idx, stats, acked,
+                                      config['start_at']))
+               for idx, (stats, acked) in enumerate(per_thread)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    merged = _new_stats()
+    for stats, _ in per_thread:
+        _merge_stats(merged, stats)
+    results.put((merged, sum(acked[0] for _, acked in per_thread)))
+
+def check_invariants(db_path, sales_before, acknowledged):
+    """Violations found in the final database, by invariant"""
+    db = sqlite3.connect(db_path)
+    try:
+        double_occupied = db.execute('''
+            SELECT room_id, COUNT(*) FROM check_ins
+            WHERE status = 'Active'
+            GROUP BY room_id HAVING COUNT(*) > 1
+        ''').fetchall()
+        room_status = db.execute('''
+            SELECT r.room_id, r.status FROM rooms r
+            WHERE (r.status = 'Occupied') !=
+                  EXISTS (SELECT 1 FROM check_ins c WHERE c.room_id = r.room_id AND c.status = 'Active')
+        ''').fetchall()
+        daily_summary = db.execute('''
+            WITH actual AS (
+                SELECT employee_id, sale_date, SUM(amount) AS total, COUNT(*) AS n
+                FROM sales GROUP BY employee_id, sale_date
+            )
+            SELECT a.employee_id, a.sale_date, a.total, d.total_sales, a.n, d.transaction_count
+            FROM actual a
+            LEFT JOIN daily_sales_summary d ON d.employee_id = a.employee_id AND d.sale_date = a.sale_date
+            WHERE d.summary_id IS NULL OR ABS(a.total - d.total_sales) > 0.005 OR a.n != d.transaction_count
+        ''').fetchall()
+        sales_after = db.execute('SELECT COUNT(*) FROM sales').fetchone()[0]
+    finally:
+        db.close()
+
+    unacknowledged = sales_after - sales_before - acknowledged
+    return {
+        'double_occupied': {'count': len(double_occupied), 'examples': double_occupied[:5]},
+        'room_status': {'count': len(room_status), 'examples': room_status[:5]},
+        'daily_summary': {'count': len(daily_summary), 'examples': daily_summary[:5]},
+        'unacknowledged_sales': {'count': abs(unacknowledged), 'examples': [unacknowledged] if unacknowledged else []},
+    }
+
+def prepare_database(template, path, journal_mode):
+    shutil.copyfile(template, path)
+    db = sqlite3.connect(path)
+    db.execute(f"PRAGMA journal_mode = {'wal' if journal_mode == 'wal' else 'delete'}")
+    sales_before = db.execute('SELECT COUNT(*) FROM sales').fetchone()[0]
+    employees = [row[0] for row in db.execute("SELECT user_id FROM users WHERE role = 'Employee'")]
+    db.close()
+    return sales_before, employees
+
+def run_config(template, workdir, base, journal_mode, connection, busy_timeout):
+    """Run one configuration on a fresh copy of the dataset"""
+    db_path = os.path.join(workdir, f'stress_{journal_mode}_{connection}_{busy_timeout}.db')
+    sales_before, employees = prepare_database(template, db_path, journal_mode)
+
+    config = dict(base, db=db_path, journal_mode=journal_mode, connection=connection,
+                  busy_timeout=busy_timeout, employees=employees, start_at=time.time() + 1.0 + base['processes'] * 0.5)
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    processes = [context.Process(target=worker_process, args=(config, idx, results))
+                 for idx in range(base['processes'])]
+    for process in processes:
+        process.start()
+
+    stats = _new_stats()
+    acknowledged = 0
+    for _ in processes:
+        process_stats, process_acked = results.get()
+        _merge_stats(stats, process_stats)
+        acknowledged += process_acked
+    for process in processes:
+        process.join()
+
+    return summarize(stats, base['duration'], check_invariants(db_path, sales_before, acknowledged))
+
+def summarize(stats, duration, invariants):
+    ops = {}
+    totals = {'attempts': 0, 'committed': 0, 'busy': 0, 'retries': 0, 'failed': 0, 'lock_wait': 0.0}
+    latencies = []
+    for op, op_stats in stats.items():
+        values = sorted(op_stats['latencies'])
+        latencies.extend(values)
+        for key in totals:
+            totals[key] += op_stats[key]
+        ops[op] = {key: op_stats[key] for key in ('attempts', 'committed', 'busy', 'retries', 'failed', 'skipped')}
+        ops[op]['lock_wait_s'] = round(op_stats['lock_wait'], 3)
+        ops[op]['p50_ms'] = round(_percentile(values, 50) * 1000, 2)
+        ops[op]['p99_ms'] = round(_percentile(values, 99) * 1000, 2)
+        ops[op]['errors'] = op_stats['errors']
+    latencies.sort()
+
+    return {
+        'committed_per_s': round(totals['committed'] / duration, 1),
+        'busy_rate': round(totals['busy'] / totals['attempts'], 4) if totals['attempts'] else 0,
+        'retry_rate': round(totals['retries'] / max(totals['committed'] + totals['failed'], 1), 4),
+        'failed': totals['failed'],
+        'lock_wait_s': round(totals['lock_wait'], 3),
+        'p50_ms': round(_percentile(latencies, 50) * 1000, 2),
+        'p99_ms': round(_percentile(latencies, 99) * 1000, 2),
+        'operations': ops,
+        'invariants': invariants,
+        'ok': not any(check['count'] for check in invariants.values()),
+    }
+
+def _percentile(values, pct):
+    if not values:
+        return 0.0
+    return values[max(1, -(-len(values) * pct // 100)) - 1]
+
+def parse_mix(text):
+    mix = {}
+    for part in text.split(','):
+        name, _, weight = part.partition('=')
+        if name.strip() not in ('checkin', 'checkout', 'sale'):
+            raise SystemExit(f'Unknown operation {name!r}; choose from checkin, checkout, sale')
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--processes', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=4, help='writer threads per process')
+    parser.add_argument('--duration', type=float, default=15, help='seconds per configuration')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f'operation weights (default {DEFAULT_MIX})')
+    parser.add_argument('--journal-mode', nargs='+', default=['delete'], choices=['delete', 'truncate', 'persist', 'wal'])
+    parser.add_argument('--connection', nargs='+', default=['per-request'], choices=['per-request', 'per-worker'],
+                        help='a fresh connection per write (as per HTTP request) or one kept per writer')
+    parser.add_argument('--busy-timeout', nargs='+', type=float, default=[database.BUSY_TIMEOUT],
+                        help='sqlite busy timeout in seconds')
+    parser.add_argument('--synchronous', default='FULL', choices=['OFF', 'NORMAL', 'FULL'])
+    parser.add_argument('--retries', type=int, default=5, help='retries of a write that hit a lock')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--save', help='write all results to this JSON file')
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    items, _, _ = datagen._sale_pools(rng)
+    base = {
+        'processes': args.processes, 'threads': args.threads, 'duration': args.duration,
+        'mix': parse_mix(args.mix), 'synchronous': args.synchronous, 'retries': args.retries,
+        'seed': args.seed, 'items': items[:256],
+    }
+
+    results = []
+    with tempfile.TemporaryDirectory() as workdir:
+        template = os.path.join(workdir, 'template.db')
+        datagen.generate(template, seed=args.seed, log=lambda line: None, **DATASET)
+
+        print(f"{args.processes} processes x {args.threads} threads, {args.duration:g}s per run, "
+              f"synchronous={args.synchronous}, mix={args.mix}")
+        print(f"\n{'journal':<9}{'connection':<13}{'timeout':>8}{'commits/s':>11}{'busy %':>8}{'retry %':>9}"
+              f"{'failed':>8}{'lock wait s':>13}{'p50 ms':>9}{'p99 ms':>9}  invariants")
+        for journal_mode, connection, busy_timeout in itertools.product(args.journal_mode, args.connection,
+                                                                         args.busy_timeout):
+            result = run_config(template, workdir, base, journal_mode, connection, busy_timeout)
+            result['config'] = {'journal_mode': journal_mode, 'connection': connection, 'busy_timeout': busy_timeout}
+            results.append(result)
+
+            broken = [name for name, check in result['invariants'].items() if check['count']]
+            print(f"{journal_mode:<9}{connection:<13}{busy_timeout:>8g}{result['committed_per_s']:>11.1f}"
+                  f"{result['busy_rate'] * 100:>8.2f}{result['retry_rate'] * 100:>9.2f}{result['failed']:>8}"
+                  f"{result['lock_wait_s']:>13.2f}{result['p50_ms']:>9.2f}{result['p99_ms']:>9.2f}  "
+                  f"{'ok' if result['ok'] else 'FAILED: ' + ', '.join(broken)}")
+
+    for result in results:
+        if result['ok']:
+            continue
+        config = result['config']
+        print(f"\n{config['journal_mode']} / {config['connection']} / timeout {config['busy_timeout']:g}:")
+        for name, check in result['invariants'].items():
+            if check['count']:
+                print(f"  {name}: {check['count']} (e.g. {check['examples'][:3]})")
+        for op, stats in result['operations'].items():
+            for error, count in stats['errors'].items():
+                print(f"  {op} error x{count}: {error}")
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2, default=str)
+        print(f'\nSaved results to {args.save}')
+
+    sys.exit(0 if all(result['ok'] for result in results) else 1)
+
+if __name__ == '__main__':
+    main()
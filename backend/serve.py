@@ -0,0 +1,78 @@
+"""
+Production entry point for Hotel Management System Backend
+
+Serves the app with a preforking multi-process server (app.utils.server)
+instead of the debug server in run.py. Settings come from the command
+line or the environment:
+
+    WEB_HOST, WEB_PORT        address to listen on (0.0.0.0:5000)
+    WEB_WORKERS               worker processes (CPU count)
+    WEB_THREADS               threads per worker (8)
+    WEB_MAX_REQUESTS          recycle a worker after this many requests (0 = never)
+    WEB_MAX_REQUESTS_JITTER   random extra requests so workers don't recycle together
+    WEB_GRACEFUL_TIMEOUT      seconds to drain in-flight requests on stop/reload
+    WEB_KEEPALIVE             seconds an idle keep-alive connection is held
+    WEB_PRELOAD               1 to import the app once in the master (default), 0 per worker
+
+Usage (from the backend directory):
+    python serve.py
+    python serve.py --workers 4 --threads 8 --max-requests 10000
+
+Send HUP to the master for a graceful reload and TERM for a graceful stop.
+The module also exposes ``app`` for external WSGI servers, e.g.
+``gunicorn serve:app``.
+"""
+import argparse
+import logging
+import os
+import sys
+
+# Add the backend directory to the path
+sys.path.insert(0, os.path.dirname(__file__))
+
+from app import create_app
+from app.utils.server import PreforkServer
+
+def _env(name, default, convert=int):
+    return convert(os.environ.get(name, default))
+
+def make_app():
+    return create_app('production')
+
+# For external WSGI servers; when run as a script, main() decides whether to preload
+app = make_app() if __name__ != '__main__' else None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default=os.environ.get('WEB_HOST', '0.0.0.0'))
+    parser.add_argument('--port', type=int, default=_env('WEB_PORT', 5000))
+    parser.add_argument('--workers', type=int, default=_env('WEB_WORKERS', os.cpu_count() or 1))
+    parser.add_argument('--threads', type=int, default=_env('WEB_THREADS', 8))
+    parser.add_argument('--max-requests', type=int, default=_env('WEB_MAX_REQUESTS', 0))
+    parser.add_argument('--max-requests-jitter', type=int, default=_env('WEB_MAX_REQUESTS_JITTER', 0))
+    parser.add_argument('--graceful-timeout', type=float, default=_env('WEB_GRACEFUL_TIMEOUT', 30, float))
+    parser.add_argument('--keepalive', type=float, default=_env('WEB_KEEPALIVE', 5, float))
+    parser.add_argument('--no-preload', dest='preload', action='store_false',
+                        default=os.environ.get('WEB_PRELOAD', '1') != '0',
+                        help='import the app in each worker so a reload picks up code changes')
+    parser.add_argument('--access-log', action='store_true', help='log every request')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s [%(process)d] %(levelname)s %(message)s')
+
+    server = PreforkServer(
+        make_app() if args.preload else make_app,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        threads=args.threads,
+        max_requests=args.max_requests,
+        max_requests_jitter=args.max_requests_jitter,
+        graceful_timeout=args.graceful_timeout,
+        keepalive=args.keepalive,
+        access_log=args.access_log
+    )
+    sys.exit(server.run())
+
+if __name__ == '__main__':
+    main()
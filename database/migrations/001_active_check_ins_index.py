@@ -0,0 +1,5 @@
+"""Partial index for the active guest list, which otherwise scans every stay ever recorded"""
+TRANSACTIONAL = False
+
+def upgrade(m):
+    m.create_index('idx_check_ins_active', 'check_ins', 'check_in_date', where="status = 'Active'")
@@ -0,0 +1,5 @@
+"""Home property of each account and of each audit entry (NULL: the whole group)"""
+
+def upgrade(m):
+    m.add_column('users', 'property', 'TEXT')
+    m.add_column('audit_log', 'property', 'TEXT')
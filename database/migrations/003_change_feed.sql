@@ -0,0 +1,61 @@
+-- Change feed (app/utils/changes.py)
+--
+-- Every insert, update and delete on sales, check_ins, rooms and users
+-- appends one row to changes. AUTOINCREMENT keeps seq increasing across
+-- pruning, and SQLite commits one writer at a time, so a reader never
+-- sees a seq before all the smaller ones.
+
+CREATE TABLE IF NOT EXISTS changes (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    table_name TEXT NOT NULL,
+    row_id INTEGER NOT NULL,
+    op TEXT NOT NULL CHECK(op IN ('I', 'U', 'D')),
+    changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Position of each feed consumer; changes every consumer has acknowledged are pruned
+CREATE TABLE IF NOT EXISTS change_consumers (
+    consumer TEXT PRIMARY KEY,
+    acked_seq INTEGER NOT NULL DEFAULT 0,
+    acked_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE TRIGGER IF NOT EXISTS sales_changes_insert AFTER INSERT ON sales BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('sales', NEW.sale_id, 'I');
+END;
+CREATE TRIGGER IF NOT EXISTS sales_changes_update AFTER UPDATE ON sales BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('sales', NEW.sale_id, 'U');
+END;
+CREATE TRIGGER IF NOT EXISTS sales_changes_delete AFTER DELETE ON sales BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('sales', OLD.sale_id, 'D');
+END;
+
+CREATE TRIGGER IF NOT EXISTS check_ins_changes_insert AFTER INSERT ON check_ins BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('check_ins', NEW.check_in_id, 'I');
+END;
+CREATE TRIGGER IF NOT EXISTS check_ins_changes_update AFTER UPDATE ON check_ins BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('check_ins', NEW.check_in_id, 'U');
+END;
+CREATE TRIGGER IF NOT EXISTS check_ins_changes_delete AFTER DELETE ON check_ins BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('check_ins', OLD.check_in_id, 'D');
+END;
+
+CREATE TRIGGER IF NOT EXISTS rooms_changes_insert AFTER INSERT ON rooms BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('rooms', NEW.room_id, 'I');
+END;
+CREATE TRIGGER IF NOT EXISTS rooms_changes_update AFTER UPDATE ON rooms BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('rooms', NEW.room_id, 'U');
+END;
+CREATE TRIGGER IF NOT EXISTS rooms_changes_delete AFTER DELETE ON rooms BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('rooms', OLD.room_id, 'D');
+END;
+
+CREATE TRIGGER IF NOT EXISTS users_changes_insert AFTER INSERT ON users BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('users', NEW.user_id, 'I');
+END;
+CREATE TRIGGER IF NOT EXISTS users_changes_update AFTER UPDATE ON users BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('users', NEW.user_id, 'U');
+END;
+CREATE TRIGGER IF NOT EXISTS users_changes_delete AFTER DELETE ON users BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('users', OLD.user_id, 'D');
+END;
@@ -0,0 +1,18 @@
+-- Archived stays stay searchable (app/utils/archive.py)
+--
+-- archive_year() inserts a row into archive_in_progress inside the
+-- transaction that moves a year out of check_ins, and deletes it again
+-- before committing, so no other connection ever sees it. While it is
+-- there, deletes leave the guest index alone: the index keeps the
+-- archived stays, and guest search reads them from the archives.
+
+CREATE TABLE IF NOT EXISTS archive_in_progress (
+    year INTEGER PRIMARY KEY
+);
+
+DROP TRIGGER IF EXISTS check_ins_fts_delete;
+CREATE TRIGGER check_ins_fts_delete AFTER DELETE ON check_ins
+WHEN NOT EXISTS (SELECT 1 FROM archive_in_progress) BEGIN
+    INSERT INTO check_ins_fts(check_ins_fts, rowid, guest_name, guest_email, guest_phone, notes)
+    VALUES ('delete', old.check_in_id, old.guest_name, old.guest_email, old.guest_phone, old.notes);
+END;
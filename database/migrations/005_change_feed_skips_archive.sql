@@ -0,0 +1,17 @@
+-- Archiving is not a change (app/utils/changes.py)
+--
+-- Moving a closed year into its archive deletes the rows from sales and
+-- check_ins, but they still exist. While archive_in_progress has a row
+-- (migration 004), those deletes are left out of the change feed.
+
+DROP TRIGGER IF EXISTS sales_changes_delete;
+CREATE TRIGGER sales_changes_delete AFTER DELETE ON sales
+WHEN NOT EXISTS (SELECT 1 FROM archive_in_progress) BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('sales', OLD.sale_id, 'D');
+END;
+
+DROP TRIGGER IF EXISTS check_ins_changes_delete;
+CREATE TRIGGER check_ins_changes_delete AFTER DELETE ON check_ins
+WHEN NOT EXISTS (SELECT 1 FROM archive_in_progress) BEGIN
+    INSERT INTO changes (table_name, row_id, op) VALUES ('check_ins', OLD.check_in_id, 'D');
+END;
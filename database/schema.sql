@@ -1,4 +1,12 @@
 -- Hotel Management System Database Schema
+--
+-- Baseline schema, applied on every start; it only creates what is
+-- missing. Changes to existing tables, and new indexes on large ones, go
+-- in numbered files under database/migrations/ (see app/utils/migrations.py).
+
+-- Lets maintenance return free pages in small steps; only takes effect
+-- on a new database (existing ones need a VACUUM to switch)
+PRAGMA auto_vacuum = INCREMENTAL;
 
 -- Users/Employees Table
 CREATE TABLE IF NOT EXISTS users (
@@ -122,6 +130,54 @@ CREATE TABLE IF NOT EXISTS audit_log (
     FOREIGN KEY (user_id) REFERENCES users(user_id)
 );
 
+-- Export Jobs Table (background report exports)
+CREATE TABLE IF NOT EXISTS export_jobs (
+    job_id TEXT PRIMARY KEY,
+    report_type TEXT NOT NULL,
+    params TEXT NOT NULL,
+    export_format TEXT NOT NULL,
+    status TEXT DEFAULT 'Queued' CHECK(status IN ('Queued', 'Running', 'Completed', 'Failed')),
+    progress INTEGER DEFAULT 0,
+    cache_key TEXT NOT NULL,
+    cached BOOLEAN DEFAULT 0,
+    error TEXT,
+    created_by INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    finished_at TIMESTAMP,
+    FOREIGN KEY (created_by) REFERENCES users(user_id)
+);
+
+-- Scheduled Job Leases (one row per job; taking it grants one scheduled run)
+CREATE TABLE IF NOT EXISTS job_leases (
+    job_name TEXT PRIMARY KEY,
+    owner TEXT,
+    slot REAL DEFAULT 0,
+    expires_at REAL DEFAULT 0,
+    runs INTEGER DEFAULT 0,
+    failures INTEGER DEFAULT 0,
+    last_duration REAL,
+    last_success_at TIMESTAMP
+);
+
+-- Scheduled Job Run History
+CREATE TABLE IF NOT EXISTS job_runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    job_name TEXT NOT NULL,
+    owner TEXT,
+    started_at TIMESTAMP NOT NULL,
+    duration_seconds REAL,
+    status TEXT CHECK(status IN ('Completed', 'Failed')),
+    error TEXT
+);
+
+-- Applied Schema Migrations (database/migrations/)
+CREATE TABLE IF NOT EXISTS schema_version (
+    version INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    duration_seconds REAL
+);
+
 -- Create Indexes for Better Performance
 CREATE INDEX IF NOT EXISTS idx_sales_employee_date ON sales(employee_id, sale_date);
 CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(sale_date);
@@ -130,3 +186,36 @@ CREATE INDEX IF NOT EXISTS idx_check_ins_date ON check_ins(check_in_date, check_
 CREATE INDEX IF NOT EXISTS idx_daily_summary_date ON daily_sales_summary(sale_date);
 CREATE INDEX IF NOT EXISTS idx_monthly_report_date ON monthly_sales_report(year, month);
 CREATE INDEX IF NOT EXISTS idx_audit_log_user ON audit_log(user_id);
+CREATE INDEX IF NOT EXISTS idx_audit_log_entity ON audit_log(entity_type, entity_id);
+CREATE INDEX IF NOT EXISTS idx_audit_log_created ON audit_log(created_at);
+CREATE INDEX IF NOT EXISTS idx_job_runs_job ON job_runs(job_name, run_id);
+
+-- Guest Search Index (full-text over check_ins, kept in sync by triggers)
+CREATE VIRTUAL TABLE IF NOT EXISTS check_ins_fts USING fts5(
+    guest_name,
+    guest_email,
+    guest_phone,
+    notes,
+    content='check_ins',
+    content_rowid='check_in_id',
+    tokenize='unicode61 remove_diacritics 2',
+    prefix='2 3'
+);
+
+CREATE TRIGGER IF NOT EXISTS check_ins_fts_insert AFTER INSERT ON check_ins BEGIN
+    INSERT INTO check_ins_fts(rowid, guest_name, guest_email, guest_phone, notes)
+    VALUES (new.check_in_id, new.guest_name, new.guest_email, new.guest_phone, new.notes);
+END;
+
+CREATE TRIGGER IF NOT EXISTS check_ins_fts_delete AFTER DELETE ON check_ins BEGIN
+    INSERT INTO check_ins_fts(check_ins_fts, rowid, guest_name, guest_email, guest_phone, notes)
+    VALUES ('delete', old.check_in_id, old.guest_name, old.guest_email, old.guest_phone, old.notes);
+END;
+
+CREATE TRIGGER IF NOT EXISTS check_ins_fts_update
+AFTER UPDATE OF guest_name, guest_email, guest_phone, notes ON check_ins BEGIN
+    INSERT INTO check_ins_fts(check_ins_fts, rowid, guest_name, guest_email, guest_phone, notes)
+    VALUES ('delete', old.check_in_id, old.guest_name, old.guest_email, old.guest_phone, old.notes);
+    INSERT INTO check_ins_fts(rowid, guest_name, guest_email, guest_phone, notes)
+    VALUES (new.check_in_id, new.guest_name, new.guest_email, new.guest_phone, new.notes);
+END;
@@ -5,6 +5,7 @@
 
 const API_BASE_URL = 'http://localhost:5000/api';
 let authToken = null;
+let currentProperty = null;
 
 class APIService {
     /**
@@ -33,6 +34,32 @@ class APIService {
         localStorage.removeItem('authToken');
     }
 
+    /**
+     * Set the property sent with every request (group-wide accounts only)
+     */
+    static setProperty(code) {
+        currentProperty = code;
+        localStorage.setItem('property', code);
+    }
+
+    /**
+     * Get the selected property
+     */
+    static getProperty() {
+        if (!currentProperty) {
+            currentProperty = localStorage.getItem('property');
+        }
+        return currentProperty;
+    }
+
+    /**
+     * Clear the selected property
+     */
+    static clearProperty() {
+        currentProperty = null;
+        localStorage.removeItem('property');
+    }
+
     /**
      * Make an API request
      */
@@ -50,6 +77,11 @@ class APIService {
             options.headers['Authorization'] = `Bearer ${token}`;
         }
 
+        const property = this.getProperty();
+        if (property) {
+            options.headers['X-Property'] = property;
+        }
+
         if (data) {
             options.body = JSON.stringify(data);
         }
@@ -173,6 +205,14 @@ class APIService {
         return this.request('/rooms/active-check-ins', 'GET');
     }
 
+    static searchGuests(query, status = null, limit = 20) {
+        const params = new URLSearchParams({ q: query, limit });
+        if (status) {
+            params.append('status', status);
+        }
+        return this.request(`/rooms/guests/search?${params}`, 'GET');
+    }
+
     static getOccupancyReport() {
         return this.request('/rooms/occupancy-report', 'GET');
     }
@@ -26,6 +26,7 @@ async function initApp() {
             const response = await APIService.getProfile();
             if (response.success) {
                 currentUser = response.user;
+                setupPropertySelector(response.properties);
                 showMainDashboard();
                 initializeDashboard();
             }
@@ -117,6 +118,7 @@ function setupLoginForm() {
                 APIService.setToken(response.token);
                 currentUser = response.user;
                 console.log('Login successful, user:', currentUser);
+                setupPropertySelector(response.properties);
                 showMainDashboard();
                 initializeDashboard();
             } else {
@@ -140,6 +142,37 @@ function setupLoginForm() {
     }
 }
 
+/**
+ * Setup the property selector for group-wide accounts
+ *
+ * With several properties, rooms, sales and check-ins belong to one
+ * property. Accounts with a home property always use it; group-wide
+ * accounts pick one here, and it is sent as the X-Property header.
+ */
+function setupPropertySelector(properties) {
+    const selector = document.getElementById('propertySelect');
+    if (!selector) return;
+
+    if (!properties || !properties.length || currentUser.property) {
+        selector.style.display = 'none';
+        APIService.clearProperty();
+        return;
+    }
+
+    selector.innerHTML = properties.map(code => `<option value="${code}">${code}</option>`).join('');
+    let selected = APIService.getProperty();
+    if (!properties.includes(selected)) {
+        selected = properties[0];
+        APIService.setProperty(selected);
+    }
+    selector.value = selected;
+    selector.style.display = '';
+    selector.onchange = () => {
+        APIService.setProperty(selector.value);
+        showPage(currentPage);
+    };
+}
+
 /**
  * Update user display information
  */
@@ -860,6 +893,7 @@ async function logout() {
     }
     
     APIService.clearToken();
+    APIService.clearProperty();
     currentUser = null;
     showLoginPage();
 }